@@ -0,0 +1,105 @@
+"""
+Admin list and search latency on a large users table.
+
+Fills `users` (and a blacklisted token for every 100th user) up to --rows
+with generated phone numbers, refreshes planner statistics, then times admin
+page loads: the first page, a deep page, phone prefix searches and sorting.
+
+    python -m benchmarks.admin_dataset --rows 10000000 --output admin.json
+    python -m benchmarks.admin_dataset --rows 0 --output admin.json  # reuse data
+"""
+
+import argparse
+import asyncio
+import time
+
+import asyncpg
+
+from benchmarks.utils import current_commit, save_results, summarize
+from src.core.config import settings
+
+# Generated numbers are +7999NNNNNNN, outside the ranges used by other
+# benchmarks, so the dataset can live next to them
+FILL_USERS = """
+INSERT INTO users (id, phone, superuser, active)
+SELECT gen_random_uuid(), '+7999' || lpad(n::text, 7, '0'), false, true
+FROM generate_series($1::bigint, $2::bigint) AS n
+ON CONFLICT (phone) DO NOTHING
+"""
+
+FILL_BLACKLIST = """
+INSERT INTO blacklist_tokens (id, user_id)
+SELECT gen_random_uuid(), id FROM users
+WHERE phone LIKE '+7999%' AND right(phone, 2) = '00'
+  AND id NOT IN (SELECT user_id FROM blacklist_tokens)
+"""
+
+PAGES = {
+    "users_first_page": "/api/v1/admin/user/list",
+    "users_deep_page": "/api/v1/admin/user/list?page=400",
+    "users_search_prefix": "/api/v1/admin/user/list?search=%2B7999123",
+    "users_search_exact": "/api/v1/admin/user/list?search=%2B79990001234",
+    "users_sort_phone": "/api/v1/admin/user/list?sortBy=phone&sort=desc",
+    "users_sort_unindexed": "/api/v1/admin/user/list?sortBy=active",
+    "blacklist_search": "/api/v1/admin/blacklist-token/list?search=%2B7999000",
+}
+
+
+async def fill(rows: int, batch: int) -> dict:
+    connection = await asyncpg.connect(settings.db.url.replace("+asyncpg", ""))
+    try:
+        started = time.perf_counter()
+        for first in range(0, rows, batch):
+            last = min(first + batch, rows) - 1
+            await connection.execute(FILL_USERS, first, last)
+        await connection.execute(FILL_BLACKLIST)
+        await connection.execute("ANALYZE users, blacklist_tokens")
+        return {
+            "seconds": time.perf_counter() - started,
+            "users": await connection.fetchval("SELECT count(*) FROM users"),
+        }
+    finally:
+        await connection.close()
+
+
+async def measure(repeat: int) -> dict:
+    import httpx
+
+    from src.auth.utils import jwt_encode
+    from src.core.database import engine
+    from src.main import app
+
+    headers = {"Authorization": jwt_encode({"sub": "benchmark", "superuser": True})}
+    results = {}
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", headers=headers
+    ) as client:
+        for name, url in PAGES.items():
+            response = await client.get(url)  # warm up
+            response.raise_for_status()
+            latencies = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await client.get(url)
+                latencies.append(time.perf_counter() - started)
+            results[name] = summarize(latencies)
+    await engine.dispose()
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    results: dict = {"commit": current_commit()}
+    if args.rows > 0:
+        results["fill"] = asyncio.run(fill(args.rows, args.batch))
+    results["pages"] = asyncio.run(measure(args.repeat))
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
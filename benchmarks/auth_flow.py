@@ -0,0 +1,210 @@
+"""
+Load test for the authentication flow.
+
+Every virtual user requests a code, verifies it, makes a number of
+authenticated requests and refreshes its token pair. Users run with the
+given concurrency against the app served in-process, backed by the database
+from .env or by a disposable Postgres container (--docker).
+
+    python -m benchmarks.auth_flow --users 500 --concurrency 32 --output auth.json
+"""
+
+import argparse
+import asyncio
+import contextvars
+import itertools
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+# Mutable per-request state. Child tasks spawned by the middleware stack get
+# a copy of the context that still points at the same dict.
+request_state: contextvars.ContextVar[dict] = contextvars.ContextVar("request_state")
+
+
+@contextmanager
+def postgres_container(port: int, image: str):
+    container_id = subprocess.run(
+        [
+            "docker", "run", "-d", "--rm",
+            "-e", "POSTGRES_PASSWORD=postgres",
+            "-p", f"{port}:5432",
+            image,
+        ],
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    try:
+        for _ in range(60):
+            ready = subprocess.run(
+                ["docker", "exec", container_id, "pg_isready", "-U", "postgres"],
+                capture_output=True,
+            )
+            if ready.returncode == 0:
+                break
+            time.sleep(1)
+        else:
+            raise RuntimeError("postgres container did not become ready")
+        os.environ.update(
+            DB_USER="postgres",
+            DB_PASS="postgres",
+            DB_HOST="localhost",
+            DB_PORT=str(port),
+            DB_NAME="postgres",
+        )
+        yield
+    finally:
+        subprocess.run(["docker", "stop", container_id], capture_output=True)
+
+
+def migrate() -> None:
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"], check=True, env=os.environ
+    )
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statements: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def call(self, client, name: str, method: str, url: str, **kwargs):
+        state = {"statements": 0}
+        request_state.set(state)
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append(time.perf_counter() - started)
+        self.statements[name] += state["statements"]
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response, state
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, latencies in self.latencies.items():
+            endpoints[name] = {
+                "requests": len(latencies),
+                "errors": self.errors[name],
+                "statements_per_request": self.statements[name] / len(latencies),
+                **summarize(latencies),
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            "elapsed_seconds": elapsed,
+            "requests": total,
+            "throughput_rps": total / elapsed,
+            "endpoints": endpoints,
+        }
+
+
+async def virtual_user(client, recorder: Recorder, index: int, requests: int):
+    phone = f"+7912{index:07d}"
+    response, state = await recorder.call(
+        client, "request_code", "POST", "/api/v1/jwt/request_code",
+        json={"phone": phone},
+    )
+    verify = {"phone": phone, "code": state.get("code")}
+    if response.status_code == 200 and "challenge" in response.json():
+        verify["challenge"] = response.json()["challenge"]
+    response, _ = await recorder.call(
+        client, "verify_code", "POST", "/api/v1/jwt/verify_code", json=verify
+    )
+    if response.status_code != 200:
+        return
+    token = response.json()
+    headers = {"Authorization": "Bearer " + token["access_token"]}
+    for _ in range(requests):
+        await recorder.call(client, "me", "GET", "/api/v1/jwt/me", headers=headers)
+    await recorder.call(
+        client, "refresh", "POST", "/api/v1/jwt/refresh",
+        data={"refresh_token": token["refresh_token"]},
+    )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+    from sqlalchemy import event
+
+    import src.auth.utils as auth_utils
+    from src.core.database import engine
+    from src.main import app
+
+    # Codes are unique per run so concurrent users never collide on lookup,
+    # and are captured through the request state instead of stdout.
+    counter = itertools.count(args.offset)
+
+    def generate_auth_code(length: int) -> str:
+        code = str(next(counter) % 10**length).zfill(length)
+        request_state.get({})["code"] = code
+        return code
+
+    auth_utils.generate_auth_code = generate_auth_code
+
+    def count_statement(*_):
+        state = request_state.get(None)
+        if state is not None:
+            state["statements"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    recorder = Recorder()
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for index in range(args.offset, args.offset + args.users):
+        queue.put_nowait(index)
+
+    async def worker(client):
+        while not queue.empty():
+            await virtual_user(client, recorder, queue.get_nowait(), args.requests)
+
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    return {
+        "commit": current_commit(),
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "authenticated_requests_per_user": args.requests,
+        **recorder.report(elapsed),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.docker:
+        with postgres_container(args.docker_port, args.docker_image):
+            migrate()
+            results = asyncio.run(run(args))
+    else:
+        if args.migrate:
+            migrate()
+        results = asyncio.run(run(args))
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--requests", type=int, default=5, help="authenticated requests per user"
+    )
+    parser.add_argument(
+        "--offset", type=int, default=0, help="first phone number/code index"
+    )
+    parser.add_argument("--migrate", action="store_true")
+    parser.add_argument("--docker", action="store_true")
+    parser.add_argument("--docker-port", type=int, default=55432)
+    parser.add_argument("--docker-image", default="postgres:16-alpine")
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+"""
+Measures latency of concurrent lightweight requests while bcrypt hashes are
+in flight, with hashing done inline on the event loop and in the bounded
+bcrypt executor.
+
+    python -m benchmarks.bcrypt_offload --hashes 16 --output bcrypt.json
+"""
+
+import argparse
+import asyncio
+import time
+
+import src.auth.utils as auth_utils
+from benchmarks.utils import current_commit, save_results, summarize
+
+
+async def inline_hash(password: str) -> None:
+    auth_utils.hash_password(password)
+
+
+async def offloaded_hash(password: str) -> None:
+    await auth_utils.hash_password_async(password)
+
+
+async def probe(stop: asyncio.Event, interval: float, latencies: list[float]):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        latencies.append(max(loop.time() - scheduled, 0.0))
+
+
+async def run_mode(hash_fn, hashes: int, probes: int, interval: float) -> dict:
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    probe_tasks = [
+        asyncio.create_task(probe(stop, interval, latencies)) for _ in range(probes)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(hash_fn(f"password-{i}") for i in range(hashes)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*probe_tasks)
+    return {"hashes_seconds": elapsed, "probe_lag": summarize(latencies)}
+
+
+async def main(args: argparse.Namespace) -> None:
+    results = {
+        "commit": current_commit(),
+        "hashes": args.hashes,
+        "rounds": auth_utils.settings.auth.bcrypt_rounds,
+        "workers": auth_utils.bcrypt_executor.max_workers,
+        "inline": await run_mode(inline_hash, args.hashes, args.probes, args.interval),
+        "offloaded": await run_mode(
+            offloaded_hash, args.hashes, args.probes, args.interval
+        ),
+    }
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--hashes", type=int, default=16)
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
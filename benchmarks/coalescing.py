@@ -0,0 +1,100 @@
+"""
+Request coalescing for bursts of identical lookups.
+
+Sends bursts of concurrent /jwt/me requests with one user's token, with
+coalesced user lookups turned off and on, and counts the statements each
+burst sends to the database.
+
+    python -m benchmarks.coalescing --burst 100 --output coalescing.json
+"""
+
+import argparse
+import asyncio
+import time
+
+import asyncpg
+
+from benchmarks.utils import current_commit, save_results, summarize
+from src.core.config import settings
+from src.core.utils import uuid7
+
+PHONE = "+79970000001"
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+    from sqlalchemy import event
+
+    from src.auth.repositories import AuthRepository
+    from src.auth.utils import create_jwt
+    from src.core.database import engine
+    from src.core.singleflight import singleflight_coalesced_total
+    from src.main import app
+
+    connection = await asyncpg.connect(settings.db.url.replace("+asyncpg", ""))
+    user_id = await connection.fetchval(
+        "INSERT INTO users (id, phone, superuser, active) "
+        "VALUES ($1, $2, false, true) "
+        "ON CONFLICT (phone) DO UPDATE SET active = true RETURNING id",
+        uuid7(),
+        PHONE,
+    )
+    token = create_jwt(token_type="access", token_data={"sub": user_id.hex})
+
+    statements = 0
+
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    try:
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://benchmark",
+            headers={"Authorization": "Bearer " + token},
+        ) as client:
+            for coalesce in (False, True):
+                AuthRepository.coalesce_reads = coalesce
+                await client.get("/api/v1/jwt/me")  # warm up
+                statements = 0
+                coalesced = singleflight_coalesced_total.value(group="repository")
+                latencies = []
+                for _ in range(args.bursts):
+                    started = time.perf_counter()
+                    await asyncio.gather(
+                        *(client.get("/api/v1/jwt/me") for _ in range(args.burst))
+                    )
+                    latencies.append(time.perf_counter() - started)
+                results["coalesced" if coalesce else "plain"] = {
+                    "statements_per_burst": statements / args.bursts,
+                    "coalesced_calls": singleflight_coalesced_total.value(
+                        group="repository"
+                    )
+                    - coalesced,
+                    **summarize(latencies),
+                }
+    finally:
+        await connection.execute("DELETE FROM users WHERE phone = $1", PHONE)
+        await connection.close()
+        await engine.dispose()
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    results = asyncio.run(run(args))
+    save_results(
+        args.output,
+        {"commit": current_commit(), "burst": args.burst, "bursts": args.bursts, **results},
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
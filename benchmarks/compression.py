@@ -0,0 +1,122 @@
+"""
+Response compression: size and time.
+
+Compresses a JSON page of media objects, a CSV user export split into
+streamed chunks and the sqladmin static files with gzip and brotli at the
+levels used for responses and for precompressed static files, and reports
+the compressed size and the time to compress. Streamed bodies are flushed
+after every chunk, as CompressionMiddleware does.
+
+    python -m benchmarks.compression --page-size 100 --output compression.json
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.utils import current_commit, save_results
+
+
+def measure(chunks: list[bytes], encoding: str, level: int, repeat: int) -> dict:
+    from src.core.compression import Compressor
+
+    size = sum(len(chunk) for chunk in chunks)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        compressor = Compressor(encoding, gzip_level=level, brotli_quality=level)
+        compressed = sum(
+            len(compressor.compress(chunk, final=index == len(chunks) - 1))
+            for index, chunk in enumerate(chunks)
+        )
+    elapsed = (time.perf_counter() - started) / repeat
+    return {
+        "bytes": compressed,
+        "ratio": size / compressed,
+        "ms": elapsed * 1000,
+        "mb_per_s": size / elapsed / 1e6,
+    }
+
+
+def payloads(args: argparse.Namespace) -> dict[str, list[bytes]]:
+    from starlette.staticfiles import StaticFiles
+
+    from src.core.compression import STATIC_EXTENSIONS
+    from src.core.responses import FastJSONResponse
+    from src.media.schemas import MediaObjectRead
+
+    objects = [
+        MediaObjectRead(
+            key=f"{uuid.uuid4().hex}_photo_{index}.jpg",
+            owner_id=uuid.uuid4(),
+            size=123456,
+            content_type="image/jpeg",
+            etag=uuid.uuid4().hex,
+            created_at=datetime.now(tz=timezone.utc),
+        )
+        for index in range(args.page_size)
+    ]
+    rows = [
+        f"{uuid.uuid4()},+7912{index:07d},false,true\r\n".encode()
+        for index in range(args.export_rows)
+    ]
+    # Chunks of the size the export streams them in
+    chunk_rows = 1000
+    export = [
+        b"".join(rows[start : start + chunk_rows])
+        for start in range(0, len(rows), chunk_rows)
+    ]
+    result = {
+        f"media_page_{args.page_size}": [FastJSONResponse(objects).body],
+        f"users_export_{args.export_rows}": export,
+    }
+    (directory,) = StaticFiles(packages=["sqladmin"]).all_directories
+    for name in args.static:
+        path = f"{directory}/{name}"
+        if path.endswith(STATIC_EXTENSIONS):
+            with open(path, "rb") as file:
+                result[name] = [file.read()]
+    return result
+
+
+def run(args: argparse.Namespace) -> dict:
+    results = {}
+    for name, chunks in payloads(args).items():
+        # Static files are compressed once, at the highest levels
+        static = name in args.static
+        if static:
+            levels = {"gzip": 9, "br": 11}
+        else:
+            levels = {"gzip": args.gzip_level, "br": args.brotli_quality}
+        results[name] = {
+            "bytes": sum(len(chunk) for chunk in chunks),
+            "chunks": len(chunks),
+            **{
+                f"{encoding}_{level}": measure(
+                    chunks, encoding, level, 1 if static else args.repeat
+                )
+                for encoding, level in levels.items()
+            },
+        }
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    results = run(args)
+    save_results(args.output, {"commit": current_commit(), **results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--export-rows", type=int, default=10000)
+    parser.add_argument("--gzip-level", type=int, default=6)
+    parser.add_argument("--brotli-quality", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--static",
+        action="append",
+        default=["css/tabler.min.css", "js/tabler.min.js", "js/main.js"],
+    )
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+"""
+Request latency with logging off, written synchronously and through the
+QueueHandler writer thread.
+
+Requests go to /jwt/request_code in stateless mode, which logs the issued
+code and needs no database. Log lines are written to a pipe drained by a
+thread that reads 64 KiB and then sleeps --sink-delay seconds, like a log
+collector that falls behind. A synchronous StreamHandler then blocks the
+event loop once the pipe is full; the QueueHandler samples and drops
+records instead.
+
+    python -m benchmarks.logging_pipeline --requests 5000 --concurrency 32 --output logging.json
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+
+class SlowSink:
+    """
+    Pipe whose read end is drained at a limited rate.
+    """
+
+    def __init__(self, delay: float) -> None:
+        read_fd, write_fd = os.pipe()
+        self.stream = os.fdopen(write_fd, "w")
+        self.delay = delay
+        self.bytes = 0
+        self._reader = threading.Thread(target=self._drain, args=(read_fd,), daemon=True)
+        self._reader.start()
+
+    def close(self) -> None:
+        self.stream.close()
+        self._reader.join()
+
+    def _drain(self, read_fd: int) -> None:
+        with os.fdopen(read_fd, "rb") as pipe:
+            while chunk := pipe.read1(65536):
+                self.bytes += len(chunk)
+                time.sleep(self.delay)
+
+
+async def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    import httpx
+
+    from src.core.log import JSONFormatter, QueueHandler
+    from src.main import app
+
+    sink = SlowSink(args.sink_delay)
+    root = logging.getLogger()
+    handler: logging.Handler | None = None
+    if mode == "sync":
+        handler = logging.StreamHandler(sink.stream)
+    elif mode == "queue":
+        handler = QueueHandler(sink.stream, capacity=args.capacity)
+    if handler is not None:
+        handler.setFormatter(JSONFormatter())
+        root.addHandler(handler)
+    root.setLevel(logging.INFO if handler is not None else logging.WARNING)
+
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        remaining = args.requests
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/jwt/request_code", json={"phone": "+79120000000"}
+                )
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    dropped = 0
+    if handler is not None:
+        root.removeHandler(handler)
+        dropped = getattr(handler, "dropped", 0)
+        handler.close()
+    sink.close()
+    return {
+        "requests_per_second": len(latencies) / elapsed,
+        "records_dropped": dropped,
+        "bytes_written": sink.bytes,
+        **summarize(latencies),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    os.environ["AUTH_CODE_MODE"] = "stateless"
+    # The httpx client logs every request too, that is not what is measured
+    logging.getLogger("httpx").propagate = False
+    results = {mode: asyncio.run(run_mode(mode, args)) for mode in args.mode}
+    save_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "sink_delay": args.sink_delay,
+            **results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sink-delay", type=float, default=1.0)
+    parser.add_argument("--capacity", type=int, default=10_000)
+    parser.add_argument(
+        "--mode", action="append", choices=["off", "sync", "queue"], default=None
+    )
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    args.mode = args.mode or ["off", "sync", "queue"]
+    main(args)
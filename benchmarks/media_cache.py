@@ -0,0 +1,163 @@
+"""
+Media disk cache: hit against miss latency.
+
+Uploads objects of a few sizes to the bucket used by the media router, then
+starts `python -m src.server` without and with MEDIA_CACHE_DIR, and with
+MEDIA_BACKEND=local, and downloads each object repeatedly. Needs the S3
+storage from .env (LocalStack, Minio or `moto_server -p 4566`) unless only
+the local backend is measured.
+
+    python -m benchmarks.media_cache --sizes 65536 1048576 --output media.json
+    python -m benchmarks.media_cache --local-only
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from aiobotocore.session import get_session
+
+from benchmarks.server_workers import free_port, wait_until_ready
+from benchmarks.user_bulk import cleanup as remove_superuser
+from benchmarks.user_bulk import create_superuser
+from benchmarks.utils import current_commit, save_results, summarize
+from src.core.config import settings
+from src.media.repositories import LocalFSRepository
+
+BUCKET = "sample-bucket"
+
+
+def s3_client():
+    return get_session().create_client(
+        "s3",
+        aws_access_key_id=settings.s3.access_key,
+        aws_secret_access_key=settings.s3.secrret_key,
+        endpoint_url=settings.s3.endpoint_url,
+    )
+
+
+async def upload(sizes: list[int]) -> list[str]:
+    keys = []
+    async with s3_client() as client:
+        try:
+            await client.create_bucket(Bucket=BUCKET)
+        except client.exceptions.ClientError:
+            pass
+        for size in sizes:
+            key = f"benchmark_{size}.bin"
+            await client.put_object(Bucket=BUCKET, Key=key, Body=os.urandom(size))
+            keys.append(key)
+    return keys
+
+
+async def cleanup(keys: list[str]) -> None:
+    async with s3_client() as client:
+        await client.delete_objects(
+            Bucket=BUCKET, Delete={"Objects": [{"Key": key} for key in keys]}
+        )
+
+
+async def download(client: httpx.AsyncClient, key: str) -> float:
+    started = time.perf_counter()
+    async with client.stream("GET", f"/api/v1/media/{key}") as response:
+        response.raise_for_status()
+        async for _ in response.aiter_raw():
+            pass
+    return time.perf_counter() - started
+
+
+async def upload_local(directory: str, sizes: list[int]) -> list[str]:
+    repository = LocalFSRepository(root=os.path.join(directory, BUCKET))
+    return [
+        await repository.upload_object(
+            f"benchmark_{size}.bin", os.urandom(size), generate_prefix=False
+        )
+        for size in sizes
+    ]
+
+
+async def run_server(keys: list[str], repeat: int, token: str, **environ: str) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": "1",
+        "MEDIA_ENABLED": "true",
+        **environ,
+    }
+    process = subprocess.Popen([sys.executable, "-m", "src.server"], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    results = {}
+    try:
+        await wait_until_ready(base_url + "/api/v1/health")
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            for key in keys:
+                first = await download(client, key)
+                latencies = [await download(client, key) for _ in range(repeat)]
+                results[key] = {"first_ms": first * 1000, **summarize(latencies)}
+            metrics = (
+                await client.get(
+                    "/api/v1/metrics", headers={"Authorization": "Bearer " + token}
+                )
+            ).text
+        results["metrics"] = [
+            line for line in metrics.splitlines() if line.startswith("media_cache_")
+        ]
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    # The metrics are only served to a superuser
+    token = await create_superuser()
+    try:
+        return await run_backends(args, token)
+    finally:
+        await remove_superuser()
+
+
+async def run_backends(args: argparse.Namespace, token: str) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as local_dir:
+        keys = await upload_local(local_dir, args.sizes)
+        results["local"] = await run_server(
+            keys, args.repeat, token, MEDIA_BACKEND="local", MEDIA_LOCAL_DIR=local_dir
+        )
+    if args.local_only:
+        return results
+    keys = await upload(args.sizes)
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            results["storage"] = await run_server(
+                keys, args.repeat, token, MEDIA_BACKEND="s3", MEDIA_CACHE_DIR=""
+            )
+            results["cache"] = await run_server(
+                keys, args.repeat, token, MEDIA_BACKEND="s3", MEDIA_CACHE_DIR=cache_dir
+            )
+    finally:
+        await cleanup(keys)
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    results = asyncio.run(run(args))
+    save_results(args.output, {"commit": current_commit(), **results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[64 * 1024, 1024**2, 16 * 1024**2]
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--local-only", action="store_true")
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""
+Media catalog: listing and metadata from Postgres against storage.
+
+Writes --objects small files with the local storage backend, builds the
+catalog with the reconciliation job, then times a page of the catalog
+listing, a metadata lookup and a full storage listing, which is what a
+listing without the catalog needs.
+
+    python -m benchmarks.media_catalog --objects 20000 --output catalog.json
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+BUCKET = "sample-bucket"
+
+
+async def run(args: argparse.Namespace, directory: str) -> dict:
+    import httpx
+    from sqlalchemy import delete
+
+    from src.core.database import engine
+    from src.main import app
+    from src.media.models import MediaObject
+    from src.media.reconcile import reconcile
+    from src.media.repositories import LocalFSRepository
+
+    storage = LocalFSRepository(root=os.path.join(directory, BUCKET), bucket_name=BUCKET)
+    keys = [f"benchmark_{index:08d}.txt" for index in range(args.objects)]
+    for key in keys:
+        await storage.put_object(key, key.encode())
+
+    results: dict = {}
+    started = time.perf_counter()
+    results["reconcile"] = await reconcile(storage, BUCKET, args.batch_size)
+    results["reconcile"]["seconds"] = time.perf_counter() - started
+
+    async def measure(name: str, call) -> None:
+        latencies = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+        results[name] = summarize(latencies)
+
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            middle = keys[len(keys) // 2]
+            await measure(
+                "catalog_first_page",
+                lambda: client.get("/api/v1/media/", params={"limit": 100}),
+            )
+            await measure(
+                "catalog_deep_page",
+                lambda: client.get(
+                    "/api/v1/media/", params={"limit": 100, "after": middle}
+                ),
+            )
+            await measure(
+                "catalog_metadata",
+                lambda: client.get(f"/api/v1/media/{middle}/metadata"),
+            )
+            await measure("storage_full_listing", storage.get_all)
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(
+                delete(MediaObject).where(MediaObject.bucket == BUCKET)
+            )
+        await engine.dispose()
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(
+            MEDIA_ENABLED="true", MEDIA_BACKEND="local", MEDIA_LOCAL_DIR=directory
+        )
+        results = asyncio.run(run(args, directory))
+    save_results(
+        args.output, {"commit": current_commit(), "objects": args.objects, **results}
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
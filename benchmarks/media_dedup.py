@@ -0,0 +1,111 @@
+"""
+Content-addressed upload dedup.
+
+Uploads --files objects drawn from --distinct different contents through
+POST /media/, with MEDIA_DEDUP off and on, and reports the upload time, the
+bytes written to storage and the bytes saved. Uses the storage configured in
+.env (MEDIA_BACKEND) and the database for references, uploads and deletes
+run as the user +79970000002.
+
+    python -m benchmarks.media_dedup --files 200 --distinct 20 --size 1048576
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+import asyncpg
+
+from benchmarks.utils import current_commit, save_results, summarize
+from src.core.config import settings
+from src.core.utils import uuid7
+
+PHONE = "+79970000002"
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from src.auth.utils import create_jwt
+    from src.core.database import engine
+    from src.main import app
+    from src.media.service import media_dedup_bytes_saved_total as saved
+
+    connection = await asyncpg.connect(settings.db.url.replace("+asyncpg", ""))
+    user_id = await connection.fetchval(
+        "INSERT INTO users (id, phone, superuser, active) "
+        "VALUES ($1, $2, false, true) "
+        "ON CONFLICT (phone) DO UPDATE SET active = true RETURNING id",
+        uuid7(),
+        PHONE,
+    )
+    headers = {
+        "Authorization": "Bearer "
+        + create_jwt(token_type="access", token_data={"sub": user_id.hex})
+    }
+
+    contents = [os.urandom(args.size) for _ in range(args.distinct)]
+    rng = random.Random(0)
+    uploads = [rng.choice(contents) for _ in range(args.files)]
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", headers=headers, timeout=None
+    ) as client:
+        for dedup in (False, True):
+            settings.s3.dedup = dedup
+            saved_before = saved.value()
+            keys, latencies = [], []
+            started = time.perf_counter()
+            for index, content in enumerate(uploads):
+                request_started = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/media/", files={"file": (f"file_{index}.bin", content)}
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+                keys.append(response.json()["key"])
+            elapsed = time.perf_counter() - started
+            bytes_saved = saved.value() - saved_before
+            results["dedup" if dedup else "plain"] = {
+                "seconds": elapsed,
+                "bytes_uploaded": args.files * args.size,
+                "bytes_stored": args.files * args.size - bytes_saved,
+                "bytes_saved": bytes_saved,
+                **summarize(latencies),
+            }
+            # The user holds one reference per distinct content
+            for key in dict.fromkeys(keys):
+                response = await client.delete(f"/api/v1/media/{key}")
+                response.raise_for_status()
+    await engine.dispose()
+    await connection.execute("DELETE FROM users WHERE phone = $1", PHONE)
+    await connection.close()
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    os.environ["MEDIA_ENABLED"] = "true"
+    results = asyncio.run(run(args))
+    save_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "files": args.files,
+            "distinct": args.distinct,
+            "size": args.size,
+            **results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=20)
+    parser.add_argument("--size", type=int, default=1024**2)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
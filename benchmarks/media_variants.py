@@ -0,0 +1,120 @@
+"""
+Image variants.
+
+Uploads a generated JPEG through POST /media/, then requests a variant of
+it with --concurrency clients at once (the first request renders it) and
+--requests more times once it is stored. Reports the latency of both, the
+number of renders, the variant size against the original and the largest
+event loop stall seen while rendering. Uses the storage configured in .env
+(MEDIA_BACKEND) and the database for the catalog.
+
+    python -m benchmarks.media_variants --width 256 --format webp --output variants.json
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import time
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+
+def generate_jpeg(width: int, height: int) -> bytes:
+    from PIL import Image
+
+    # Coarse noise, so the scaled down variant still has detail to encode
+    noise = Image.effect_noise((width // 8, height // 8), 64).convert("RGB")
+    noise = noise.resize((width, height), Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    output = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+async def max_loop_stall(stop: asyncio.Event, interval: float = 0.005) -> float:
+    stall = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stall = max(stall, time.perf_counter() - started - interval)
+    return stall
+
+
+async def run(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from src.core.database import engine
+    from src.main import app
+    from src.media.service import image_executor, media_variant_build_seconds
+
+    original = generate_jpeg(args.image_width, args.image_height)
+    url = f"/api/v1/media/{{key}}?w={args.width}&format={args.format}"
+
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+        response = await client.post(
+            "/api/v1/media/", files={"file": ("original.jpg", original, "image/jpeg")}
+        )
+        response.raise_for_status()
+        key = response.json()["key"]
+
+        async def get() -> tuple[float, int]:
+            started = time.perf_counter()
+            response = await client.get(url.format(key=key))
+            response.raise_for_status()
+            return time.perf_counter() - started, len(response.content)
+
+        builds_before = media_variant_build_seconds.count()
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(max_loop_stall(stop))
+        cold = await asyncio.gather(*(get() for _ in range(args.concurrency)))
+        stop.set()
+        stall = await monitor
+        builds = media_variant_build_seconds.count() - builds_before
+
+        warm = [await get() for _ in range(args.requests)]
+
+        response = await client.delete(f"/api/v1/media/{key}")
+        response.raise_for_status()
+    image_executor.shutdown()
+    await engine.dispose()
+
+    return {
+        "original_bytes": len(original),
+        "variant_bytes": cold[0][1],
+        "renders": builds,
+        "max_loop_stall_ms": stall * 1000,
+        "cold": summarize([latency for latency, _ in cold]),
+        "warm": summarize([latency for latency, _ in warm]),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    os.environ["MEDIA_ENABLED"] = "true"
+    results = asyncio.run(run(args))
+    save_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "image": f"{args.image_width}x{args.image_height}",
+            "width": args.width,
+            "format": args.format,
+            "concurrency": args.concurrency,
+            **results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image-width", type=int, default=4000)
+    parser.add_argument("--image-height", type=int, default=3000)
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--format", default="webp")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
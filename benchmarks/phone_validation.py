@@ -0,0 +1,53 @@
+"""
+Measures per-request cost of validating AuthCodeRequest.phone with the
+previous pydantic_extra_types PhoneNumber type and with the memoized E.164
+normalization.
+
+    python -m benchmarks.phone_validation --requests 100000 --distinct 5000
+"""
+
+import argparse
+import random
+import time
+from typing import Annotated
+
+from pydantic import TypeAdapter
+from pydantic_extra_types.phone_numbers import PhoneNumber
+
+from benchmarks.utils import current_commit, save_results
+from src.auth.schemas import Phone
+from src.auth.utils import normalize_phone
+
+
+def measure(adapter: TypeAdapter, phones: list[str]) -> float:
+    started = time.perf_counter()
+    for phone in phones:
+        adapter.validate_python(phone)
+    return (time.perf_counter() - started) / len(phones) * 1e6
+
+
+def main(args: argparse.Namespace) -> None:
+    distinct = [
+        f"+7 912 {index // 10_000:03d} {index // 100 % 100:02d} {index % 100:02d}"
+        for index in range(args.distinct)
+    ]
+    phones = random.Random(0).choices(distinct, k=args.requests)
+
+    normalize_phone.cache_clear()
+    results = {
+        "commit": current_commit(),
+        "requests": args.requests,
+        "distinct_phones": args.distinct,
+        "phone_number_us": measure(TypeAdapter(Annotated[str, PhoneNumber]), phones),
+        "normalized_cached_us": measure(TypeAdapter(Phone), phones),
+        "cache": normalize_phone.cache_info()._asdict(),
+    }
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=5_000)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
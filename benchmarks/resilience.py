@@ -0,0 +1,217 @@
+"""
+Load shedding under dependency faults.
+
+Postgres and S3 are reached through a local TCP proxy that can delay every
+response (--slow-delay) or drop and refuse connections. Clients keep
+requesting catalog metadata (database) and an object (S3) while the proxy
+goes through the phases healthy, slow, down and healthy again, and the
+status codes and latencies of each phase are reported. --unguarded turns off
+deadlines, admission limits and circuit breakers to compare.
+
+    python -m benchmarks.resilience --concurrency 64 --phase-seconds 10 --output resilience.json
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+
+class FaultProxy:
+    """
+    Forwards TCP connections to the upstream. In "slow" mode every chunk
+    sent back to the client is held for `delay` seconds, in "down" mode open
+    connections are dropped and new ones refused.
+    """
+
+    def __init__(self, upstream_host: str, upstream_port: int) -> None:
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.mode = "healthy"
+        self.delay = 0.0
+        self.port = 0
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    def set_mode(self, mode: str) -> None:
+        self.mode = mode
+        if mode == "down":
+            for writer in list(self._writers):
+                writer.close()
+
+    async def close(self) -> None:
+        self.set_mode("down")
+        self._server.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.mode == "down":
+            writer.close()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                self.upstream_host, self.upstream_port
+            )
+        except OSError:
+            writer.close()
+            return
+        self._writers.update((writer, upstream_writer))
+        try:
+            await asyncio.gather(
+                self._pipe(reader, upstream_writer, delayed=False),
+                self._pipe(upstream_reader, writer, delayed=True),
+            )
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for stream in (writer, upstream_writer):
+                self._writers.discard(stream)
+                stream.close()
+
+    async def _pipe(self, reader, writer, delayed: bool) -> None:
+        while chunk := await reader.read(65536):
+            if delayed and self.mode == "slow":
+                await asyncio.sleep(self.delay)
+            if writer.is_closing():
+                break
+            writer.write(chunk)
+            await writer.drain()
+        writer.close()
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from urllib.parse import urlsplit
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    s3 = urlsplit(os.environ["S3_ENDPOINT_URL"])
+    db_proxy = FaultProxy(os.environ["DB_HOST"], int(os.environ["DB_PORT"]))
+    s3_proxy = FaultProxy(s3.hostname, s3.port or 80)  # type: ignore
+    await db_proxy.start()
+    await s3_proxy.start()
+    os.environ.update(
+        DB_HOST="127.0.0.1",
+        DB_PORT=str(db_proxy.port),
+        S3_ENDPOINT_URL=f"{s3.scheme}://127.0.0.1:{s3_proxy.port}",
+        MEDIA_ENABLED="true",
+        MEDIA_BACKEND="s3",
+        MEDIA_CACHE_DIR="",
+        REQUEST_TIMEOUT_SECONDS=str(args.request_timeout),
+    )
+    if args.unguarded:
+        os.environ.update(
+            REQUEST_TIMEOUT_SECONDS="0",
+            CIRCUIT_FAILURE_THRESHOLD="0",
+            DB_MAX_CONCURRENCY="0",
+            DB_STATEMENT_TIMEOUT_SECONDS="0",
+            S3_MAX_CONCURRENCY="0",
+        )
+
+    import httpx
+
+    from src.core.database import db_guard, engine
+    from src.main import app
+    from src.media.repositories import s3_guard
+
+    transport = httpx.ASGITransport(app=app)  # type: ignore
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+        response = await client.post(
+            "/api/v1/media/", files={"file": ("probe.bin", os.urandom(4096))}
+        )
+        response.raise_for_status()
+        key = response.json()["key"]
+        urls = {
+            "database": f"/api/v1/media/{key}/metadata",
+            "s3": f"/api/v1/media/{key}",
+        }
+
+        phases = {}
+        for phase, mode in (
+            ("healthy", "healthy"),
+            ("slow", "slow"),
+            ("down", "down"),
+            ("recovered", "healthy"),
+        ):
+            db_proxy.delay = s3_proxy.delay = args.slow_delay
+            db_proxy.set_mode(mode)
+            s3_proxy.set_mode(mode)
+            statuses: dict[str, Counter] = defaultdict(Counter)
+            latencies: dict[str, list[float]] = defaultdict(list)
+            stop_at = time.monotonic() + args.phase_seconds
+
+            async def worker(index: int) -> None:
+                target = "database" if index % 2 else "s3"
+                while time.monotonic() < stop_at:
+                    started = time.perf_counter()
+                    response = await client.get(urls[target])
+                    latencies[target].append(time.perf_counter() - started)
+                    statuses[target][response.status_code] += 1
+                    if response.status_code == 503:
+                        # Well-behaved clients honour Retry-After, a little
+                        await asyncio.sleep(0.05)
+
+            started = time.monotonic()
+            await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+            phases[phase] = {
+                "seconds": time.monotonic() - started,
+                **{
+                    target: {
+                        "requests": len(latencies[target]),
+                        "statuses": dict(statuses[target]),
+                        **summarize(latencies[target]),
+                    }
+                    for target in urls
+                },
+                "circuit": {
+                    "database": db_guard.breaker.state,
+                    "s3": s3_guard.breaker.state,
+                },
+            }
+
+        # Let the circuits close again before cleaning up
+        await asyncio.sleep(args.circuit_reset)
+        for _ in range(3):
+            response = await client.delete(f"/api/v1/media/{key}")
+            if response.status_code < 500:
+                break
+            await asyncio.sleep(args.circuit_reset)
+    await engine.dispose()
+    await db_proxy.close()
+    await s3_proxy.close()
+    return phases
+
+
+def main(args: argparse.Namespace) -> None:
+    os.environ.setdefault("CIRCUIT_RESET_SECONDS", str(args.circuit_reset))
+    results = asyncio.run(run(args))
+    save_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "guarded": not args.unguarded,
+            "concurrency": args.concurrency,
+            "request_timeout": args.request_timeout,
+            "slow_delay": args.slow_delay,
+            **results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--phase-seconds", type=float, default=10)
+    parser.add_argument("--slow-delay", type=float, default=3.0)
+    parser.add_argument("--request-timeout", type=float, default=1.0)
+    parser.add_argument("--circuit-reset", type=float, default=2.0)
+    parser.add_argument("--unguarded", action="store_true")
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,132 @@
+"""
+Serialization overhead per response.
+
+Renders typical responses the way FastAPI does by default (response model
+validation and serialization or jsonable_encoder, then JSONResponse with the
+stdlib json) and with FastJSONResponse, and reports the time per response.
+Error bodies are compared between the default HTTPException handler and a
+pre-serialized StaticHTTPException.
+
+    python -m benchmarks.serialization --iterations 20000 --output serialization.json
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.utils import current_commit, save_results
+
+
+def complete(coroutine):
+    """
+    Runs a coroutine that never suspends, without the event loop overhead.
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("coroutine suspended")
+
+
+def per_call_us(fn, iterations: int) -> float:
+    for _ in range(min(iterations, 1000)):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(args: argparse.Namespace) -> dict:
+    from fastapi import HTTPException
+    from fastapi.exception_handlers import http_exception_handler
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+
+    from src.auth.schemas import Token, UserRead
+    from src.core.responses import (
+        FastJSONResponse,
+        StaticHTTPException,
+        static_http_exception_handler,
+    )
+    from src.media.schemas import MediaObjectRead
+
+    def default(field, content):
+        def render():
+            return JSONResponse(
+                complete(serialize_response(field=field, response_content=content))
+            ).body
+
+        return render
+
+    def fast(content):
+        return lambda: FastJSONResponse(content).body
+
+    token = Token(access_token="a" * 300, refresh_token="r" * 200)
+    user = UserRead(id=uuid.uuid4(), phone="+79120000000", superuser=False, active=True)
+    objects = [
+        MediaObjectRead(
+            key=f"{uuid.uuid4().hex}_photo_{index}.jpg",
+            owner_id=uuid.uuid4(),
+            size=123456,
+            content_type="image/jpeg",
+            etag=uuid.uuid4().hex,
+            created_at=datetime.now(tz=timezone.utc),
+        )
+        for index in range(args.page_size)
+    ]
+    message = {"message": "successfully sended authorization code", "challenge": "x" * 64}
+
+    cases = {
+        "token": (create_model_field("token", Token), token),
+        "user": (create_model_field("user", UserRead), user),
+        f"media_page_{args.page_size}": (
+            create_model_field("objects", list[MediaObjectRead]),
+            objects,
+        ),
+        "message_dict": (None, message),
+    }
+    results = {}
+    for name, (field, content) in cases.items():
+        default_us = per_call_us(default(field, content), args.iterations)
+        fast_us = per_call_us(fast(content), args.iterations)
+        results[name] = {
+            "default_us": default_us,
+            "fast_us": fast_us,
+            "speedup": default_us / fast_us,
+        }
+
+    plain = HTTPException(status_code=401, detail="invalid token")
+    static = StaticHTTPException(status_code=401, detail="invalid token")
+    default_us = per_call_us(
+        lambda: complete(http_exception_handler(None, plain)).body,  # type: ignore
+        args.iterations,
+    )
+    fast_us = per_call_us(
+        lambda: complete(static_http_exception_handler(None, static)).body,  # type: ignore
+        args.iterations,
+    )
+    results["error"] = {
+        "default_us": default_us,
+        "fast_us": fast_us,
+        "speedup": default_us / fast_us,
+    }
+    return results
+
+
+def main(args: argparse.Namespace) -> None:
+    results = run(args)
+    save_results(
+        args.output,
+        {"commit": current_commit(), "iterations": args.iterations, **results},
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+"""
+Compares throughput of the production launcher with different worker counts.
+
+Each configuration starts `python -m src.server` on a free port and drives
+an endpoint that needs no database with a fixed number of keep-alive
+connections.
+
+    python -m benchmarks.server_workers --workers 1 4 --output workers.json
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start in time")
+
+
+async def drive(url: str, connections: int, duration: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def connection():
+        nonlocal errors
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = await client.get(url)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        **summarize(latencies),
+    }
+
+
+async def run_workers(workers: int, args: argparse.Namespace) -> dict:
+    port = free_port()
+    env = {
+        **os.environ,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": str(workers),
+    }
+    process = subprocess.Popen([sys.executable, "-m", "src.server"], env=env)
+    url = f"http://127.0.0.1:{port}{args.path}"
+    try:
+        await wait_until_ready(url)
+        await drive(url, args.connections, 1.0)  # warm-up
+        return await drive(url, args.connections, args.duration)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def main(args: argparse.Namespace) -> None:
+    results = {
+        "commit": current_commit(),
+        "cpus": os.cpu_count(),
+        "path": args.path,
+        "connections": args.connections,
+        "workers": {
+            str(workers): await run_workers(workers, args) for workers in args.workers
+        },
+    }
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1]
+    )
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--path", default="/api/v1/health")
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
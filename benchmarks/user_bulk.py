@@ -0,0 +1,161 @@
+"""
+Bulk user import and streaming export.
+
+Starts `python -m src.server` with a single worker, imports --rows generated
+users from a CSV file through /users/import, then downloads the whole table
+through /users/export as CSV and NDJSON. Server peak memory is read from
+/proc, so the export should not grow it with the table size.
+
+    python -m benchmarks.user_bulk --rows 1000000 --output bulk.json
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import asyncpg
+import httpx
+
+from benchmarks.server_workers import free_port, wait_until_ready
+from benchmarks.utils import current_commit, save_results
+from src.auth.utils import create_jwt
+from src.core.config import settings
+from src.core.utils import uuid7
+
+# Imported numbers are +7998NNNNNNN and the superuser making the requests is
+# +79980000000, both are removed afterwards unless --keep is given
+PHONE_PREFIX = "+7998"
+
+
+def peak_memory_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def write_dataset(path: str, rows: int) -> None:
+    with open(path, "w") as file:
+        file.write("phone,superuser,active\n")
+        for n in range(1, rows + 1):
+            file.write(f"{PHONE_PREFIX}{n:07d},false,true\n")
+
+
+async def create_superuser() -> str:
+    connection = await asyncpg.connect(settings.db.url.replace("+asyncpg", ""))
+    try:
+        user_id = await connection.fetchval(
+            "INSERT INTO users (id, phone, superuser, active) "
+            "VALUES ($1, $2, true, true) "
+            "ON CONFLICT (phone) DO UPDATE SET superuser = true RETURNING id",
+            uuid7(),
+            PHONE_PREFIX + "0000000",
+        )
+    finally:
+        await connection.close()
+    return create_jwt(
+        token_type="access",
+        token_data={"sub": user_id.hex, "superuser": True, "active": True},
+    )
+
+
+async def cleanup() -> None:
+    connection = await asyncpg.connect(settings.db.url.replace("+asyncpg", ""))
+    try:
+        await connection.execute(
+            "DELETE FROM users WHERE phone LIKE $1", PHONE_PREFIX + "%"
+        )
+    finally:
+        await connection.close()
+
+
+async def export(client: httpx.AsyncClient, format: str, pid: int) -> dict:
+    started = time.perf_counter()
+    first_byte = None
+    size = lines = 0
+    async with client.stream(
+        "GET", "/api/v1/users/export", params={"format": format}
+    ) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": lines,
+        "seconds": elapsed,
+        "rows_per_second": lines / elapsed,
+        "first_byte_ms": (first_byte or 0.0) * 1000,
+        "mb": size / 2**20,
+        "server_peak_mb": peak_memory_mb(pid),
+    }
+
+
+async def run(args: argparse.Namespace, dataset: str) -> dict:
+    token = await create_superuser()
+    port = free_port()
+    env = {
+        **os.environ,
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_WORKERS": "1",
+    }
+    process = subprocess.Popen([sys.executable, "-m", "src.server"], env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url + "/api/v1/health")
+        results: dict = {"server_start_mb": peak_memory_mb(process.pid)}
+        async with httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": "Bearer " + token},
+            timeout=None,
+        ) as client:
+            started = time.perf_counter()
+            with open(dataset, "rb") as file:
+                response = await client.post(
+                    "/api/v1/users/import",
+                    files={"file": ("users.csv", file, "text/csv")},
+                )
+            response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            results["import"] = {
+                **response.json(),
+                "seconds": elapsed,
+                "rows_per_second": args.rows / elapsed,
+                "server_peak_mb": peak_memory_mb(process.pid),
+            }
+            for format in ("csv", "ndjson"):
+                results[f"export_{format}"] = await export(
+                    client, format, process.pid
+                )
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        dataset = os.path.join(directory, "users.csv")
+        write_dataset(dataset, args.rows)
+        try:
+            results = asyncio.run(run(args, dataset))
+        finally:
+            if not args.keep:
+                asyncio.run(cleanup())
+    save_results(args.output, {"commit": current_commit(), "rows": args.rows, **results})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,45 @@
+import json
+import statistics
+import subprocess
+from pathlib import Path
+
+
+def percentile(values: list[float], p: float) -> float:
+    """
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 50)
+    2.5
+    """
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    """Returns latency percentiles in milliseconds."""
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(path: str | None, results: dict) -> None:
+    rendered = json.dumps(results, indent=2)
+    print(rendered)
+    if path:
+        Path(path).write_text(rendered + "\n")
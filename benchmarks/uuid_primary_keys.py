@@ -0,0 +1,84 @@
+"""
+Compares insert throughput and primary key index size for UUIDv4 and UUIDv7
+keys. Each variant gets its own table shaped like `auth_codes`, which is
+dropped afterwards.
+
+    python -m benchmarks.uuid_primary_keys --rows 2000000 --output uuid.json
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+import asyncpg
+
+from benchmarks.utils import current_commit, save_results
+from src.core.config import settings
+from src.core.utils import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+async def run_variant(
+    connection: asyncpg.Connection, name: str, rows: int, batch: int
+) -> dict:
+    table = f"benchmark_{name}"
+    generate = GENERATORS[name]
+    await connection.execute(f"DROP TABLE IF EXISTS {table}")
+    await connection.execute(
+        f"CREATE TABLE {table} ("
+        "id uuid PRIMARY KEY, code varchar NOT NULL, phone varchar NOT NULL, "
+        "expiry timestamptz NOT NULL)"
+    )
+    expiry = datetime.now(tz=timezone.utc)
+    started = time.perf_counter()
+    try:
+        for offset in range(0, rows, batch):
+            records = [
+                (generate(), "000000", "+79120000000", expiry)
+                for _ in range(min(batch, rows - offset))
+            ]
+            await connection.executemany(
+                f"INSERT INTO {table} (id, code, phone, expiry) "
+                "VALUES ($1, $2, $3, $4)",
+                records,
+            )
+        elapsed = time.perf_counter() - started
+        index_bytes = await connection.fetchval(
+            f"SELECT pg_relation_size('{table}_pkey')"
+        )
+        table_bytes = await connection.fetchval(f"SELECT pg_relation_size('{table}')")
+        return {
+            "rows": rows,
+            "seconds": elapsed,
+            "rows_per_second": rows / elapsed,
+            "index_mb": index_bytes / 2**20,
+            "table_mb": table_bytes / 2**20,
+        }
+    finally:
+        await connection.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    connection = await asyncpg.connect(settings.db.url.replace("+asyncpg", ""))
+    try:
+        results = {
+            "commit": current_commit(),
+            **{
+                name: await run_variant(connection, name, args.rows, args.batch)
+                for name in GENERATORS
+            },
+        }
+    finally:
+        await connection.close()
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--output", default=None)
+    asyncio.run(main(parser.parse_args()))
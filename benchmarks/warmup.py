@@ -0,0 +1,113 @@
+"""
+Latency of the first requests after startup, with and without the
+connection pool warm-up.
+
+Every run starts a fresh interpreter with WARMUP_CONNECTIONS set, runs the
+app lifespan and sends one wave of --concurrency authenticated requests to
+/jwt/me, the first the worker serves. Without the warm-up they wait for
+connections to be opened and for their statements to be compiled and
+prepared.
+
+    python -m benchmarks.warmup --concurrency 16 --runs 5 --output warmup.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import current_commit, save_results, summarize
+
+PHONE = "+79990000050"
+
+
+async def create_token() -> str:
+    from src.auth.models import User
+    from src.auth.repositories import AuthRepository
+    from src.auth.service import AuthService
+    from src.core.database import async_session_maker
+
+    async with async_session_maker() as session:
+        service = AuthService(AuthRepository(session=session, model=User), None, None, None)  # type: ignore
+        user = await service.get_or_create_user(PHONE)
+        return service.create_access_token(user)
+
+
+async def first_wave(token: str, concurrency: int) -> dict:
+    import httpx
+
+    from src.core.startup import startup_timer
+    from src.main import app
+
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        lifespan = time.perf_counter() - started
+        transport = httpx.ASGITransport(app=app)  # type: ignore
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+
+            async def request() -> float:
+                started = time.perf_counter()
+                response = await client.get(
+                    "/api/v1/jwt/me", headers={"Authorization": f"Bearer {token}"}
+                )
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+            latencies = await asyncio.gather(*(request() for _ in range(concurrency)))
+    return {
+        "lifespan_ms": lifespan * 1000,
+        "warm_up_ms": startup_timer.steps.get("warm_up", 0.0) * 1000,
+        "latencies": latencies,
+    }
+
+
+def run(connections: int, token: str, concurrency: int) -> dict:
+    process = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.warmup",
+            "--child", "--token", token, "--concurrency", str(concurrency),
+        ],
+        env={**os.environ, "WARMUP_CONNECTIONS": str(connections), "LOG_LEVEL": "WARNING"},
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.child:
+        print(json.dumps(asyncio.run(first_wave(args.token, args.concurrency))))
+        return
+    token = asyncio.run(create_token())
+    results = {}
+    for connections in (0, args.connections):
+        runs = [run(connections, token, args.concurrency) for _ in range(args.runs)]
+        results[f"warmup_{connections}"] = {
+            "lifespan_ms": sum(r["lifespan_ms"] for r in runs) / len(runs),
+            "warm_up_ms": sum(r["warm_up_ms"] for r in runs) / len(runs),
+            **summarize([latency for r in runs for latency in r["latencies"]]),
+        }
+    save_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "concurrency": args.concurrency,
+            "runs": args.runs,
+            **results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--connections", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--token", help=argparse.SUPPRESS)
+    main(parser.parse_args())
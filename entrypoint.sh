@@ -1,3 +1,4 @@
 #!/bin/sh
-alembic upgrade head
-fastapi run src/main.py --port 80
\ No newline at end of file
+# Exits early when the schema is current, waits if another replica migrates
+python -m src.core.migrate || exit 1
+exec python -m src.server
@@ -0,0 +1,73 @@
+"""
+Index operations that keep big tables writable.
+
+CREATE INDEX CONCURRENTLY builds an index without blocking writes to the
+table, but can not run inside a transaction. These helpers run it in an
+autocommit block, so a migration can mix them with regular operations:
+
+    from migrations import concurrently
+
+    def upgrade() -> None:
+        concurrently.create_index("ix_users_created_at", "users", ["created_at"])
+"""
+
+from typing import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+
+def _is_invalid(index_name: str) -> bool:
+    if op.get_context().as_sql:
+        # Offline mode has no database to look at
+        return False
+    return bool(
+        op.get_bind().scalar(
+            sa.text(
+                "SELECT NOT indisvalid FROM pg_index "
+                "WHERE indexrelid = to_regclass(:name)"
+            ),
+            {"name": index_name},
+        )
+    )
+
+
+def create_index(
+    index_name: str, table_name: str, columns: Sequence[str], **kwargs
+) -> None:
+    """
+    Builds an index with CREATE INDEX CONCURRENTLY, unless it exists.
+
+    A concurrent build that failed or was interrupted leaves an invalid
+    index behind. It is dropped and built again instead of being taken for
+    a finished one, so the migration can simply be rerun.
+    """
+    with op.get_context().autocommit_block():
+        if _is_invalid(index_name):
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kwargs,
+        )
+
+
+def drop_index(index_name: str, table_name: str) -> None:
+    """
+    Drops an index with DROP INDEX CONCURRENTLY, if it exists.
+    """
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
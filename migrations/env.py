@@ -1,4 +1,7 @@
 import asyncio
+import logging
+import time
+from contextlib import contextmanager
 from logging.config import fileConfig
 
 from sqlalchemy import pool
@@ -10,6 +13,8 @@ from alembic import context
 from src.core.config import settings
 from src.core.database import Base
 from src.auth.models import User  # noqa: F401
+from src.media.models import MediaContent  # noqa: F401
+from src.core.models import IdempotencyRecord  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -33,6 +38,11 @@ target_metadata = Base.metadata
 
 config.set_main_option("sqlalchemy.url", settings.db.url + "?async_fallback=True")
 
+logger = logging.getLogger("alembic.env")
+
+# Key of the advisory lock held while migrating, the same for all replicas
+MIGRATION_LOCK_ID = 7_362_014_580
+
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -58,11 +68,49 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
-def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+@contextmanager
+def migration_lock(connection: Connection):
+    """
+    Holds a session-level advisory lock, so replicas running `alembic upgrade`
+    at the same time migrate one after another and the later ones find the
+    database current. Unlike a transaction-level lock it outlives the commits
+    of the migrations, including those of CONCURRENTLY operations.
+    """
+    lock = f"SELECT pg_try_advisory_lock({MIGRATION_LOCK_ID})"
+    deadline = time.monotonic() + settings.db.migration_lock_timeout_seconds
+    if not connection.exec_driver_sql(lock).scalar():
+        logger.info("Waiting for another migration to finish")
+        while True:
+            # No transaction is left open while waiting, it would hold up the
+            # concurrent index builds of the migration running
+            connection.rollback()
+            if time.monotonic() > deadline:
+                raise TimeoutError("migration lock not acquired in time")
+            time.sleep(1)
+            if connection.exec_driver_sql(lock).scalar():
+                break
+    connection.commit()
+    try:
+        yield
+    finally:
+        if connection.in_transaction():
+            connection.rollback()
+        connection.exec_driver_sql(f"SELECT pg_advisory_unlock({MIGRATION_LOCK_ID})")
+        connection.commit()
 
-    with context.begin_transaction():
-        context.run_migrations()
+
+def do_run_migrations(connection: Connection) -> None:
+    with migration_lock(connection):
+        # A migration per transaction, so the ones already applied stay
+        # applied when a later one fails
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            transaction_per_migration=True,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
 
 
 async def run_async_migrations() -> None:
@@ -0,0 +1,53 @@
+"""add admin search indexes
+
+Revision ID: 4b1e7a9c2d38
+Revises: dc332d552e7e
+Create Date: 2026-10-19 19:12:05.481320
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1e7a9c2d38'
+down_revision: Union[str, None] = 'dc332d552e7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps the tables writable while the indexes are built,
+    # but can not run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_users_phone_pattern', 'users', ['phone'], unique=False,
+            postgresql_ops={'phone': 'varchar_pattern_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_auth_codes_phone_pattern', 'auth_codes', ['phone'], unique=False,
+            postgresql_ops={'phone': 'varchar_pattern_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            op.f('ix_blacklist_tokens_user_id'), 'blacklist_tokens', ['user_id'],
+            unique=False, postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            op.f('ix_blacklist_tokens_user_id'), table_name='blacklist_tokens',
+            postgresql_concurrently=True, if_exists=True,
+        )
+        op.drop_index(
+            'ix_auth_codes_phone_pattern', table_name='auth_codes',
+            postgresql_concurrently=True, if_exists=True,
+        )
+        op.drop_index(
+            'ix_users_phone_pattern', table_name='users',
+            postgresql_concurrently=True, if_exists=True,
+        )
@@ -0,0 +1,62 @@
+"""normalize phones to e164
+
+Revision ID: dc332d552e7e
+Revises: 792d9f2f548b
+Create Date: 2026-10-19 16:49:40.844809
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dc332d552e7e'
+down_revision: Union[str, None] = '792d9f2f548b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+E164_PATTERN = r"^\+[1-9][0-9]{1,14}$"
+# RFC 3966 values like 'tel:+7-912-000-00-01' become '+79120000001', values
+# in E.164 already stay the same
+NORMALIZED_PHONE = "'+' || regexp_replace(split_part(phone, ';', 1), '[^0-9]', '', 'g')"
+
+
+def check_duplicate_users() -> None:
+    """
+    Fails the upgrade if spellings of one number belong to different users,
+    the update would break the unique phone index. Such users are to be
+    merged by hand, they may each have tokens and media.
+    """
+    duplicates = op.get_bind().exec_driver_sql(
+        f"SELECT {NORMALIZED_PHONE}, array_agg(id::text ORDER BY id) FROM users "
+        "GROUP BY 1 HAVING count(*) > 1 ORDER BY 1 LIMIT 20"
+    ).all()
+    if duplicates:
+        lines = "\n".join(f"  {phone}: {', '.join(ids)}" for phone, ids in duplicates)
+        raise RuntimeError(
+            "users with phones that normalize to the same number, merge them "
+            f"before upgrading (at most 20 shown):\n{lines}"
+        )
+
+
+def normalize_phones(table: str) -> None:
+    op.execute(
+        f"UPDATE {table} SET phone = {NORMALIZED_PHONE} "
+        f"WHERE phone !~ '{E164_PATTERN}'"
+    )
+
+
+def upgrade() -> None:
+    check_duplicate_users()
+    normalize_phones("users")
+    normalize_phones("auth_codes")
+    op.create_check_constraint(
+        op.f("ck_users_phone_e164"), "users", f"phone ~ '{E164_PATTERN}'"
+    )
+
+
+def downgrade() -> None:
+    # Stored numbers stay in E.164, the previous format can not be restored
+    op.drop_constraint(op.f("ck_users_phone_e164"), "users", type_="check")
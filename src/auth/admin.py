@@ -1,7 +1,72 @@
-from sqladmin import ModelView
+import re
 
-from src.auth.models import User
+from sqladmin import Admin
+from sqlalchemy import Select, select
+from starlette.applications import Starlette
+from starlette.routing import Mount
 
+from src.auth.models import AuthCode, BlacklistToken, User
+from src.core.admin import ScalableModelView
+from src.core.compression import PrecompressedStaticFiles
+from src.core.config import settings
+from src.core.database import engine
 
-class UserAdmin(ModelView, model=User):
+
+def phone_prefix(term: str) -> str:
+    """
+    Turns a search term into an E.164 prefix, so `8 (912) 3` and `+7912 3`
+    both search for numbers starting with `+79123`.
+    """
+    digits = re.sub(r"\D", "", term)
+    if len(digits) > 1 and digits[0] == "8":
+        digits = "7" + digits[1:]
+    return "+" + digits
+
+
+class UserAdmin(ScalableModelView, model=User):
     column_list = [User.id, User.phone, User.superuser, User.active]
+    column_searchable_list = [User.phone]
+    column_sortable_list = [User.id, User.phone]
+    column_default_sort = [(User.id, True)]
+
+    def search_query(self, stmt: Select, term: str) -> Select:
+        return stmt.where(User.phone.startswith(phone_prefix(term), autoescape=True))
+
+
+class AuthCodeAdmin(ScalableModelView, model=AuthCode):
+    column_list = [AuthCode.id, AuthCode.phone, AuthCode.expiry]
+    column_searchable_list = [AuthCode.phone]
+    column_sortable_list = [AuthCode.id]
+    column_default_sort = [(AuthCode.id, True)]
+
+    def search_query(self, stmt: Select, term: str) -> Select:
+        return stmt.where(
+            AuthCode.phone.startswith(phone_prefix(term), autoescape=True)
+        )
+
+
+class BlacklistTokenAdmin(ScalableModelView, model=BlacklistToken):
+    column_list = [BlacklistToken.id, BlacklistToken.user_id]
+    column_searchable_list = [User.phone]
+    column_sortable_list = [BlacklistToken.id]
+
+    def search_query(self, stmt: Select, term: str) -> Select:
+        users = select(User.id).where(
+            User.phone.startswith(phone_prefix(term), autoescape=True)
+        )
+        return stmt.where(BlacklistToken.user_id.in_(users))
+
+
+def create_admin_app() -> Starlette:
+    admin = Admin(app=Starlette(), engine=engine)
+    admin.add_view(UserAdmin)
+    admin.add_view(AuthCodeAdmin)
+    admin.add_view(BlacklistTokenAdmin)
+    for route in admin.admin.routes:
+        if isinstance(route, Mount) and route.name == "statics":
+            # Serve the precompressed CSS and JS instead of the plain files
+            route.app = route._base_app = PrecompressedStaticFiles(
+                packages=["sqladmin"],
+                cache_dir=settings.compression.static_cache_dir,
+            )
+    return admin.admin
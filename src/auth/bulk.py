@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, BinaryIO, Iterable, Iterator, Literal
+
+from starlette.concurrency import run_in_threadpool
+
+import src.auth.exceptions as auth_exc
+from src.auth.models import User
+from src.auth.repositories import AuthRepository
+from src.auth.utils import normalize_phone
+from src.core.database import async_session_maker
+from src.core.utils import uuid7
+
+ExportFormat = Literal["csv", "ndjson"]
+
+media_types: dict[ExportFormat, str] = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+export_columns = ("id", "phone", "superuser", "active")
+import_columns = ["id", "phone", "superuser", "active"]
+
+
+def encode_rows(rows, format: ExportFormat) -> str:
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps(
+            {"id": str(id), "phone": phone, "superuser": superuser, "active": active}
+        )
+        + "\n"
+        for id, phone, superuser, active in rows
+    )
+
+
+async def export_users(
+    format: ExportFormat, batch_size: int = 10_000
+) -> AsyncIterator[str]:
+    """
+    Yields the users table encoded as CSV or NDJSON, one chunk per batch.
+
+    Opens its own session, since the response is streamed after request
+    dependencies are closed.
+    """
+    if format == "csv":
+        yield ",".join(export_columns) + "\r\n"
+    async with async_session_maker() as session:
+        repository = AuthRepository(session=session, model=User)
+        async for rows in repository.stream(*export_columns, batch_size=batch_size):
+            yield encode_rows(rows, format)
+
+
+def parse_bool(value, default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        return value
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValueError(f"invalid boolean '{value}'")
+
+
+def parse_records(
+    rows: Iterable[tuple[int, Any]], format: ExportFormat
+) -> tuple[list[tuple], list[str]]:
+    """
+    :param rows: Line number and CSV row as a dict or NDJSON line.
+    """
+    records, errors = [], []
+    for number, row in rows:
+        try:
+            fields = row if format == "csv" else json.loads(row)
+            records.append(
+                (
+                    uuid7(),
+                    normalize_phone(fields["phone"]),
+                    parse_bool(fields.get("superuser"), False),
+                    parse_bool(fields.get("active"), True),
+                )
+            )
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            errors.append(f"line {number}: {e!r}")
+    return records, errors
+
+
+class UserImport:
+    """
+    Reads users from an uploaded CSV or NDJSON file and feeds them to COPY
+    in batches. CSV columns are found by the header, so an export can be
+    imported back; `phone` is required, `superuser` and `active` optional
+    and others, such as `id`, ignored. Rows are parsed in a worker thread
+    so phone validation does not block the event loop.
+    """
+
+    max_errors = 100
+
+    def __init__(
+        self, file: BinaryIO, format: ExportFormat, batch_size: int = 10_000
+    ) -> None:
+        self.file = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        self.format = format
+        self.batch_size = batch_size
+        self.rejected = 0
+        self.errors: list[str] = []
+        self._reader: Any = None
+        self._rows: Iterator[tuple[int, Any]] | None = None
+
+    def _open(self) -> Iterator[tuple[int, Any]]:
+        if self.format == "csv":
+            # One reader for the whole file, quoted fields may span lines
+            reader = self._reader = csv.DictReader(self.file)
+            if "phone" not in (reader.fieldnames or ()):
+                raise auth_exc.import_without_phone_column
+            return ((reader.line_num, row) for row in reader)
+        return (
+            (number, line)
+            for number, line in enumerate(self.file, 1)
+            if line.strip()
+        )
+
+    def _read_batch(self) -> tuple[list[tuple], list[str], int]:
+        rows, errors = [], []
+        try:
+            for row in self._rows:  # type: ignore
+                rows.append(row)
+                if len(rows) >= self.batch_size:
+                    break
+        except csv.Error as e:
+            # The reader can not go on past a malformed row
+            errors.append(f"line {self._reader.line_num}: {e!r}")
+            self._rows = iter(())
+        records, parse_errors = parse_records(rows, self.format)
+        return records, errors + parse_errors, len(rows) + len(errors)
+
+    async def records(self) -> AsyncIterator[tuple]:
+        while True:
+            records, errors, read = await run_in_threadpool(self._read_batch)
+            if not read:
+                return
+            self.rejected += len(errors)
+            self.errors.extend(errors[: self.max_errors - len(self.errors)])
+            for record in records:
+                yield record
+
+    async def run(self, repository: AuthRepository) -> dict:
+        """
+        :raises HTTPException: 400 if the CSV header has no phone column.
+        """
+        # Reads the CSV header, before COPY starts
+        self._rows = await run_in_threadpool(self._open)
+        imported = await repository.copy_upsert(
+            columns=import_columns,
+            records=self.records(),
+            conflict="phone",
+            update=["superuser", "active"],
+        )
+        return {"imported": imported, "rejected": self.rejected, "errors": self.errors}
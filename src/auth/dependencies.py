@@ -2,16 +2,36 @@ from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth.models import AuthCode, BlacklistToken, User
+import src.auth.exceptions as auth_exc
+from src.auth.models import AuthCode, BlacklistToken, UsedChallenge, User
 from src.auth.repositories import (
     AuthCodeRepository,
     AuthRepository,
     BlacklistTokenRepository,
+    UsedChallengeRepository,
 )
 from src.auth.service import AuthService
+from src.core.config import settings
 from src.core.dependencies import get_async_session
+from src.core.idempotency import IdempotencyStore, idempotency_dependency
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/jwt/login/")
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl="/api/v1/jwt/login/", auto_error=False
+)
+
+# Token responses are replayed only while the code would be valid, and are
+# kept encrypted in the shared table
+get_token_idempotency = idempotency_dependency(
+    IdempotencyStore(
+        ttl_seconds=min(
+            settings.idempotency.ttl_seconds, settings.auth.auth_code_expire_seconds
+        ),
+        lock_seconds=settings.idempotency.lock_seconds,
+        cache_size=settings.idempotency.cache_size,
+        secret=settings.auth.secret,
+    )
+)
 
 
 async def get_auth_repository(session: AsyncSession = Depends(get_async_session)):
@@ -33,17 +53,28 @@ async def get_auth_code_repository(
     yield repository
 
 
+async def get_used_challenge_repository(
+    session: AsyncSession = Depends(get_async_session),
+):
+    repository = UsedChallengeRepository(session=session, model=UsedChallenge)
+    yield repository
+
+
 async def get_auth_service(
     users_repository: AuthRepository = Depends(get_auth_repository),
     blacklist_token_repository: BlacklistTokenRepository = Depends(
         get_blacklist_token_repository
     ),
     auth_code_repository: AuthCodeRepository = Depends(get_auth_code_repository),
+    used_challenge_repository: UsedChallengeRepository = Depends(
+        get_used_challenge_repository
+    ),
 ):
     service = AuthService(
         users_repository=users_repository,
         blacklist_token_repository=blacklist_token_repository,
         auth_code_repository=auth_code_repository,
+        used_challenge_repository=used_challenge_repository,
     )
     yield service
 
@@ -54,3 +85,20 @@ async def get_current_active_auth_user(
 ):
     user = await users_service.get_current_active_auth_user(token=token)
     yield user
+
+
+async def get_optional_active_auth_user(
+    users_service: AuthService = Depends(get_auth_service),
+    token: str | None = Depends(optional_oauth2_scheme),
+):
+    """Returns the user of the token, or None for anonymous requests."""
+    if token is None:
+        yield None
+        return
+    yield await users_service.get_current_active_auth_user(token=token)
+
+
+async def get_current_superuser(user: User = Depends(get_current_active_auth_user)):
+    if not user.superuser:
+        raise auth_exc.not_superuser
+    yield user
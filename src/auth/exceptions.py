@@ -1,16 +1,22 @@
 from fastapi import HTTPException, status
 
-unauthenticated = HTTPException(
+from src.core.responses import StaticHTTPException
+
+unauthenticated = StaticHTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid username or password"
 )
 
-not_found = HTTPException(
+not_found = StaticHTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED, detail="user not found"
 )
 
-inactive = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="user inactive")
+inactive = StaticHTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="user inactive")
+
+not_superuser = StaticHTTPException(
+    status_code=status.HTTP_403_FORBIDDEN, detail="superuser required"
+)
 
-invalid_token = HTTPException(
+invalid_token = StaticHTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token"
 )
 
@@ -21,18 +27,33 @@ def invalid_token_type(received_type: str, expected_type: str) -> HTTPException:
         detail=f"invaild token type '{received_type}', expected '{expected_type}'",
     )
 
-failed_to_create = HTTPException(
+failed_to_create = StaticHTTPException(
     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="failed to create user"
 )
 
-no_matching_auth_code = HTTPException(
+no_matching_auth_code = StaticHTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED, detail="matching authorization code was not found"
 )
 
-expired_auth_code = HTTPException(
+expired_auth_code = StaticHTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED, detail="provided auth code is expired"
 )
 
-wrong_phone = HTTPException(
+used_auth_code = StaticHTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED, detail="provided auth code was already used"
+)
+
+wrong_phone = StaticHTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,  detail="wrong phone number"
-)
\ No newline at end of file
+)
+
+password_hashing_overloaded = StaticHTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="too many concurrent password operations",
+    headers={"Retry-After": "1"},
+)
+
+import_without_phone_column = StaticHTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="CSV header has no phone column",
+)
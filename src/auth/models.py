@@ -1,33 +1,63 @@
 from datetime import datetime
 import uuid
 
-from sqlalchemy import DateTime, ForeignKey
+from sqlalchemy import CheckConstraint, DateTime, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import UUID
 
 from src.core.database import Base
+from src.core.utils import uuid7
+
+E164_PATTERN = r"^\+[1-9][0-9]{1,14}$"
 
 
 class User(Base):
-    id: Mapped[uuid.UUID] = mapped_column(
-        UUID, primary_key=True, index=True, default=uuid.uuid4
+    __table_args__ = (
+        CheckConstraint(f"phone ~ '{E164_PATTERN}'", name="phone_e164"),
+        # Serves prefix searches (LIKE '+7912%') regardless of the collation
+        Index(
+            "ix_users_phone_pattern",
+            "phone",
+            postgresql_ops={"phone": "varchar_pattern_ops"},
+        ),
     )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True, default=uuid7)
     phone: Mapped[str] = mapped_column(unique=True, index=True, nullable=False)
     superuser: Mapped[bool] = mapped_column(default=False, nullable=False)
     active: Mapped[bool] = mapped_column(default=True, nullable=False)
 
 
 class BlacklistToken(Base):
-    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True, index=True)
-    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
+    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), index=True)
 
     user: Mapped["User"] = relationship()
 
 
 class AuthCode(Base):
-    id: Mapped[uuid.UUID] = mapped_column(
-        UUID, primary_key=True, index=True, default=uuid.uuid4
+    __table_args__ = (
+        Index(
+            "ix_auth_codes_phone_pattern",
+            "phone",
+            postgresql_ops={"phone": "varchar_pattern_ops"},
+        ),
     )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True, default=uuid7)
     code: Mapped[str] = mapped_column()
     phone: Mapped[str] = mapped_column()
-    expiry: Mapped[datetime] = mapped_column(DateTime(timezone=True))
\ No newline at end of file
+    expiry: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class UsedChallenge(Base):
+    """
+    Stateless challenge that was verified, so no worker verifies it again.
+    Kept until the challenge itself expires.
+    """
+
+    # jti of the challenge
+    id: Mapped[str] = mapped_column(primary_key=True)
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
@@ -1,13 +1,75 @@
-from src.auth.models import AuthCode, BlacklistToken, User
+from datetime import datetime, timezone
+import uuid
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.models import AuthCode, BlacklistToken, UsedChallenge, User
+from src.core.database import async_session_maker
+from src.core.housekeeping import housekeeping
 from src.core.repository import SQLAlchemyRepository
 
 
 class AuthRepository(SQLAlchemyRepository[User]):
-    pass
+    # Bursts of requests from one user all look it up by the token subject
+    coalesce_reads = True
 
 
 class BlacklistTokenRepository(SQLAlchemyRepository[BlacklistToken]):
-    pass
+    loading = {"user": "joined"}
+
 
 class AuthCodeRepository(SQLAlchemyRepository[AuthCode]):
-    pass
\ No newline at end of file
+    pass
+
+
+class UsedChallengeRepository(SQLAlchemyRepository[UsedChallenge]):
+    async def use(self, challenge_id: str, expires_at: datetime) -> bool:
+        """
+        Records the challenge as used.
+
+        :return: False if it was used already.
+        """
+        result = await self.session.execute(
+            insert(UsedChallenge)
+            .values(id=challenge_id, expires_at=expires_at)
+            .on_conflict_do_nothing()
+            .returning(UsedChallenge.id)
+        )
+        await self.session.commit()
+        return result.scalar_one_or_none() is not None
+
+
+async def purge_used_challenges() -> int:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            delete(UsedChallenge).where(
+                UsedChallenge.expires_at < datetime.now(tz=timezone.utc)
+            )
+        )
+        await session.commit()
+    return result.rowcount
+
+
+housekeeping.add_purge("used challenges", purge_used_challenges)
+
+
+async def warm_up(session: AsyncSession) -> None:
+    """
+    Runs the lookups of login, token refresh and authenticated requests
+    once on the connection of the session, so their statements are compiled
+    and prepared before the first request. Nothing is found or changed.
+    """
+    await AuthRepository(session=session, model=User).get_by(
+        field="id", value=uuid.uuid4().hex, unique=True
+    )
+    await AuthRepository(session=session, model=User).get_by(
+        field="phone", value="+10000000000", unique=True
+    )
+    await BlacklistTokenRepository(session=session, model=BlacklistToken).get_by(
+        field="id", value=uuid.uuid4(), unique=True
+    )
+    await AuthCodeRepository(session=session, model=AuthCode).get_by(
+        field="code", value="", unique=True
+    )
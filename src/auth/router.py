@@ -1,21 +1,41 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, status
+from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile, status
+from fastapi.responses import StreamingResponse
 
-from src.auth.dependencies import get_auth_service
-from src.auth.schemas import Token, AuthCodeRequest, AuthCodeVerify
+from src.auth.bulk import ExportFormat, UserImport, export_users, media_types
+from src.auth.dependencies import (
+    get_auth_repository,
+    get_auth_service,
+    get_current_active_auth_user,
+    get_current_superuser,
+    get_token_idempotency,
+)
+from src.auth.repositories import AuthRepository
+from src.auth.models import User
+from src.auth.schemas import Token, AuthCodeRequest, AuthCodeVerify, UserRead
 from src.auth.service import AuthService
+from src.core.idempotency import Idempotency, get_idempotency
+from src.core.resilience import DeadlineExceeded, DependencyUnavailable
+from src.core.responses import FastJSONResponse
 
 auth_router = APIRouter(prefix="/jwt", tags=["JWT"])
+users_router = APIRouter(
+    prefix="/users", tags=["Users"], dependencies=[Depends(get_current_superuser)]
+)
 
 
 @auth_router.post("/verify_code", response_model=Token)
 async def verify_code(
     auth_code_verify_schema: AuthCodeVerify,
+    idempotency: Idempotency = Depends(get_token_idempotency),
     auth_service: AuthService = Depends(get_auth_service),
-) -> Token:
+) -> FastJSONResponse:
     try:
-        return await auth_service.verify_code(
+        token = await auth_service.verify_code(
             auth_code_verify_schema=auth_code_verify_schema
         )
+        return idempotency.save(FastJSONResponse(token))
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -26,13 +46,19 @@ async def verify_code(
 @auth_router.post("/request_code")
 async def request_code(
     auth_code_request_schema: AuthCodeRequest,
+    idempotency: Idempotency = Depends(get_idempotency),
     auth_service: AuthService = Depends(get_auth_service),
 ):
     try:
-        await auth_service.request_code(
+        challenge = await auth_service.request_code(
             auth_code_request_schema=auth_code_request_schema
         )
-        return {"message": "successfully sended authorization code"}
+        response = {"message": "successfully sended authorization code"}
+        if challenge:
+            response.update(challenge=challenge)
+        return idempotency.save(FastJSONResponse(response))
+    except (DependencyUnavailable, DeadlineExceeded):
+        raise
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -43,7 +69,38 @@ async def request_code(
 @auth_router.post("/refresh", response_model=Token)
 async def refresh_jwt(
     refresh_token: str = Form(), auth_service: AuthService = Depends(get_auth_service)
-) -> Token:
+) -> FastJSONResponse:
     payload = auth_service.get_current_token_payload(refresh_token)
     token: Token = await auth_service.refresh_token(payload)
-    return token
+    return FastJSONResponse(token)
+
+
+@auth_router.get("/me", response_model=UserRead)
+async def get_me(
+    user: User = Depends(get_current_active_auth_user),
+) -> FastJSONResponse:
+    return FastJSONResponse(UserRead.model_validate(user))
+
+
+@users_router.get("/export")
+async def export(format: ExportFormat = "csv") -> StreamingResponse:
+    return StreamingResponse(
+        export_users(format),
+        media_type=media_types[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+@users_router.post("/import")
+async def import_(
+    file: UploadFile,
+    format: ExportFormat = "csv",
+    repository: AuthRepository = Depends(get_auth_repository),
+) -> FastJSONResponse:
+    """
+    Creates users from a CSV with a header or an NDJSON file, in the format
+    of the export; `phone` is required, `superuser` and `active` optional.
+    Existing phones get their flags updated, invalid lines are skipped and
+    reported.
+    """
+    return FastJSONResponse(await UserImport(file.file, format).run(repository))
@@ -1,14 +1,21 @@
 from typing import Annotated
-from pydantic import StringConstraints
-from pydantic_extra_types.phone_numbers import PhoneNumber
+import uuid
+from pydantic import AfterValidator, StringConstraints
+from src.auth.utils import normalize_phone
 from src.core.schemas import BaseModel
 from src.core.config import settings
 
 auth_code_length = settings.auth.auth_code_length
 
+Phone = Annotated[
+    str,
+    StringConstraints(min_length=7, max_length=64),
+    AfterValidator(normalize_phone),
+]
+
 
 class AuthCodeRequest(BaseModel):
-    phone: Annotated[str, PhoneNumber]
+    phone: Phone
 
 
 class AuthCodeVerify(AuthCodeRequest):
@@ -19,9 +26,17 @@ class AuthCodeVerify(AuthCodeRequest):
             min_length=auth_code_length,
         ),
     ]
+    challenge: str | None = None
 
 
 class Token(BaseModel):
     access_token: str
     refresh_token: str
     token_type: str = "Bearer"
+
+
+class UserRead(BaseModel):
+    id: uuid.UUID
+    phone: str
+    superuser: bool
+    active: bool
@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta, timezone
+import hmac
+import logging
 import uuid
 
-from jwt.exceptions import InvalidTokenError
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 
 import src.auth.exceptions as auth_exc
 import src.auth.utils as auth_utils
@@ -10,29 +12,54 @@ from src.auth.repositories import (
     AuthCodeRepository,
     AuthRepository,
     BlacklistTokenRepository,
+    UsedChallengeRepository,
 )
 from src.auth.schemas import AuthCodeRequest, AuthCodeVerify, Token
+from src.core.cache import TTLCache
 from src.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Ids of stateless challenges this worker already verified, spares the
+# used_challenges lookup for retries that reach the same worker
+used_challenges: TTLCache[str, bool] = TTLCache(
+    maxsize=100_000, ttl=settings.auth.auth_code_expire_seconds
+)
+
 
 class AuthService:
     auth_repo: AuthRepository
     blacklist_token_repo: BlacklistTokenRepository
     auth_code_repo: AuthCodeRepository
+    used_challenge_repo: UsedChallengeRepository
 
     def __init__(
         self,
         users_repository: AuthRepository,
         blacklist_token_repository: BlacklistTokenRepository,
         auth_code_repository: AuthCodeRepository,
+        used_challenge_repository: UsedChallengeRepository,
     ) -> None:
         self.auth_repo = users_repository
         self.blacklist_token_repo = blacklist_token_repository
         self.auth_code_repo = auth_code_repository
+        self.used_challenge_repo = used_challenge_repository
 
-    async def request_code(self, auth_code_request_schema: AuthCodeRequest):
+    async def request_code(
+        self, auth_code_request_schema: AuthCodeRequest
+    ) -> str | None:
+        """
+        Issues an authorization code for the phone.
+
+        :return: Signed challenge in stateless mode, None in table mode.
+        """
         auth_code_request_dict: dict = auth_code_request_schema.model_dump()
         code = auth_utils.generate_auth_code(length=settings.auth.auth_code_length)
+        if settings.auth.auth_code_mode == "stateless":
+            self.send_code(phone=auth_code_request_dict["phone"], code=code)
+            return auth_utils.create_auth_code_challenge(
+                phone=auth_code_request_dict["phone"], code=code
+            )
         try:
             await self.auth_code_repo.create(
                 attributes={
@@ -42,13 +69,28 @@ class AuthService:
                     + timedelta(seconds=settings.auth.auth_code_expire_seconds),
                 }
             )
-            print(code)
+            self.send_code(phone=auth_code_request_dict["phone"], code=code)
         except Exception as e:
             raise e
 
+    @staticmethod
+    def send_code(phone: str, code: str) -> None:
+        # Stands in for an SMS gateway, the code is only written to the log,
+        # so it must not be sampled away under load
+        logger.info(
+            "auth code issued",
+            extra={"phone": phone, "code": code, "sample": False},
+        )
+
     async def verify_code(self, auth_code_verify_schema: AuthCodeVerify) -> Token:
         data = auth_code_verify_schema.model_dump()
 
+        if settings.auth.auth_code_mode == "stateless":
+            await self.verify_challenge(
+                challenge=data["challenge"], phone=data["phone"], code=data["code"]
+            )
+            return self.create_token(await self.get_or_create_user(data["phone"]))
+
         auth_code: AuthCode = await self.auth_code_repo.get_by(
             field="code", value=data["code"], unique=True
         )  # type: ignore
@@ -60,17 +102,50 @@ class AuthService:
         if auth_code.phone != auth_code_verify_schema.phone:
             raise auth_exc.wrong_phone
 
+        return self.create_token(await self.get_or_create_user(data["phone"]))
+
+    async def verify_challenge(
+        self, challenge: str | None, phone: str, code: str
+    ) -> None:
+        """
+        Checks a stateless challenge without storing codes. The database
+        only records which challenges were used.
+
+        A challenge can be verified once by any worker, whether the code
+        matches or not.
+        """
+        if not challenge:
+            raise auth_exc.no_matching_auth_code
+        try:
+            payload = auth_utils.jwt_decode(token=challenge)
+        except ExpiredSignatureError:
+            raise auth_exc.expired_auth_code
+        except InvalidTokenError:
+            raise auth_exc.invalid_token
+        auth_utils.validate_token_type(payload, "challenge")
+        if payload["jti"] in used_challenges or not await self.used_challenge_repo.use(
+            payload["jti"], datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+        ):
+            raise auth_exc.used_auth_code
+        used_challenges.set(payload["jti"], True)
+        if payload["phone"] != phone:
+            raise auth_exc.wrong_phone
+        if not hmac.compare_digest(
+            payload["code_hmac"], auth_utils.auth_code_hmac(phone=phone, code=code)
+        ):
+            raise auth_exc.no_matching_auth_code
+
+    async def get_or_create_user(self, phone: str) -> User:
         user_with_that_phone: User = await self.auth_repo.get_by(
-            field="phone", value=data["phone"], unique=True
+            field="phone", value=phone, unique=True
         )  # type: ignore
-        if not user_with_that_phone:
-            user = await self.auth_repo.create(attributes={"phone": data["phone"]})
-            if not user:
-                raise auth_exc.failed_to_create
-        else:
-            user = user_with_that_phone
-
-        return self.create_token(user)
+        if user_with_that_phone:
+            return user_with_that_phone
+        user = await self.auth_repo.create(attributes={"phone": phone})
+        if not user:
+            raise auth_exc.failed_to_create
+        logger.info("user created", extra={"user_id": user.id.hex})
+        return user
 
     async def refresh_token(self, payload: dict) -> Token:
         token_id: uuid.UUID = uuid.UUID(hex=payload.get("jti"))
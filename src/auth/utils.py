@@ -1,13 +1,24 @@
+import functools
+import hashlib
+import hmac
 import random
 import string
-import uuid
 from datetime import datetime, timedelta, timezone
 
 import bcrypt
 import jwt
+import phonenumbers
 
 import src.auth.exceptions as auth_exc
 from src.core.config import settings
+from src.core.executor import BoundedExecutor, ExecutorOverloaded
+from src.core.utils import uuid7
+
+bcrypt_executor = BoundedExecutor(
+    name="bcrypt",
+    max_workers=settings.auth.bcrypt_workers,
+    max_pending=settings.auth.bcrypt_max_pending,
+)
 
 
 def jwt_encode(
@@ -23,7 +34,7 @@ def jwt_encode(
         expire = now + expire_timedelta
     else:
         expire = now + timedelta(seconds=expire_seconds)
-    to_encode.update(exp=expire, iat=now, jti=uuid.uuid4().hex)
+    to_encode.update(exp=expire, iat=now, jti=uuid7().hex)
     encoded = jwt.encode(payload=to_encode, key=key, algorithm=algorithm)
     return encoded
 
@@ -54,8 +65,9 @@ def create_jwt(
 
 def hash_password(
     password: str,
+    rounds: int = settings.auth.bcrypt_rounds,
 ) -> str:
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds)
     pwd_bytes: bytes = password.encode()
     return bcrypt.hashpw(pwd_bytes, salt).decode()
 
@@ -66,6 +78,50 @@ def validate_password(password: str, hashed_password: str) -> bool:
     )
 
 
+def password_needs_rehash(
+    hashed_password: str, rounds: int = settings.auth.bcrypt_rounds
+) -> bool:
+    """
+    Checks whether the hash was made with a cost factor other than `rounds`.
+
+    >>> password_needs_rehash("$2b$10$" + "a" * 53, rounds=12)
+    True
+    """
+    return int(hashed_password.split("$")[2]) != rounds
+
+
+async def hash_password_async(password: str) -> str:
+    """Same as hash_password, but runs in the bounded bcrypt executor."""
+    try:
+        return await bcrypt_executor.run(hash_password, password)
+    except ExecutorOverloaded:
+        raise auth_exc.password_hashing_overloaded
+
+
+async def validate_password_async(password: str, hashed_password: str) -> bool:
+    """Same as validate_password, but runs in the bounded bcrypt executor."""
+    try:
+        return await bcrypt_executor.run(validate_password, password, hashed_password)
+    except ExecutorOverloaded:
+        raise auth_exc.password_hashing_overloaded
+
+
+async def validate_and_rehash_password(
+    password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Validates the password and, on success, returns a new hash if the stored
+    one was made with an outdated cost factor.
+
+    :return: Tuple of validation result and new hash to store (or None).
+    """
+    if not await validate_password_async(password, hashed_password):
+        return False, None
+    if password_needs_rehash(hashed_password):
+        return True, await hash_password_async(password)
+    return True, None
+
+
 def validate_token_type(
     payload: dict,
     expected_type,
@@ -77,5 +133,41 @@ def validate_token_type(
             expected_type=expected_type,
         )
 
+@functools.lru_cache(maxsize=settings.auth.phone_cache_size)
+def normalize_phone(phone: str) -> str:
+    """
+    Validates the phone number and returns it in E.164 format. Results are
+    memoized, so repeated logins from the same number skip parsing.
+
+    >>> normalize_phone("tel:+7-912-000-00-01")
+    '+79120000001'
+    """
+    try:
+        parsed = phonenumbers.parse(phone, None)
+    except phonenumbers.NumberParseException:
+        raise ValueError("value is not a valid phone number")
+    if not phonenumbers.is_valid_number(parsed):
+        raise ValueError("value is not a valid phone number")
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
 def generate_auth_code(length: int):
-    return "".join(random.choices(string.digits, k=length))
\ No newline at end of file
+    return "".join(random.choices(string.digits, k=length))
+
+
+def auth_code_hmac(phone: str, code: str, key: str = settings.auth.secret) -> str:
+    return hmac.new(
+        key.encode(), f"{phone}:{code}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def create_auth_code_challenge(phone: str, code: str) -> str:
+    """
+    Returns a signed challenge that lets the code be verified without storing
+    it. The code itself is not included, only its HMAC.
+    """
+    return create_jwt(
+        token_type="challenge",
+        token_data={"phone": phone, "code_hmac": auth_code_hmac(phone, code)},
+        expire_seconds=settings.auth.auth_code_expire_seconds,
+    )
\ No newline at end of file
@@ -0,0 +1,33 @@
+import importlib
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class LazyApp:
+    """
+    ASGI app that is built on first use.
+
+    Lets heavy sub-applications be mounted without importing them at startup.
+    Exposes `routes` so `url_for` keeps working through the mount.
+
+    :param factory: Import string of a function returning the app,
+        e.g. "src.auth.admin:create_admin_app".
+    """
+
+    def __init__(self, factory: str) -> None:
+        self.factory = factory
+        self._app: ASGIApp | None = None
+
+    @property
+    def app(self) -> ASGIApp:
+        if self._app is None:
+            module_name, attr = self.factory.split(":")
+            self._app = getattr(importlib.import_module(module_name), attr)()
+        return self._app
+
+    @property
+    def routes(self) -> list:
+        return getattr(self.app, "routes", [])
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.app(scope, receive, send)
@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    In-process mapping whose entries expire `ttl` seconds after being set.
+
+    Holds at most `maxsize` entries; when full, the oldest entry is evicted.
+    The cache is local to the worker process.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        self._purge()
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        self._purge()
+        self._data.pop(key, None)
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def add(self, key: K, value: V) -> bool:
+        """
+        Sets the key only if it is not present yet.
+
+        :return: True if the key was added, False if it was already present.
+        """
+        if key in self:
+            return False
+        self.set(key, value)
+        return True
+
+    def pop(self, key: K) -> V | None:
+        value = self.get(key)
+        self._data.pop(key, None)
+        return value
+
+    def _purge(self) -> None:
+        # Entries share one ttl, so insertion order is also expiry order
+        now = time.monotonic()
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
@@ -0,0 +1,266 @@
+"""
+Response compression.
+
+    python -m src.core.compression [--package sqladmin] [--cache-dir .static-cache]
+
+precompresses the static files of the packages ahead of time, e.g. while
+building the image, so PrecompressedStaticFiles finds them ready at startup.
+"""
+
+import argparse
+import os
+import zlib
+from typing import Iterable
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Preferred first when the client accepts both equally
+ENCODINGS = ("br", "gzip")
+# Static files worth compressing, fonts and images are compressed already
+STATIC_EXTENSIONS = (".css", ".js", ".map", ".svg", ".json", ".txt", ".html")
+
+
+def negotiate(accept_encoding: str, available: Iterable[str] = ENCODINGS) -> str | None:
+    """
+    Picks the encoding the client prefers among `available` from an
+    Accept-Encoding header, or None if it accepts none of them.
+
+    >>> negotiate("gzip, deflate, br")
+    'br'
+    >>> negotiate("br;q=0.5, gzip")
+    'gzip'
+    >>> negotiate("*;q=0, gzip;q=0")
+    """
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available:
+            continue
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int) -> None:
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """
+        Compresses a chunk and flushes it, so it can be sent right away.
+        """
+        if self.encoding == "br":
+            output = self._brotli.process(data)
+            return output + (self._brotli.finish() if final else self._brotli.flush())
+        output = self._zlib.compress(data)
+        return output + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, whichever the client prefers.
+
+    Only responses with a content type starting with one of `content_types`
+    are compressed, which leaves out images, archives and other compressed
+    formats. Single-chunk bodies shorter than `minimum_size` are sent as is.
+    Streamed bodies are compressed chunk by chunk and each chunk is flushed,
+    so nothing is buffered. Responses that already have a Content-Encoding,
+    such as precompressed static files, pass through.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        content_types: Iterable[str],
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.content_types = tuple(content_types)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start: Message | None = None
+        compressor: Compressor | None = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None or passthrough:
+                # Extension messages before the start, such as
+                # http.response.debug, go out unchanged
+                await send(message)
+                return
+            if compressor is None:
+                if message["type"] != "http.response.body" or not self._compressible(
+                    start, message
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The compressed body is a different representation
+                    headers["ETag"] = "W/" + etag
+                await send(start)
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if body or not more_body:
+                message["body"] = compressor.compress(body, final=not more_body)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _compressible(self, start: Message, message: Message) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 206, 304):
+            return False
+        headers = Headers(raw=start["headers"])
+        if "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(self.content_types):
+            return False
+        if message.get("more_body", False):
+            content_length = headers.get("content-length")
+            return content_length is None or int(content_length) >= self.minimum_size
+        return len(message.get("body", b"")) >= self.minimum_size
+
+
+def compress(
+    content: bytes, encoding: str, gzip_level: int, brotli_quality: int
+) -> bytes:
+    compressor = Compressor(encoding, gzip_level, brotli_quality)
+    return compressor.compress(content, final=True)
+
+
+def precompress(
+    directories: Iterable[str | os.PathLike[str]],
+    cache_dir: str,
+    gzip_level: int = 9,
+    brotli_quality: int = 11,
+) -> dict[str, dict[str, tuple[str, os.stat_result]]]:
+    """
+    Writes `<cache_dir>/<relative path>.br` and `.gz` for the compressible
+    files of the directories, unless they are already there and newer than
+    the source. Variants that would not save at least 5% are not served.
+
+    :return: Relative path -> encoding -> (variant path, variant stat).
+    """
+    variants: dict[str, dict[str, tuple[str, os.stat_result]]] = {}
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if not name.endswith(STATIC_EXTENSIONS):
+                    continue
+                source = os.path.join(root, name)
+                relative = os.path.relpath(source, directory)
+                if relative in variants:
+                    # An earlier directory shadows this file
+                    continue
+                variants[relative] = {}
+                source_stat = os.stat(source)
+                content = None
+                for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                    target = os.path.join(cache_dir, relative + suffix)
+                    if (
+                        not os.path.exists(target)
+                        or os.stat(target).st_mtime < source_stat.st_mtime
+                    ):
+                        if content is None:
+                            with open(source, "rb") as file:
+                                content = file.read()
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        with open(target + ".part", "wb") as file:
+                            file.write(
+                                compress(content, encoding, gzip_level, brotli_quality)
+                            )
+                        os.replace(target + ".part", target)
+                    target_stat = os.stat(target)
+                    if target_stat.st_size < source_stat.st_size * 0.95:
+                        variants[relative][encoding] = (target, target_stat)
+    return variants
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves a brotli or gzip variant of a file with the
+    matching Content-Encoding when the client accepts it.
+
+    Variants are kept in `cache_dir`. Missing or outdated ones are created
+    when the app is built; run this module at build time to keep that out
+    of startup.
+    """
+
+    def __init__(self, *, cache_dir: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.variants = precompress(self.all_directories, cache_dir)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        variants = self.variants.get(path)
+        if not variants or type(response) is not FileResponse:
+            return response
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", ""), variants)
+        if encoding is None:
+            response.headers.add_vary_header("Accept-Encoding")
+            return response
+        variant_path, variant_stat = variants[encoding]
+        variant = FileResponse(
+            variant_path,
+            media_type=response.media_type,
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            stat_result=variant_stat,
+        )
+        if self.is_not_modified(variant.headers, request_headers):
+            return NotModifiedResponse(variant.headers)
+        return variant
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--package", action="append", default=None)
+    parser.add_argument("--cache-dir", default=".static-cache")
+    args = parser.parse_args()
+    statics = StaticFiles(packages=args.package or ["sqladmin"])
+    variants = precompress(statics.all_directories, args.cache_dir)
+    compressed = sum(1 for encodings in variants.values() if encodings)
+    print(f"{compressed} of {len(variants)} files precompressed in {args.cache_dir}")
@@ -14,6 +14,9 @@ class DBSettings(BaseModel):
     host: str = os.environ.get("DB_HOST", "")
     port: str = os.environ.get("DB_PORT", "")
     url: str = f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{name}"
+    migration_lock_timeout_seconds: float = float(
+        os.environ.get("MIGRATION_LOCK_TIMEOUT_SECONDS", "600")
+    )
 
     naming_convention: dict[str, str] = {
         "ix": "ix_%(column_0_label)s",
@@ -39,18 +42,178 @@ class AuthSettings(BaseModel):
     auth_code_length: int = int(
         os.environ.get("AUTH_CODE_LENGTH", "")
     )
+    # "table" stores codes in auth_codes, "stateless" returns a signed challenge
+    auth_code_mode: str = os.environ.get("AUTH_CODE_MODE", "table")
+    phone_cache_size: int = int(os.environ.get("PHONE_CACHE_SIZE", "65536"))
+    bcrypt_rounds: int = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+    bcrypt_workers: int = int(os.environ.get("BCRYPT_WORKERS", "2"))
+    bcrypt_max_pending: int = int(os.environ.get("BCRYPT_MAX_PENDING", "32"))
 
 
 class S3Settings(BaseModel):
     access_key: str = os.environ.get("S3_ACCESS_KEY",  "")
     secrret_key: str = os.environ.get("S3_SECRET_KEY",  "")
     endpoint_url: str = os.environ.get("S3_ENDPOINT_URL",  "")
+    # "s3" or "local", local keeps objects in local_dir/<bucket name>
+    backend: str = os.environ.get("MEDIA_BACKEND", "s3")
+    local_dir: str = os.environ.get("MEDIA_LOCAL_DIR", "media")
+    # Store uploads under the sha256 of their content, once per content
+    dedup: bool = os.environ.get("MEDIA_DEDUP", "false") == "true"
+
+
+class MediaCacheSettings(BaseModel):
+    # Empty disables the cache
+    directory: str = os.environ.get("MEDIA_CACHE_DIR", "")
+    max_bytes: int = int(os.environ.get("MEDIA_CACHE_MAX_BYTES", str(1024**3)))
+    revalidate_seconds: float = float(
+        os.environ.get("MEDIA_CACHE_REVALIDATE_SECONDS", "60")
+    )
+
+
+class MediaImageSettings(BaseModel):
+    # Widths a variant can be requested in, any other width is rejected
+    widths: list[int] = [
+        int(width)
+        for width in os.environ.get(
+            "MEDIA_IMAGE_WIDTHS", "64,128,256,512,1024,2048"
+        ).split(",")
+    ]
+    quality: int = int(os.environ.get("MEDIA_IMAGE_QUALITY", "80"))
+    max_pixels: int = int(os.environ.get("MEDIA_IMAGE_MAX_PIXELS", "50000000"))
+    workers: int = int(os.environ.get("MEDIA_IMAGE_WORKERS", "2"))
+    max_pending: int = int(os.environ.get("MEDIA_IMAGE_MAX_PENDING", "16"))
+
+
+class ResilienceSettings(BaseModel):
+    # Deadline of every request, 0 disables deadlines
+    request_timeout_seconds: float = float(
+        os.environ.get("REQUEST_TIMEOUT_SECONDS", "10")
+    )
+    # Consecutive failures that open a circuit, 0 disables circuit breakers
+    circuit_failure_threshold: int = int(
+        os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5")
+    )
+    circuit_reset_seconds: float = float(
+        os.environ.get("CIRCUIT_RESET_SECONDS", "10")
+    )
+    # Connections in use at once and requests allowed to wait for one,
+    # 0 means no limit. Defaults to the pool size plus overflow
+    db_max_concurrency: int = int(os.environ.get("DB_MAX_CONCURRENCY", "15"))
+    db_max_pending: int = int(os.environ.get("DB_MAX_PENDING", "64"))
+    # Upper bound of a single statement, lowered to the time left until the
+    # request deadline
+    db_statement_timeout_seconds: float = float(
+        os.environ.get("DB_STATEMENT_TIMEOUT_SECONDS", "5")
+    )
+    # Deadline of bulk requests (user import and export) and statement
+    # timeout of bulk loads instead of the above, 0 for none
+    bulk_timeout_seconds: float = float(
+        os.environ.get("BULK_TIMEOUT_SECONDS", "0")
+    )
+    s3_max_concurrency: int = int(os.environ.get("S3_MAX_CONCURRENCY", "32"))
+    s3_max_pending: int = int(os.environ.get("S3_MAX_PENDING", "128"))
+    s3_connect_timeout_seconds: float = float(
+        os.environ.get("S3_CONNECT_TIMEOUT_SECONDS", "2")
+    )
+    s3_read_timeout_seconds: float = float(
+        os.environ.get("S3_READ_TIMEOUT_SECONDS", "10")
+    )
+    s3_max_attempts: int = int(os.environ.get("S3_MAX_ATTEMPTS", "2"))
+
+
+class IdempotencySettings(BaseModel):
+    # How long the first response to an Idempotency-Key is replayed
+    ttl_seconds: int = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    # After this a request left in progress, e.g. by a crashed worker, can
+    # be taken over by a retry
+    lock_seconds: float = float(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", "30"))
+    cache_size: int = int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+
+class HousekeepingSettings(BaseModel):
+    # How often every worker deletes expired rows, 0 to leave it to
+    # `python -m src.core.housekeeping`. IDEMPOTENCY_PURGE_INTERVAL_SECONDS
+    # is the earlier name
+    purge_interval_seconds: float = float(
+        os.environ.get(
+            "PURGE_INTERVAL_SECONDS",
+            os.environ.get("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "3600"),
+        )
+    )
+
+
+class CompressionSettings(BaseModel):
+    enabled: bool = os.environ.get("COMPRESSION_ENABLED", "true") == "true"
+    minimum_size: int = int(os.environ.get("COMPRESSION_MINIMUM_SIZE", "1024"))
+    gzip_level: int = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+    brotli_quality: int = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4"))
+    content_types: list[str] = os.environ.get(
+        "COMPRESSION_CONTENT_TYPES",
+        "application/json,application/x-ndjson,application/javascript,"
+        "application/xml,image/svg+xml,text/",
+    ).split(",")
+    static_cache_dir: str = os.environ.get("STATIC_CACHE_DIR", ".static-cache")
+
+
+class MonitoringSettings(BaseModel):
+    loop_lag_interval_seconds: float = float(
+        os.environ.get("LOOP_LAG_INTERVAL_SECONDS", "0.5")
+    )
+    loop_block_debug: bool = os.environ.get("LOOP_BLOCK_DEBUG", "false") == "true"
+    loop_block_threshold_seconds: float = float(
+        os.environ.get("LOOP_BLOCK_THRESHOLD_SECONDS", "0.1")
+    )
+
+
+class LoggingSettings(BaseModel):
+    level: str = os.environ.get("LOG_LEVEL", "INFO")
+    # JSON lines, or plain text for development
+    json_format: bool = os.environ.get("LOG_JSON", "true") == "true"
+    access_log: bool = os.environ.get("LOG_ACCESS", "true") == "true"
+    queue_capacity: int = int(os.environ.get("LOG_QUEUE_CAPACITY", "10000"))
+    sample_every: int = int(os.environ.get("LOG_SAMPLE_EVERY", "10"))
+
+
+class HealthSettings(BaseModel):
+    # How long a readiness check result is reused by later probes
+    cache_seconds: float = float(os.environ.get("HEALTH_CACHE_SECONDS", "2"))
+    timeout_seconds: float = float(os.environ.get("HEALTH_TIMEOUT_SECONDS", "2"))
+    # Pool connections opened at startup, at most the pool size
+    warmup_connections: int = int(os.environ.get("WARMUP_CONNECTIONS", "5"))
+    warmup_timeout_seconds: float = float(
+        os.environ.get("WARMUP_TIMEOUT_SECONDS", "10")
+    )
+
+
+class ServerSettings(BaseModel):
+    bind_host: str = os.environ.get("SERVER_HOST", "0.0.0.0")
+    port: int = int(os.environ.get("SERVER_PORT", "80"))
+    workers: int = int(os.environ.get("SERVER_WORKERS", "0"))
+    backlog: int = int(os.environ.get("SERVER_BACKLOG", "2048"))
+    keep_alive_seconds: int = int(os.environ.get("SERVER_KEEP_ALIVE_SECONDS", "95"))
+    max_requests: int = int(os.environ.get("SERVER_MAX_REQUESTS", "0"))
+    graceful_shutdown_seconds: int = int(
+        os.environ.get("SERVER_GRACEFUL_SHUTDOWN_SECONDS", "30")
+    )
+
 
 class Settings(BaseSettings):
     db: DBSettings = DBSettings()
     auth: AuthSettings = AuthSettings()
     s3: S3Settings = S3Settings()
+    media_cache: MediaCacheSettings = MediaCacheSettings()
+    media_images: MediaImageSettings = MediaImageSettings()
+    resilience: ResilienceSettings = ResilienceSettings()
+    idempotency: IdempotencySettings = IdempotencySettings()
+    housekeeping: HousekeepingSettings = HousekeepingSettings()
+    compression: CompressionSettings = CompressionSettings()
+    monitoring: MonitoringSettings = MonitoringSettings()
+    logging: LoggingSettings = LoggingSettings()
+    health: HealthSettings = HealthSettings()
+    server: ServerSettings = ServerSettings()
     host: str = os.environ.get("HOST", "")
+    admin_enabled: bool = os.environ.get("ADMIN_ENABLED", "true") == "true"
+    media_enabled: bool = os.environ.get("MEDIA_ENABLED", "false") == "true"
 
 
 settings = Settings()
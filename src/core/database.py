@@ -1,14 +1,123 @@
-from sqlalchemy import Column, Integer, MetaData
+import asyncio
+import contextvars
+
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, MetaData, event
+from sqlalchemy.engine import ExceptionContext
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, declared_attr
+from sqlalchemy.orm import DeclarativeBase, Session, declared_attr
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import await_only
 
 from src.core.config import settings
+from src.core.resilience import DeadlineExceeded, DependencyGuard, remaining
 from src.core.utils import camel_case_to_snake_case
 
-engine = create_async_engine(settings.db.url)
+# Set while bulk work runs with its own statement timeout, statements it
+# cancels say nothing about the health of the database
+bulk_work: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "bulk_work", default=False
+)
+
+db_guard = DependencyGuard(
+    name="database",
+    max_concurrency=settings.resilience.db_max_concurrency,
+    max_pending=settings.resilience.db_max_pending,
+    failure_threshold=settings.resilience.circuit_failure_threshold,
+    reset_seconds=settings.resilience.circuit_reset_seconds,
+)
+
+
+class GuardedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Admits connection checkouts through db_guard, so requests queue there
+    with their deadline and are shed when the queue is full, instead of all
+    waiting for the pool timeout.
+    """
+
+    def _do_get(self):
+        await_only(db_guard.admit())
+        try:
+            return super()._do_get()
+        except HTTPException:
+            db_guard.release()
+            raise
+        except asyncio.CancelledError:
+            timeout = remaining()
+            if timeout is not None and timeout <= 0:
+                db_guard.breaker.record_failure()
+            db_guard.release()
+            raise
+        except Exception:
+            db_guard.breaker.record_failure()
+            db_guard.release()
+            raise
+
+    def _do_return_conn(self, record) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            db_guard.release()
+
+
+connect_args = {}
+if settings.resilience.db_statement_timeout_seconds > 0:
+    connect_args["server_settings"] = {
+        "statement_timeout": str(
+            int(settings.resilience.db_statement_timeout_seconds * 1000)
+        )
+    }
+
+engine = create_async_engine(
+    settings.db.url, poolclass=GuardedQueuePool, connect_args=connect_args
+)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
+@event.listens_for(Session, "after_begin")
+def limit_statement_timeout(session, transaction, connection) -> None:
+    """
+    Lowers the statement timeout of the transaction to the time left until
+    the request deadline, if that is shorter than the default.
+    """
+    timeout = remaining()
+    if timeout is None:
+        return
+    if timeout <= 0:
+        raise DeadlineExceeded("database")
+    if timeout < settings.resilience.db_statement_timeout_seconds:
+        milliseconds = max(1, int(timeout * 1000))
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {milliseconds}")
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def record_success(*_) -> None:
+    db_guard.breaker.record_success()
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def record_failure(context: ExceptionContext) -> None:
+    # Lost connections, statements cancelled by statement_timeout and calls
+    # still running at the request deadline mean the database is unhealthy,
+    # constraint violations and the like do not
+    error = context.original_exception
+    canceled = getattr(error, "sqlstate", None) == asyncpg.QueryCanceledError.sqlstate
+    if canceled and bulk_work.get():
+        return
+    if isinstance(error, asyncio.CancelledError):
+        timeout = remaining()
+        if timeout is not None and timeout <= 0:
+            db_guard.breaker.record_failure()
+        return
+    if (
+        context.is_disconnect
+        or isinstance(error, (OSError, TimeoutError))
+        or canceled
+    ):
+        db_guard.breaker.record_failure()
+
+
 class Base(DeclarativeBase):
     __abstract__ = True
 
@@ -0,0 +1,19 @@
+from fastapi import status
+
+from src.core.responses import StaticHTTPException
+
+invalid_idempotency_key = StaticHTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Idempotency-Key must be 1 to 255 characters",
+)
+
+idempotency_key_reused = StaticHTTPException(
+    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+    detail="Idempotency-Key was already used for a different request",
+)
+
+idempotency_key_in_progress = StaticHTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail="request with this Idempotency-Key is still in progress",
+    headers={"Retry-After": "1"},
+)
@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from src.core.metrics import registry
+
+T = TypeVar("T")
+
+executor_in_flight = registry.gauge(
+    "executor_in_flight", "Calls running or queued in a bounded executor"
+)
+executor_rejected_total = registry.counter(
+    "executor_rejected_total", "Calls rejected because the executor queue was full"
+)
+
+
+class ExecutorOverloaded(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls off the event loop in a dedicated pool.
+
+    At most `max_workers` calls run at once and at most `max_pending` more wait
+    in the queue. Calls beyond that are rejected with ExecutorOverloaded
+    instead of piling up, so callers can shed load.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_pending: int,
+        executor_factory: Callable[[int], Executor] | None = None,
+    ) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor_factory = executor_factory or partial(
+            ThreadPoolExecutor, thread_name_prefix=name
+        )
+        self._executor: Executor | None = None
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self._in_flight >= self.max_workers + self.max_pending:
+            executor_rejected_total.inc(executor=self.name)
+            raise ExecutorOverloaded(f"executor '{self.name}' is overloaded")
+        if self._executor is None:
+            self._executor = self._executor_factory(self.max_workers)
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(fn, *args)
+        self._in_flight += 1
+        executor_in_flight.set(self._in_flight, executor=self.name)
+        # Released when the call finishes, not when the caller stops waiting:
+        # a cancelled caller leaves the call running in the pool
+        future.add_done_callback(partial(self._call_done, loop))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _call_done(self, loop: asyncio.AbstractEventLoop, _: Future) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop is closed, nobody is left to count against the bound
+            pass
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        executor_in_flight.set(self._in_flight, executor=self.name)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
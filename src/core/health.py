@@ -0,0 +1,175 @@
+"""
+Liveness and readiness.
+
+/health answers as long as the worker serves requests. /ready also needs
+the startup warm-up to be over and every registered dependency check to
+pass. Check results are reused for HEALTH_CACHE_SECONDS and concurrent
+probes share one check in flight, so however many load balancers and
+healthchecks poll /ready, a worker calls each dependency at most once per
+interval. Checks go through the dependency guards, an open circuit fails
+them without a call.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.core.database import engine
+from src.core.metrics import registry
+from src.core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+dependency_up = registry.gauge(
+    "dependency_up", "Result of the last readiness check of a dependency: 1 up, 0 down"
+)
+readiness_check_seconds = registry.histogram(
+    "readiness_check_seconds",
+    "Duration of readiness checks of a dependency",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+@dataclass(frozen=True)
+class CheckResult:
+    ok: bool
+    latency: float
+    checked_at: float
+
+
+class Check:
+    """
+    A dependency check whose result is reused for `ttl` seconds.
+
+    :param probe: Raises if the dependency is not usable.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], Awaitable[None]],
+        ttl: float,
+        timeout: float,
+    ) -> None:
+        self.name = name
+        self.probe = probe
+        self.ttl = ttl
+        self.timeout = timeout
+        self.last: CheckResult | None = None
+        self._flight: SingleFlight[str, CheckResult] = SingleFlight("health")
+
+    async def result(self) -> CheckResult:
+        last = self.last
+        if last is not None and time.monotonic() - last.checked_at < self.ttl:
+            return last
+        return await self._flight.do(self.name, self._run)
+
+    async def _run(self) -> CheckResult:
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self.probe()
+        except Exception as e:
+            ok = False
+            # Logged rather than returned, /ready is reachable from outside
+            if self.last is None or self.last.ok:
+                logger.warning(
+                    "%s check failed: %s",
+                    self.name,
+                    getattr(e, "detail", None) or repr(e),
+                )
+        else:
+            ok = True
+            if self.last is not None and not self.last.ok:
+                logger.info("%s check passed", self.name)
+        finished = time.monotonic()
+        readiness_check_seconds.observe(finished - started, dependency=self.name)
+        dependency_up.set(int(ok), dependency=self.name)
+        self.last = CheckResult(ok=ok, latency=finished - started, checked_at=finished)
+        return self.last
+
+
+class Readiness:
+    def __init__(self) -> None:
+        self.started = False
+        self.checks: dict[str, Check] = {}
+
+    def add_check(self, name: str, probe: Callable[[], Awaitable[None]]) -> None:
+        self.checks[name] = Check(
+            name,
+            probe,
+            ttl=settings.health.cache_seconds,
+            timeout=settings.health.timeout_seconds,
+        )
+
+    async def results(self) -> dict[str, CheckResult]:
+        results = await asyncio.gather(
+            *(check.result() for check in self.checks.values())
+        )
+        return dict(zip(self.checks, results))
+
+
+readiness = Readiness()
+
+
+async def ping_database() -> None:
+    async with engine.connect() as connection:
+        await connection.exec_driver_sql("SELECT 1")
+
+
+readiness.add_check("database", ping_database)
+
+
+async def warm_up(
+    connections: int,
+    queries: Callable[[AsyncSession], Awaitable[None]] | None = None,
+) -> int:
+    """
+    Opens pool connections all at once and runs `queries` on each, so the
+    first requests neither wait for a connection to be set up nor for their
+    statements to be compiled and prepared. Failures are logged, the
+    database check reports them.
+
+    :param connections: At most the pool size, overflow connections would
+        be closed again when returned.
+    :return: The number of connections warmed up.
+    """
+    connections = min(connections, engine.pool.size())  # type: ignore
+    warmed = 0
+
+    async def warm(stack: contextlib.AsyncExitStack) -> None:
+        nonlocal warmed
+        connection = await stack.enter_async_context(engine.connect())
+        async with AsyncSession(bind=connection) as session:
+            # In a transaction, lookups run on this connection and not in a
+            # session of their own
+            await session.connection()
+            if queries is not None:
+                await queries(session)
+        warmed += 1
+
+    try:
+        async with asyncio.timeout(settings.health.warmup_timeout_seconds):
+            # Connections stay checked out until all are open
+            async with contextlib.AsyncExitStack() as stack:
+                results = await asyncio.gather(
+                    *(warm(stack) for _ in range(connections)),
+                    return_exceptions=True,
+                )
+    except TimeoutError as e:
+        results = [e]
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.warning(
+            "warmed up %d of %d database connections: %r",
+            warmed,
+            connections,
+            errors[0],
+        )
+    return warmed
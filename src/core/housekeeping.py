@@ -0,0 +1,74 @@
+"""
+Deletion of expired rows.
+
+Modules that keep rows with an expiry register a purge, every worker runs
+all of them each PURGE_INTERVAL_SECONDS. The statements only delete what
+has expired, so workers running them at the same time do no harm.
+
+    python -m src.core.housekeeping
+
+runs them once.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Housekeeping:
+    def __init__(self) -> None:
+        self.purges: dict[str, Callable[[], Awaitable[int]]] = {}
+
+    def add_purge(self, name: str, purge: Callable[[], Awaitable[int]]) -> None:
+        """
+        :param purge: Deletes the expired rows and returns their number.
+        """
+        self.purges[name] = purge
+
+    async def purge(self) -> dict[str, int]:
+        """
+        Runs every purge, failures are logged and the rest still run.
+
+        :return: The number of deleted rows by purge.
+        """
+        purged = {}
+        for name in self.purges:
+            count = await self.purge_one(name)
+            if count is not None:
+                purged[name] = count
+        return purged
+
+    async def purge_one(self, name: str) -> int | None:
+        """
+        :return: The number of deleted rows, None if the purge failed.
+        """
+        try:
+            purged = await self.purges[name]()
+        except Exception as e:
+            logger.warning("failed to purge %s: %r", name, e)
+            return None
+        if purged:
+            logger.info("%d expired %s deleted", purged, name)
+        return purged
+
+    async def run(self, interval: float) -> None:
+        """
+        Purges every `interval` seconds until cancelled.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            await self.purge()
+
+
+housekeeping = Housekeeping()
+
+
+if __name__ == "__main__":
+    # The registry of the imported module, not of this __main__ one
+    import src.main  # noqa: F401, registers the purges
+    from src.core.housekeeping import housekeeping as registered
+
+    for name, count in asyncio.run(registered.purge()).items():
+        print(f"{count} expired {name} deleted")
@@ -0,0 +1,432 @@
+"""
+Idempotency-Key support for endpoints with side effects.
+
+An endpoint depends on `get_idempotency` and passes its response through
+`Idempotency.save`:
+
+    @router.post("/")
+    async def create(idempotency: Idempotency = Depends(get_idempotency)):
+        ...
+        return idempotency.save(FastJSONResponse(result))
+
+The first response to a key is kept for IDEMPOTENCY_TTL_SECONDS in the
+worker and in the idempotency_records table shared by all workers. A retry
+with the same key from the same user gets it back, with an
+`Idempotent-Replayed: true` header, before the endpoint runs. A duplicate
+arriving while the first request is in progress waits for it. Error
+responses are not kept, so a retry after one runs again. Requests without
+the header are not affected.
+
+Endpoints whose responses are secrets, like tokens, use a store of their
+own with a shorter replay window that encrypts the kept bodies:
+
+    get_token_idempotency = idempotency_dependency(
+        IdempotencyStore(ttl_seconds=120, ..., secret=settings.auth.secret)
+    )
+
+Expired records are deleted by src.core.housekeeping, or once by
+
+    python -m src.core.idempotency
+"""
+
+import asyncio
+import base64
+import contextvars
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable
+
+import jwt
+from cryptography.fernet import Fernet
+from fastapi import Request, Response
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from starlette.datastructures import UploadFile
+
+import src.core.exceptions as core_exc
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.database import async_session_maker
+from src.core.housekeeping import housekeeping
+from src.core.metrics import registry
+from src.core.models import IdempotencyRecord
+from src.core.resilience import remaining
+from src.core.responses import StaticHTTPException
+
+HEADER = "Idempotency-Key"
+
+idempotency_requests_total = registry.counter(
+    "idempotency_requests_total",
+    "Requests with an Idempotency-Key by outcome: first or replayed",
+)
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    headers: dict[str, str]
+    body: bytes
+
+
+class IdempotentReplay(StaticHTTPException):
+    """
+    Answers a retry with the stored response, raised before the endpoint
+    runs and rendered by static_http_exception_handler.
+    """
+
+    def __init__(self, response: StoredResponse) -> None:
+        super().__init__(
+            status_code=response.status_code,
+            detail="",
+            headers={**response.headers, "Idempotent-Replayed": "true"},
+        )
+        self.body = response.body
+
+
+class IdempotencyStore:
+    """
+    Responses by record id, in a TTLCache of the worker and in the
+    idempotency_records table.
+
+    A request claims its record by inserting it without a response. The
+    claim is taken over by a retry once it is `lock_seconds` old, which is
+    meant to be longer than any request may run.
+
+    :param secret: Encrypt the bodies kept in the table with a key derived
+        from it, the worker keeps them in plain.
+    """
+
+    poll_interval = 0.05
+    max_poll_interval = 0.5
+
+    def __init__(
+        self,
+        ttl_seconds: int,
+        lock_seconds: float,
+        cache_size: int,
+        secret: str | None = None,
+    ) -> None:
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock = timedelta(seconds=lock_seconds)
+        self.cache: TTLCache[str, StoredResponse] = TTLCache(
+            maxsize=cache_size, ttl=ttl_seconds
+        )
+        self.fernet = None
+        if secret is not None:
+            key = hashlib.sha256(f"idempotency\0{secret}".encode()).digest()
+            self.fernet = Fernet(base64.urlsafe_b64encode(key))
+        # Records this worker has claimed or is waiting on
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def begin(self, record_id: str, fingerprint: str) -> StoredResponse | None:
+        """
+        Claims the record, or returns its response, waiting for it while the
+        request that claimed it is in progress.
+
+        :return: None if the record was claimed, the request should then run
+            and end with complete or abandon.
+        :raises HTTPException: 422 if the key was used for another request,
+            409 if the response is not there before the request deadline.
+        """
+        while True:
+            stored = self.cache.get(record_id)
+            if stored is not None:
+                return stored
+            in_flight = self._in_flight.get(record_id)
+            if in_flight is not None:
+                # The same worker waits on the future instead of the table
+                await self._wait(asyncio.shield(in_flight))
+                continue
+            self._in_flight[record_id] = asyncio.get_running_loop().create_future()
+            try:
+                stored = await self._claim_or_wait(record_id, fingerprint)
+            except BaseException:
+                self._finish(record_id)
+                raise
+            if stored is None:
+                return None
+            self.cache.set(record_id, stored)
+            self._finish(record_id)
+            return stored
+
+    async def complete(self, record_id: str, response: StoredResponse) -> None:
+        async with async_session_maker() as session:
+            await session.execute(
+                update(IdempotencyRecord)
+                .where(IdempotencyRecord.id == record_id)
+                .values(
+                    status_code=response.status_code,
+                    headers=response.headers,
+                    body=self._seal(response.body),
+                )
+            )
+            await session.commit()
+        self.cache.set(record_id, response)
+        self._finish(record_id)
+
+    def abandon(self, record_id: str) -> None:
+        """
+        Releases the claim, so the next retry runs the request again.
+        """
+        self._finish(record_id)
+        # Not bound to the request deadline, which may be what ended it
+        task = asyncio.get_running_loop().create_task(
+            self._release(record_id), context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def purge(self) -> int:
+        """
+        Deletes the expired records.
+
+        :return: The number of deleted records.
+        """
+        async with async_session_maker() as session:
+            result = await session.execute(
+                delete(IdempotencyRecord).where(
+                    IdempotencyRecord.expires_at < datetime.now(tz=timezone.utc)
+                )
+            )
+            await session.commit()
+        return result.rowcount
+
+    async def _claim_or_wait(
+        self, record_id: str, fingerprint: str
+    ) -> StoredResponse | None:
+        interval = self.poll_interval
+        while True:
+            now = datetime.now(tz=timezone.utc)
+            claim = insert(IdempotencyRecord).values(
+                id=record_id,
+                fingerprint=fingerprint,
+                locked_until=now + self.lock,
+                expires_at=now + self.ttl,
+            )
+            claim = claim.on_conflict_do_update(
+                index_elements=[IdempotencyRecord.id],
+                set_={
+                    "fingerprint": claim.excluded.fingerprint,
+                    "status_code": None,
+                    "headers": None,
+                    "body": None,
+                    "locked_until": claim.excluded.locked_until,
+                    "expires_at": claim.excluded.expires_at,
+                },
+                # Expired, or left in progress by a request that is gone
+                where=(IdempotencyRecord.expires_at < now)
+                | (
+                    IdempotencyRecord.status_code.is_(None)
+                    & (IdempotencyRecord.locked_until < now)
+                ),
+            ).returning(IdempotencyRecord.id)
+            async with async_session_maker() as session:
+                claimed = await session.scalar(claim)
+                record = None
+                if claimed is None:
+                    record = await session.scalar(
+                        select(IdempotencyRecord).where(
+                            IdempotencyRecord.id == record_id
+                        )
+                    )
+                await session.commit()
+            if claimed is not None:
+                return None
+            if record is None:
+                # Released in the meantime
+                continue
+            if record.fingerprint != fingerprint:
+                raise core_exc.idempotency_key_reused
+            if record.status_code is not None:
+                return StoredResponse(
+                    fingerprint=record.fingerprint,
+                    status_code=record.status_code,
+                    headers=record.headers or {},
+                    body=self._unseal(record.body or b""),
+                )
+            # In progress in another worker
+            await self._wait(asyncio.sleep(interval))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    async def _release(self, record_id: str) -> None:
+        try:
+            async with async_session_maker() as session:
+                await session.execute(
+                    delete(IdempotencyRecord).where(
+                        IdempotencyRecord.id == record_id,
+                        IdempotencyRecord.status_code.is_(None),
+                    )
+                )
+                await session.commit()
+        except Exception:
+            # The claim runs out after lock_seconds anyway
+            pass
+
+    @staticmethod
+    async def _wait(awaitable: Awaitable) -> None:
+        try:
+            async with asyncio.timeout(remaining()):
+                await awaitable
+        except TimeoutError:
+            raise core_exc.idempotency_key_in_progress from None
+
+    def _finish(self, record_id: str) -> None:
+        in_flight = self._in_flight.pop(record_id, None)
+        if in_flight is not None and not in_flight.done():
+            in_flight.set_result(None)
+
+    def _seal(self, body: bytes) -> bytes:
+        return self.fernet.encrypt(body) if self.fernet else body
+
+    def _unseal(self, body: bytes) -> bytes:
+        return self.fernet.decrypt(body) if self.fernet else body
+
+
+store = IdempotencyStore(
+    ttl_seconds=settings.idempotency.ttl_seconds,
+    lock_seconds=settings.idempotency.lock_seconds,
+    cache_size=settings.idempotency.cache_size,
+)
+
+housekeeping.add_purge("idempotency records", store.purge)
+
+
+async def purge_periodically(interval: float) -> None:
+    """
+    Deletes the expired records every `interval` seconds until cancelled.
+    The app runs this purge with the others of src.core.housekeeping.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await housekeeping.purge_one("idempotency records")
+
+
+class Idempotency:
+    def __init__(self, key: str | None) -> None:
+        self.key = key
+        self.response: Response | None = None
+
+    def save(self, response: Response) -> Response:
+        """
+        Keeps the response to replay it to retries, unless it is an error.
+        Only responses with a body can be kept, not streaming ones.
+
+        :return: The response, unchanged.
+        """
+        self.response = response
+        return response
+
+
+def request_subject(request: Request) -> str:
+    """
+    Returns the user id of the bearer token, or an empty string for
+    anonymous requests and invalid tokens.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return ""
+    try:
+        payload = jwt.decode(
+            token, settings.auth.secret, algorithms=[settings.auth.algorithm]
+        )
+    except jwt.InvalidTokenError:
+        return ""
+    return str(payload.get("sub", ""))
+
+
+async def request_fingerprint(request: Request) -> str:
+    """
+    Hashes the method, path, query and body of the request. Forms, parsed
+    by FastAPI already, are hashed field by field and files by name, type
+    and size, so uploads are not read again.
+    """
+    digest = hashlib.sha256(
+        f"{request.method} {request.url.path}?{request.url.query}\0".encode()
+    )
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(
+        ("multipart/form-data", "application/x-www-form-urlencoded")
+    ):
+        form = await request.form()
+        for name, value in form.multi_items():
+            if isinstance(value, UploadFile):
+                value = f"{value.filename}:{value.content_type}:{value.size}"
+            digest.update(f"{name}={value}\0".encode())
+    else:
+        digest.update(await request.body())
+    return digest.hexdigest()
+
+
+def idempotency_dependency(
+    store: IdempotencyStore,
+) -> Callable[[Request], AsyncIterator[Idempotency]]:
+    """
+    Returns a dependency of endpoints that honour the Idempotency-Key
+    header, keeping responses in `store`. See the module docstring.
+    """
+
+    async def get_idempotency(request: Request) -> AsyncIterator[Idempotency]:
+        key = request.headers.get(HEADER)
+        if key is None:
+            yield Idempotency(None)
+            return
+        if not 0 < len(key) <= 255:
+            raise core_exc.invalid_idempotency_key
+        record_id = hashlib.sha256(
+            "\0".join(
+                (request_subject(request), request.method, request.url.path, key)
+            ).encode()
+        ).hexdigest()
+        fingerprint = await request_fingerprint(request)
+        stored = await store.begin(record_id, fingerprint)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                raise core_exc.idempotency_key_reused
+            idempotency_requests_total.inc(outcome="replayed")
+            raise IdempotentReplay(stored)
+        idempotency_requests_total.inc(outcome="first")
+
+        handle = Idempotency(key)
+        try:
+            yield handle
+        except BaseException:
+            store.abandon(record_id)
+            raise
+        response = handle.response
+        if response is None or response.status_code >= 400 or not hasattr(
+            response, "body"
+        ):
+            store.abandon(record_id)
+            return
+        try:
+            await store.complete(
+                record_id,
+                StoredResponse(
+                    fingerprint=fingerprint,
+                    status_code=response.status_code,
+                    headers={
+                        name: value
+                        for name, value in response.headers.items()
+                        if name != "content-length"
+                    },
+                    body=bytes(response.body),
+                ),
+            )
+        except Exception:
+            # The side effects took place, the response is sent all the same
+            store.abandon(record_id)
+        except BaseException:
+            store.abandon(record_id)
+            raise
+
+    return get_idempotency
+
+
+get_idempotency = idempotency_dependency(store)
+
+
+if __name__ == "__main__":
+    print(f"{asyncio.run(store.purge())} expired idempotency records deleted")
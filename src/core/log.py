@@ -0,0 +1,294 @@
+"""
+Structured logging that does not block the event loop.
+
+Records are formatted on the calling thread into one JSON line each and
+handed to a writer thread through a bounded buffer. The writer does the
+encoding and the writes to stdout, which block when the log collector falls
+behind. When the buffer is more than three quarters full, records below
+WARNING are sampled, except those logged with `extra={"sample": False}`.
+When it is full, records are dropped instead of waiting. Dropped records are counted and reported by the writer.
+
+Every record carries the id of the request it was logged in, taken from the
+X-Request-ID header or generated by RequestIdMiddleware.
+"""
+
+import collections
+import contextvars
+import logging
+import sys
+import threading
+import time
+import uuid
+from typing import Any, TextIO
+
+import pydantic_core
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.metrics import registry
+
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+log_records_dropped_total = registry.counter(
+    "log_records_dropped_total",
+    "Log records not written by reason: sampled or overflow",
+)
+
+# Attributes every LogRecord has, anything else was passed in `extra`.
+# "sample" is read by QueueHandler and not written out.
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "sample",
+}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as a JSON object on one line with the time, level,
+    logger, message, request id and the fields passed in `extra`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        current_request_id = request_id.get()
+        if current_request_id is not None:
+            entry["request_id"] = current_request_id
+        if record.name == "uvicorn.access" and len(record.args or ()) == 5:
+            client, method, path, _, status_code = record.args  # type: ignore
+            entry.update(client=client, method=method, path=path, status=status_code)
+        for name, value in record.__dict__.items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return pydantic_core.to_json(entry, fallback=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Human readable lines with the request id, for development.
+    """
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)-8s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        current_request_id = request_id.get()
+        return line if current_request_id is None else f"{line} [{current_request_id}]"
+
+
+class ProbeAccessFilter(logging.Filter):
+    """
+    Leaves successful health and readiness probes out of the access log.
+    """
+
+    paths = frozenset(("/api/v1/health", "/api/v1/ready"))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if len(record.args or ()) != 5:
+            return True
+        _, _, path, _, status_code = record.args  # type: ignore
+        return path not in self.paths or status_code >= 400
+
+
+class QueueHandler(logging.Handler):
+    """
+    Formats records on the calling thread and writes them to `stream` from
+    a writer thread.
+
+    :param capacity: Formatted records waiting to be written, records beyond
+        it are dropped.
+    :param sample_every: Above three quarters of the capacity only one in
+        this many records below WARNING is kept. Records logged with
+        `extra={"sample": False}` are always kept.
+    """
+
+    batch_size = 1024
+
+    def __init__(
+        self,
+        stream: TextIO | None = None,
+        capacity: int = 10_000,
+        sample_every: int = 10,
+    ) -> None:
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stdout
+        self.capacity = capacity
+        self.sample_above = capacity * 3 // 4
+        self.sample_every = max(1, sample_every)
+        self.dropped = 0
+        self._sampled = 0
+        # deque appends and pops are atomic, no lock is taken per record
+        self._buffer: collections.deque[str] = collections.deque()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._write_forever, name="log-writer", daemon=True
+        )
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        pending = len(self._buffer)
+        if pending >= self.capacity:
+            self._drop("overflow")
+            return
+        if (
+            pending >= self.sample_above
+            and record.levelno < logging.WARNING
+            and getattr(record, "sample", True)
+        ):
+            self._sampled += 1
+            if self._sampled % self.sample_every:
+                self._drop("sampled")
+                return
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._buffer.append(line)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+
+    def flush(self, timeout: float = 1.0) -> None:
+        """
+        Waits up to `timeout` seconds for the buffered records to be written.
+        """
+        deadline = time.monotonic() + timeout
+        while self._buffer and self._writer.is_alive():
+            if time.monotonic() > deadline:
+                return
+            time.sleep(0.001)
+
+    def close(self) -> None:
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        super().close()
+
+    def _drop(self, reason: str) -> None:
+        self.dropped += 1
+        log_records_dropped_total.inc(reason=reason)
+
+    def _write_forever(self) -> None:
+        reported = 0
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            closed = self._closed
+            while self._buffer:
+                lines = []
+                try:
+                    while len(lines) < self.batch_size:
+                        lines.append(self._buffer.popleft())
+                except IndexError:
+                    pass
+                self._write(lines)
+            if self.dropped != reported:
+                dropped, reported = self.dropped - reported, self.dropped
+                self._write([self._dropped_line(dropped)])
+            if closed:
+                return
+
+    def _write(self, lines: list[str]) -> None:
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except Exception:
+            # Nowhere left to report it, e.g. stdout closed at shutdown
+            pass
+
+    def _dropped_line(self, dropped: int) -> str:
+        record = logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": "%d log records dropped, the log output is too slow",
+                "args": (dropped,),
+                "dropped": dropped,
+            }
+        )
+        return self.format(record)
+
+
+def logging_config(
+    level: str = "INFO",
+    json: bool = True,
+    capacity: int = 10_000,
+    sample_every: int = 10,
+) -> dict[str, Any]:
+    """
+    Returns a dictConfig that sends the records of the app and of uvicorn,
+    access log included, through one QueueHandler.
+    """
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "default": {"()": JSONFormatter if json else TextFormatter},
+        },
+        "filters": {
+            "probes": {"()": ProbeAccessFilter},
+        },
+        "handlers": {
+            "queue": {
+                "()": QueueHandler,
+                "formatter": "default",
+                "capacity": capacity,
+                "sample_every": sample_every,
+            },
+        },
+        "loggers": {
+            "uvicorn": {"level": level},
+            "uvicorn.access": {"level": level, "filters": ["probes"]},
+        },
+        "root": {"level": level, "handlers": ["queue"]},
+    }
+
+
+class RequestIdMiddleware:
+    """
+    Sets request_id for the request from the X-Request-ID header, if it is a
+    sensible one, or to a new id, and returns it in the X-Request-ID header
+    of the response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        current = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                value = value.decode("latin-1")
+                if 0 < len(value) <= 128 and value.isascii() and value.isprintable():
+                    current = value
+                break
+        if current is None:
+            current = uuid.uuid4().hex
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = current
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
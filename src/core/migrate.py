@@ -0,0 +1,111 @@
+"""
+Database migrations at container start.
+
+    python -m src.core.migrate [--check]
+
+Exits right away when the database is already at the head revisions, read
+from the version files and the alembic_version table without loading
+Alembic, SQLAlchemy or the models. Otherwise runs `alembic upgrade head`,
+which holds an advisory lock while migrating (see migrations/env.py), so
+replicas starting together apply every migration once and the others wait
+for it and find the database current.
+
+With --check nothing is migrated, the exit status is 1 when the database is
+behind.
+"""
+
+import argparse
+import ast
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import asyncpg
+
+from src.core.config import settings
+
+VERSIONS_DIR = Path(__file__).resolve().parents[2] / "migrations" / "versions"
+
+
+def _revision_ids(node: ast.expr) -> set[str]:
+    value = ast.literal_eval(node)
+    if value is None:
+        return set()
+    if isinstance(value, str):
+        return {value}
+    return set(value)
+
+
+def script_heads(versions_dir: Path = VERSIONS_DIR) -> set[str]:
+    """
+    Returns the head revisions of the version files: the revisions no other
+    revision names as its down_revision.
+    """
+    revisions: set[str] = set()
+    down_revisions: set[str] = set()
+    for path in versions_dir.glob("*.py"):
+        for node in ast.parse(path.read_bytes(), str(path)).body:
+            if isinstance(node, ast.AnnAssign) and node.value is not None:
+                target, value = node.target, node.value
+            elif isinstance(node, ast.Assign) and len(node.targets) == 1:
+                target, value = node.targets[0], node.value
+            else:
+                continue
+            if not isinstance(target, ast.Name):
+                continue
+            if target.id == "revision":
+                revisions |= _revision_ids(value)
+            elif target.id == "down_revision":
+                down_revisions |= _revision_ids(value)
+    return revisions - down_revisions
+
+
+async def database_revisions() -> set[str]:
+    connection = await asyncpg.connect(
+        user=settings.db.user,
+        password=settings.db.password,
+        host=settings.db.host,
+        port=settings.db.port,
+        database=settings.db.name,
+    )
+    try:
+        rows = await connection.fetch("SELECT version_num FROM alembic_version")
+    except asyncpg.UndefinedTableError:
+        return set()
+    finally:
+        await connection.close()
+    return {row["version_num"] for row in rows}
+
+
+def upgrade() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(str(VERSIONS_DIR.parents[1] / "alembic.ini")), "head")
+
+
+def main(args: argparse.Namespace) -> int:
+    started = time.perf_counter()
+    heads = script_heads()
+    current = asyncio.run(database_revisions())
+    if current == heads:
+        print(
+            f"Database is at head {', '.join(sorted(heads))}, "
+            f"checked in {time.perf_counter() - started:.3f}s"
+        )
+        return 0
+    if args.check:
+        print(
+            f"Database is at {', '.join(sorted(current)) or 'no revision'}, "
+            f"head is {', '.join(sorted(heads))}"
+        )
+        return 1
+    upgrade()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check", action="store_true")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.core.database import Base
+
+
+class IdempotencyRecord(Base):
+    """
+    First response to a request with an Idempotency-Key, replayed to its
+    retries. The response columns are NULL while the request is in progress.
+    """
+
+    # sha256 of the user, method, path and key
+    id: Mapped[str] = mapped_column(primary_key=True)
+    # sha256 of the request, a retry must match it
+    fingerprint: Mapped[str] = mapped_column(nullable=False)
+    status_code: Mapped[int | None]
+    headers: Mapped[dict | None] = mapped_column(JSONB)
+    body: Mapped[bytes | None] = mapped_column(LargeBinary)
+    locked_until: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, index=True
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from src.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay between the scheduled and the actual wake-up of the lag probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+loop_lag_max_seconds = registry.gauge(
+    "event_loop_lag_max_seconds", "Largest event loop lag seen so far"
+)
+loop_blocked_total = registry.counter(
+    "event_loop_blocked_total",
+    "Number of times a callback held the event loop longer than the threshold",
+)
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop scheduling delay in a background task.
+
+    In debug mode a watchdog thread additionally pings the loop and, when a
+    ping is not handled within the threshold, logs the stack of whatever is
+    currently running on the loop thread.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        debug: bool = False,
+        threshold: float = 0.1,
+    ) -> None:
+        self.interval = interval
+        self.debug = debug
+        self.threshold = threshold
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._task = loop.create_task(self._probe())
+        if self.debug:
+            self._watchdog = threading.Thread(
+                target=self._watch,
+                args=(loop, threading.get_ident()),
+                name="loop-block-watchdog",
+                daemon=True,
+            )
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.threshold * 2)
+            self._watchdog = None
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        max_lag = 0.0
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - scheduled, 0.0)
+            loop_lag_seconds.observe(lag)
+            if lag > max_lag:
+                max_lag = lag
+                loop_lag_max_seconds.set(max_lag)
+
+    def _watch(self, loop: asyncio.AbstractEventLoop, loop_thread_id: int) -> None:
+        while not self._stopped.is_set():
+            handled = threading.Event()
+            started = time.monotonic()
+            try:
+                loop.call_soon_threadsafe(handled.set)
+            except RuntimeError:
+                return  # loop is closed
+            if not handled.wait(self.threshold):
+                frame = sys._current_frames().get(loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                while not handled.wait(self.threshold):
+                    if self._stopped.is_set():
+                        return
+                loop_blocked_total.inc()
+                logger.warning(
+                    "event loop was blocked for %.3fs, stack at detection:\n%s",
+                    time.monotonic() - started,
+                    stack,
+                )
+            self._stopped.wait(self.threshold)
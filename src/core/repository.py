@@ -1,14 +1,87 @@
+import json
 from abc import ABC, abstractmethod
-from functools import reduce
-from typing import Any, Generic, Type, TypeVar
-
-from sqlalchemy import Select, Sequence, func, insert, select
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from src.core.database import Base
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    ClassVar,
+    Generic,
+    Literal,
+    Type,
+    TypeVar,
+)
+
+from sqlalchemy import Row, Select, Sequence, func, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from src.core.config import settings
+from src.core.database import Base, async_session_maker, bulk_work
+from src.core.singleflight import SingleFlight
 
 ModelType = TypeVar("ModelType", bound=Base)  # type: ignore
 
+LoadStrategy = Literal["selectin", "joined", "raise"]
+
+loaders = {
+    "selectin": selectinload,
+    "joined": joinedload,
+    "raise": raiseload,
+}
+
+# "exact" runs COUNT(*) over the query, "estimated" uses planner statistics
+# when they are above the repository threshold, "window" returns the total
+# with the page rows in a single query.
+CountStrategy = Literal["exact", "estimated", "window"]
+
+
+# Shared by all repositories, keys start with the model
+coalesced_reads: SingleFlight[tuple, Any] = SingleFlight("repository")
+
+
+reltuples_query = text(
+    "SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"
+)
+
+
+@dataclass
+class Page(Generic[ModelType]):
+    items: Sequence[ModelType]
+    total: int
+    skip: int
+    limit: int
+    estimated: bool = False
+
+
+async def estimate_count(
+    connection: AsyncSession | AsyncConnection, query: Select
+) -> int | None:
+    """
+    Returns the planner's row estimate for the query without running it.
+
+    Unfiltered queries over a single table use pg_class.reltuples, anything
+    else the top-level row estimate from EXPLAIN. Returns None when the table
+    has never been analyzed.
+    """
+    froms = query.get_final_froms()
+    if query.whereclause is None and len(froms) == 1 and hasattr(froms[0], "name"):
+        reltuples = await connection.scalar(reltuples_query, {"table": froms[0].name})
+        return reltuples if reltuples is not None and reltuples >= 0 else None
+    if isinstance(connection, AsyncSession):
+        connection = await connection.connection()
+    compiled = query.compile(
+        dialect=connection.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    result = await connection.exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), params
+    )
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
 
 class DatabaseRepository(ABC, Generic[ModelType]):
     @abstractmethod
@@ -49,9 +122,26 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
     model: Type[ModelType]
     session: AsyncSession
 
+    # How each relationship is loaded when requested through join_.
+    # "joined" is only allowed for many-to-one relationships, collections
+    # use "selectin" so rows are never multiplied by the join.
+    loading: ClassVar[dict[str, LoadStrategy]] = {}
+
+    # Relationships that are not requested raise instead of lazy loading,
+    # since an implicit query can not run in async code.
+    raise_on_lazy_load: ClassVar[bool] = True
+
+    # Estimated counts below this are replaced with an exact count.
+    count_estimate_threshold: ClassVar[int] = 100_000
+
+    # Identical concurrent get_by(unique=True) lookups share one query,
+    # see _one_or_none_coalesced.
+    coalesce_reads: ClassVar[bool] = False
+
     def __init__(self, model: Type[ModelType], session: AsyncSession):
         self.session = session
         self.model: Type[ModelType] = model
+        self._validate_loading()
         super().__init__()
 
     async def create(self, attributes: dict[str, Any] = {}) -> ModelType | None:
@@ -80,11 +170,39 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
         query = self._query(join_)
         query = query.offset(skip).limit(limit)
 
-        if join_ is not None:
-            return await self._all_unique(query)
-
         return await self._all(query)
 
+    async def get_page(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        join_: set[str] | None = None,
+        count: CountStrategy = "window",
+    ) -> Page[ModelType]:
+        """
+        Returns a page of model instances together with the total count.
+
+        :param skip: The number of records to skip.
+        :param limit: The number of record to return.
+        :param join_: The joins to make.
+        :param count: How to count the total, see CountStrategy.
+        :return: The page.
+        """
+        query = self._query(join_)
+
+        if count != "window":
+            items = await self._all(query.offset(skip).limit(limit))
+            total, estimated = await self._count_with(query, count)
+            return Page(items, total, skip, limit, estimated)
+
+        windowed = query.add_columns(func.count().over().label("total"))
+        rows = (await self.session.execute(windowed.offset(skip).limit(limit))).all()
+        if rows:
+            return Page([row[0] for row in rows], rows[0].total, skip, limit)
+        # An empty page past the end carries no total, count it separately
+        total = await self._count(query) if skip else 0
+        return Page([], total, skip, limit)
+
     async def get_by(
         self,
         field: str,
@@ -103,13 +221,96 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
         query = self._query(join_)
         query = await self._get_by(query, field, value)
 
-        if join_ is not None:
-            return await self._all_unique(query)
         if unique:
+            if self.coalesce_reads and not self.session.in_transaction():
+                key = (self.model, field, value, frozenset(join_ or ()))
+                return await self._one_or_none_coalesced(query, key)
             return await self._one_or_none(query)
 
         return await self._all(query)
 
+    async def stream(
+        self, *columns: str, batch_size: int = 10_000
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        Yields all rows of the table in batches through a server-side cursor,
+        so memory use does not depend on the table size. Rows are plain
+        tuples, not model instances.
+
+        :param columns: The columns to select, all columns by default.
+        :param batch_size: The number of rows fetched per round trip.
+        :return: An async iterator over batches of rows.
+        """
+        table = self.model.__table__
+        selected = [table.c[name] for name in columns] if columns else table.c
+        query = select(*selected).execution_options(yield_per=batch_size)
+        result = await self.session.stream(query)
+        async for partition in result.partitions():
+            yield partition
+
+    async def copy_upsert(
+        self,
+        columns: list[str],
+        records: AsyncIterable[tuple],
+        conflict: str,
+        update: list[str] | None = None,
+    ) -> int:
+        """
+        Loads records with COPY into a temporary staging table and merges
+        them into the table with INSERT ... ON CONFLICT. Bypasses the ORM, so
+        column defaults must be filled in by the caller. Runs without the
+        request statement timeout, BULK_TIMEOUT_SECONDS applies instead.
+
+        :param columns: The columns of each record.
+        :param records: The records to load, streamed into COPY.
+        :param conflict: The unique column to merge on. When it repeats in
+            the records, the last one wins.
+        :param update: The columns to overwrite on conflict, existing rows
+            are left unchanged if not given.
+        :return: The number of inserted or updated rows.
+        """
+        table = self.model.__tablename__
+        staging = f"{table}_staging"
+        column_list = ", ".join(columns)
+        if update:
+            action = "UPDATE SET " + ", ".join(
+                f"{name} = EXCLUDED.{name}" for name in update
+            )
+        else:
+            action = "NOTHING"
+
+        token = bulk_work.set(True)
+        try:
+            connection = await self.session.connection()
+            # Through SQLAlchemy, which begins the transaction the staging
+            # table lives in; the driver connection alone would run it in
+            # autocommit
+            await connection.exec_driver_sql(
+                f"CREATE TEMP TABLE {staging} "
+                f"(LIKE {table} INCLUDING DEFAULTS, line bigserial) ON COMMIT DROP"
+            )
+            milliseconds = int(settings.resilience.bulk_timeout_seconds * 1000)
+            await connection.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {milliseconds}"
+            )
+            driver_connection = (
+                await connection.get_raw_connection()
+            ).driver_connection
+            await driver_connection.copy_records_to_table(
+                staging, records=records, columns=columns
+            )
+            status = await driver_connection.execute(
+                f"INSERT INTO {table} ({column_list}) "
+                f"SELECT DISTINCT ON ({conflict}) {column_list} FROM {staging} "
+                f"ORDER BY {conflict}, line DESC "
+                f"ON CONFLICT ({conflict}) DO {action}"
+            )
+            await self.session.commit()
+        finally:
+            bulk_work.reset(token)
+        # Status is "INSERT 0 <rows>"
+        return int(status.split()[-1])
+
     async def delete(self, model: ModelType) -> None:
         """
         Deletes the model.
@@ -147,10 +348,6 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
         new_query = await self.session.scalars(query)
         return new_query.all()  # type: ignore
 
-    async def _all_unique(self, query: Select) -> Sequence[ModelType]:
-        result = await self.session.execute(query)
-        return result.unique().scalars().all()  # type: ignore
-
     async def _first(self, query: Select) -> ModelType | None:
         """
         Returns the first result from the query.
@@ -166,6 +363,31 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
         new_query = await self.session.scalars(query)
         return new_query.one_or_none()
 
+    async def _one_or_none_coalesced(
+        self, query: Select, key: tuple
+    ) -> ModelType | None:
+        """
+        Returns the first result from the query or None, running the query
+        once for all concurrent callers with the same key.
+
+        The query runs in its own short-lived session and the result is
+        merged into this one without another query. Only used before this
+        session starts a transaction, when reading from any other snapshot
+        is equally valid.
+
+        :param query: The query to execute.
+        :param key: Identifies identical queries.
+        """
+        instance = await coalesced_reads.do(key, self._detached_one_or_none, query)
+        if instance is None:
+            return None
+        return await self.session.merge(instance, load=False)
+
+    @staticmethod
+    async def _detached_one_or_none(query: Select) -> Any:
+        async with async_session_maker() as session:
+            return (await session.scalars(query)).one_or_none()
+
     async def _one(self, query: Select) -> ModelType:
         """
         Returns the first result from the query or raises NoResultFound.
@@ -188,6 +410,22 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
         )
         return new_query.one()
 
+    async def _count_with(
+        self, query: Select, strategy: CountStrategy = "exact"
+    ) -> tuple[int, bool]:
+        """
+        Returns the count of the records using the given strategy.
+
+        :param query: The query to count.
+        :param strategy: "exact" or "estimated".
+        :return: The count and whether it is an estimate.
+        """
+        if strategy == "estimated":
+            estimate = await estimate_count(self.session, query)
+            if estimate is not None and estimate >= self.count_estimate_threshold:
+                return estimate, True
+        return await self._count(query), False
+
     async def _sort_by(
         self,
         query: Select,
@@ -233,19 +471,28 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
 
     def _maybe_join(self, query: Select, join_: set[str] | None = None) -> Select:
         """
-        Returns the query with the given joins.
+        Returns the query with loader options for the given relationships.
 
         :param query: The query to join.
-        :param join_: The joins to make.
-        :return: The query with the given joins.
+        :param join_: The relationships to load, each must be declared in
+            `loading`.
+        :return: The query with the loader options.
         """
-        if not join_:
-            return query
-
-        if not isinstance(join_, set):
-            raise TypeError("join_ must be a set")
-
-        return reduce(self._add_join_to_query, join_, query)  # type: ignore
+        options = []
+        if join_:
+            if not isinstance(join_, set):
+                raise TypeError("join_ must be a set")
+            for name in join_:
+                if name not in self.loading:
+                    raise ValueError(
+                        f"no loading strategy for '{name}' "
+                        f"in {type(self).__name__}.loading"
+                    )
+                options.append(loaders[self.loading[name]](getattr(self.model, name)))
+        if self.raise_on_lazy_load:
+            options.append(raiseload("*", sql_only=True))
+
+        return query.options(*options) if options else query
 
     def _maybe_ordered(self, query: Select, order_: dict | None = None) -> Select:
         """
@@ -265,12 +512,12 @@ class SQLAlchemyRepository(DatabaseRepository, Generic[ModelType]):
 
         return query
 
-    def _add_join_to_query(self, query: Select, join_: set[str]) -> Select:
-        """
-        Returns the query with the given join.
-
-        :param query: The query to join.
-        :param join_: The join to make.
-        :return: The query with the given join.
-        """
-        return getattr(self, "_join_" + join_)(query)  # type: ignore
+    def _validate_loading(self) -> None:
+        relationships = inspect(self.model).relationships
+        for name, strategy in self.loading.items():
+            if name not in relationships:
+                raise ValueError(f"{self.model.__name__} has no relationship '{name}'")
+            if strategy == "joined" and relationships[name].uselist:
+                raise ValueError(
+                    f"'{name}' is a collection, use 'selectin' instead of 'joined'"
+                )
@@ -0,0 +1,344 @@
+import asyncio
+import contextvars
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.core.metrics import registry
+
+# time.monotonic() by which the current request should be answered
+request_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+dependency_in_flight = registry.gauge(
+    "dependency_in_flight", "Calls admitted to a dependency and not finished yet"
+)
+dependency_queued = registry.gauge(
+    "dependency_queued", "Calls waiting for a free slot of a dependency"
+)
+dependency_rejected_total = registry.counter(
+    "dependency_rejected_total",
+    "Calls to a dependency rejected by reason: overloaded, circuit_open or deadline",
+)
+circuit_state = registry.gauge(
+    "circuit_state", "Circuit breaker state: 0 closed, 1 open, 2 half-open"
+)
+circuit_opened_total = registry.counter(
+    "circuit_opened_total", "Times a circuit breaker tripped"
+)
+
+
+class DependencyUnavailable(HTTPException):
+    def __init__(self, dependency: str, reason: str, retry_after: float) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"{dependency} is unavailable: {reason}",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self, dependency: str) -> None:
+        super().__init__(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"request deadline exceeded waiting for {dependency}",
+        )
+
+
+def remaining() -> float | None:
+    """
+    Returns the seconds left until the request deadline, None outside of a
+    request or when requests have no deadline.
+    """
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Sets a deadline `seconds` from now, or keeps the current one if it is
+    earlier.
+    """
+    new_deadline = time.monotonic() + seconds
+    current = request_deadline.get()
+    if current is not None:
+        new_deadline = min(current, new_deadline)
+    token = request_deadline.set(new_deadline)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """
+    Gives every request a deadline of `timeout` seconds, requests to the
+    paths in `overrides` get their own, 0 for none. Clients can ask for a
+    shorter one with the `X-Request-Timeout` header, in seconds.
+
+    Calls to dependencies cap their own timeouts at the deadline. If it
+    passes before the response has started anyway, the handler is cancelled
+    and 504 is returned; a response already being sent is not interrupted.
+    """
+
+    header = b"x-request-timeout"
+
+    def __init__(
+        self, app: ASGIApp, timeout: float, overrides: dict[str, float] | None = None
+    ) -> None:
+        self.app = app
+        self.timeout = timeout
+        self.overrides = overrides or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self.overrides.get(scope["path"].rstrip("/"), self.timeout)
+        if timeout <= 0:
+            await self.app(scope, receive, send)
+            return
+        for name, value in scope["headers"]:
+            if name == self.header:
+                try:
+                    timeout = min(timeout, float(value))
+                except ValueError:
+                    pass
+                break
+        task = asyncio.current_task()
+        response_started = expired = False
+
+        def expire() -> None:
+            nonlocal expired
+            if not response_started:
+                expired = True
+                task.cancel()  # type: ignore
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                timer.cancel()
+            await send(message)
+
+        timer = asyncio.get_running_loop().call_later(timeout, expire)
+        try:
+            with deadline(timeout):
+                await self.app(scope, receive, send_wrapper)
+        except asyncio.CancelledError:
+            if not expired or task.uncancel() > 0:  # type: ignore
+                raise
+            if response_started:
+                # Started while the cancellation was being delivered
+                return
+            dependency_rejected_total.inc(dependency="request", reason="deadline")
+            response = JSONResponse(
+                {"detail": "request deadline exceeded"},
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            )
+            await response(scope, receive, send)
+        finally:
+            timer.cancel()
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a dependency after `failure_threshold` consecutive
+    failures.
+
+    While open, calls are rejected without reaching the dependency. After
+    `reset_seconds` one probe call is let through: its success closes the
+    circuit, its failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._changed_at = 0.0
+        circuit_state.set(self.state, dependency=name)
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self._changed_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED or self.failure_threshold <= 0:
+            return True
+        if time.monotonic() - self._changed_at < self.reset_seconds:
+            return False
+        # Open long enough, or the previous probe never reported back
+        self._set_state(self.HALF_OPEN)
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED
+            and 0 < self.failure_threshold <= self.failures
+        ):
+            circuit_opened_total.inc(dependency=self.name)
+            self._set_state(self.OPEN)
+
+    def _set_state(self, state: int) -> None:
+        self.state = state
+        self._changed_at = time.monotonic()
+        circuit_state.set(state, dependency=self.name)
+
+
+class Bulkhead:
+    """
+    Limits the calls to a dependency running at once.
+
+    At most `max_concurrency` calls run and at most `max_pending` more wait
+    for a slot, first come first served. Calls beyond that are rejected
+    instead of queueing. 0 means no limit.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_pending: int) -> None:
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def pending(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float | None = None) -> None:
+        """
+        :param timeout: Seconds to wait for a slot, DeadlineExceeded after.
+        :raises DependencyUnavailable: If the queue is full.
+        """
+        if self.max_concurrency <= 0 or (
+            self.active < self.max_concurrency and not self._waiters
+        ):
+            self._set_active(self.active + 1)
+            return
+        if self.max_pending > 0 and len(self._waiters) >= self.max_pending:
+            dependency_rejected_total.inc(dependency=self.name, reason="overloaded")
+            raise DependencyUnavailable(self.name, "too many pending calls", 1)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        dependency_queued.set(len(self._waiters), dependency=self.name)
+        try:
+            async with asyncio.timeout(timeout):
+                # The slot is handed over by release, active stays the same
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(e, TimeoutError):
+                dependency_rejected_total.inc(dependency=self.name, reason="deadline")
+                raise DeadlineExceeded(self.name) from None
+            raise
+        finally:
+            dependency_queued.set(len(self._waiters), dependency=self.name)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._set_active(self.active - 1)
+
+    def _set_active(self, active: int) -> None:
+        self.active = active
+        dependency_in_flight.set(active, dependency=self.name)
+
+
+class DependencyGuard:
+    """
+    Admission control for calls to one dependency: a circuit breaker, a
+    bulkhead and the request deadline.
+
+    :param is_failure: Whether an exception raised by a call means the
+        dependency is unhealthy, as opposed to e.g. a missing object.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_pending: int,
+        failure_threshold: int,
+        reset_seconds: float,
+        is_failure: Callable[[BaseException], bool] = lambda _: True,
+    ) -> None:
+        self.name = name
+        self.bulkhead = Bulkhead(name, max_concurrency, max_pending)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+        self.is_failure = is_failure
+
+    async def admit(self) -> None:
+        """
+        Waits for a slot, to be given back with release.
+
+        :raises DependencyUnavailable: If the circuit is open or the queue
+            is full.
+        :raises DeadlineExceeded: If the deadline passes before a slot frees.
+        """
+        timeout = remaining()
+        if timeout is not None and timeout <= 0:
+            dependency_rejected_total.inc(dependency=self.name, reason="deadline")
+            raise DeadlineExceeded(self.name)
+        if not self.breaker.allow():
+            dependency_rejected_total.inc(dependency=self.name, reason="circuit_open")
+            raise DependencyUnavailable(
+                self.name, "circuit open", self.breaker.retry_after
+            )
+        await self.bulkhead.acquire(timeout)
+
+    def release(self) -> None:
+        self.bulkhead.release()
+
+    @asynccontextmanager
+    async def call(self) -> AsyncIterator[float | None]:
+        """
+        Admits one call and records its outcome. Yields the seconds left
+        until the deadline and cancels the call when they run out.
+        """
+        await self.admit()
+        try:
+            timeout = remaining()
+            async with asyncio.timeout(timeout):
+                yield timeout
+        except TimeoutError:
+            self.breaker.record_failure()
+            dependency_rejected_total.inc(dependency=self.name, reason="deadline")
+            raise DeadlineExceeded(self.name) from None
+        except HTTPException:
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self.release()
@@ -0,0 +1,46 @@
+from typing import Any
+
+import pydantic_core
+from fastapi import HTTPException, Request
+from fastapi.exception_handlers import http_exception_handler
+from fastapi.responses import JSONResponse, Response
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Serializes the content with pydantic-core in a single pass. Pydantic
+    models, UUIDs and datetimes are written directly, so handlers can return
+    `FastJSONResponse(model)` and skip response model validation and
+    jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
+
+
+class StaticHTTPException(HTTPException):
+    """
+    HTTPException with its JSON body serialized once, for exceptions kept as
+    module constants and raised many times.
+    """
+
+    def __init__(
+        self, status_code: int, detail: str, headers: dict[str, str] | None = None
+    ) -> None:
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+        self.body = pydantic_core.to_json({"detail": detail})
+
+
+async def static_http_exception_handler(
+    request: Request, exc: StarletteHTTPException
+) -> Response:
+    body = getattr(exc, "body", None)
+    if body is None:
+        return await http_exception_handler(request, exc)
+    return Response(
+        content=body,
+        status_code=exc.status_code,
+        headers=exc.headers,
+        media_type="application/json",
+    )
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import PlainTextResponse
+
+from src.auth.dependencies import get_current_superuser
+from src.core.health import readiness
+from src.core.metrics import registry
+from src.core.responses import FastJSONResponse
+
+core_router = APIRouter(tags=["Core"])
+
+
+@core_router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(get_current_superuser)],
+)
+async def metrics():
+    """
+    Prometheus metrics, for superusers only: they expose paths, error rates
+    and pool sizes.
+    """
+    return PlainTextResponse(
+        content=registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@core_router.get("/health")
+async def health():
+    """
+    Liveness: the worker serves requests. Does not touch dependencies.
+    """
+    return FastJSONResponse({"status": "ok"})
+
+
+@core_router.get("/ready")
+async def ready():
+    """
+    Readiness: startup is over and the dependencies answer. 503 otherwise.
+    """
+    if not readiness.started:
+        return FastJSONResponse(
+            {"status": "starting"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    results = await readiness.results()
+    ok = all(result.ok for result in results.values())
+    return FastJSONResponse(
+        {
+            "status": "ready" if ok else "unavailable",
+            "checks": {
+                name: {"ok": result.ok, "latency_ms": round(result.latency * 1000, 1)}
+                for name, result in results.items()
+            },
+        },
+        status_code=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
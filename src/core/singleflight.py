@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+from src.core.metrics import registry
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+singleflight_calls_total = registry.counter(
+    "singleflight_calls_total", "Calls made through a single-flight group"
+)
+singleflight_coalesced_total = registry.counter(
+    "singleflight_coalesced_total",
+    "Calls that joined an identical call already in flight instead of running",
+)
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Coalesces identical concurrent calls.
+
+    While a call for a key is in flight, other callers with the same key wait
+    for it and get the same result or exception instead of running their own.
+    The call runs in a separate task, so a cancelled caller does not cancel it
+    for the others; it is cancelled only when every caller has gone.
+    Results are not cached once the call completes.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[K, tuple[asyncio.Task, list[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self, key: K, fn: Callable[..., Awaitable[V]], *args: Any, **kwargs: Any
+    ) -> V:
+        singleflight_calls_total.inc(group=self.name)
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            call = self._calls[key] = (task, [0])
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            singleflight_coalesced_total.inc(group=self.name)
+        task, waiters = call
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if waiters[0] == 1 and not task.done():
+                # Callers arriving before the task finishes cancelling start
+                # a new call instead of getting the CancelledError
+                self._forget(key, task, retrieve=False)
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+    def _forget(self, key: K, task: asyncio.Task, retrieve: bool = True) -> None:
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+        if retrieve and not task.cancelled():
+            # Mark the exception as retrieved when every caller has gone
+            task.exception()
@@ -1,3 +1,8 @@
+import os
+import time
+import uuid
+
+
 def camel_case_to_snake_case(input_str: str) -> str:
     """
     >>> camel_case_to_snake_case("SomeSDK")
@@ -21,3 +26,25 @@ def camel_case_to_snake_case(input_str: str) -> str:
                 chars.append("_")
         chars.append(char.lower())
     return "".join(chars)
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generates a time-ordered UUID version 7 (RFC 9562).
+
+    The 48-bit millisecond timestamp is followed by 12 bits of sub-millisecond
+    precision, so ids generated by one process sort in creation order and new
+    rows land at the right edge of B-tree indexes.
+
+    >>> uuid7().version
+    7
+    """
+    nanoseconds = time.time_ns()
+    milliseconds, remainder = divmod(nanoseconds, 1_000_000)
+    sub_milliseconds = remainder * 4096 // 1_000_000
+    value = (milliseconds & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= sub_milliseconds << 64
+    value |= 0b10 << 62
+    value |= int.from_bytes(os.urandom(8), "big") & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
@@ -1,17 +1,73 @@
+import asyncio
+import logging
+import logging.config
+from contextlib import asynccontextmanager
+
 from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from sqladmin import Admin
+from starlette.exceptions import HTTPException
 
-from src.auth.admin import UserAdmin
 from src.auth.dependencies import get_auth_service
-from src.auth.router import auth_router
-# from src.media.router import router as media_router
+from src.auth.repositories import warm_up as warm_up_auth_queries
+from src.auth.router import auth_router, users_router
 from src.auth.utils import jwt_decode
-from src.core.database import engine
+from src.core.asgi import LazyApp
+from src.core.compression import CompressionMiddleware
 from src.core.config import settings
+from src.core.health import readiness, warm_up
+from src.core.housekeeping import housekeeping
+from src.core.log import RequestIdMiddleware, logging_config
+from src.core.monitoring import LoopLagMonitor
+from src.core.resilience import DeadlineMiddleware
+from src.core.responses import FastJSONResponse, static_http_exception_handler
+from src.core.router import core_router
+from src.core.startup import startup_timer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not logging.getLogger().handlers:
+        # Not started through src.server, e.g. by `fastapi dev`
+        with startup_timer.step("logging"):
+            logging.config.dictConfig(
+                logging_config(
+                    level=settings.logging.level,
+                    json=settings.logging.json_format,
+                    capacity=settings.logging.queue_capacity,
+                    sample_every=settings.logging.sample_every,
+                )
+            )
+    loop_monitor = LoopLagMonitor(
+        interval=settings.monitoring.loop_lag_interval_seconds,
+        debug=settings.monitoring.loop_block_debug,
+        threshold=settings.monitoring.loop_block_threshold_seconds,
+    )
+    with startup_timer.step("loop_monitor"):
+        loop_monitor.start()
+    purge_task = None
+    if settings.housekeeping.purge_interval_seconds > 0:
+        purge_task = asyncio.create_task(
+            housekeeping.run(settings.housekeeping.purge_interval_seconds)
+        )
+    with startup_timer.step("warm_up"):
+        await warm_up(settings.health.warmup_connections, warm_up_auth_queries)
+    readiness.started = True
+    yield
+    readiness.started = False
+    if purge_task is not None:
+        purge_task.cancel()
+    await loop_monitor.stop()
 
-app = FastAPI(dependencies=[Depends(get_auth_service)])
+
+exception_handlers = {HTTPException: static_http_exception_handler}
+
+app = FastAPI(
+    dependencies=[Depends(get_auth_service)],
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+    exception_handlers=exception_handlers,
+)
 
 origins = ["http://localhost", "http://localhost:8080", settings.host]
 
@@ -23,8 +79,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app_v1 = FastAPI(title="FastAPI Boilerplate v1")
-admin_v1 = Admin(app=app_v1, engine=engine)
+app.add_middleware(
+    DeadlineMiddleware,
+    timeout=settings.resilience.request_timeout_seconds,
+    # COPY of a large upload or a full export takes far longer
+    overrides={
+        "/api/v1/users/import": settings.resilience.bulk_timeout_seconds,
+        "/api/v1/users/export": settings.resilience.bulk_timeout_seconds,
+    },
+)
+
+if settings.compression.enabled:
+    # Outside DeadlineMiddleware, so its 504 responses are compressed too
+    app.add_middleware(
+        CompressionMiddleware,
+        content_types=settings.compression.content_types,
+        minimum_size=settings.compression.minimum_size,
+        gzip_level=settings.compression.gzip_level,
+        brotli_quality=settings.compression.brotli_quality,
+    )
+
+# Around the middleware above, so what they log carries the request id
+app.add_middleware(RequestIdMiddleware)
+
+app_v1 = FastAPI(
+    title="FastAPI Boilerplate v1",
+    default_response_class=FastJSONResponse,
+    exception_handlers=exception_handlers,
+)
 
 
 @app.middleware("http")
@@ -49,7 +131,19 @@ async def check_authentication(request: Request, call_next):
 
 
 app_v1.include_router(auth_router)
-# app_v1.include_router(media_router, prefix="/media")
-admin_v1.add_view(UserAdmin)
+app_v1.include_router(users_router)
+app_v1.include_router(core_router)
+
+if settings.media_enabled:
+    from src.media.dependencies import get_s3_repository
+    from src.media.router import router as media_router
+
+    app_v1.include_router(media_router, prefix="/media")
+    if settings.s3.backend == "s3":
+        readiness.add_check("s3", get_s3_repository("sample-bucket").ping)
+
+if settings.admin_enabled:
+    # sqladmin and its templates are loaded on the first admin request
+    app_v1.mount("/admin", LazyApp("src.auth.admin:create_admin_app"), name="admin")
 
 app.mount("/api/v1", app_v1)
@@ -0,0 +1,236 @@
+import hashlib
+import math
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from src.core.metrics import registry
+from src.core.singleflight import SingleFlight
+from src.media.repositories import MediaRepository
+
+# Hit ratio is hits / (hits + misses + stale) over this counter
+media_cache_requests_total = registry.counter(
+    "media_cache_requests_total",
+    "Media cache lookups by result: hit, miss or stale (ETag changed)",
+)
+media_cache_bytes = registry.gauge(
+    "media_cache_bytes", "Size of the objects in the media disk cache"
+)
+media_cache_evictions_total = registry.counter(
+    "media_cache_evictions_total", "Objects evicted from the media disk cache"
+)
+
+cache_fills: SingleFlight[tuple[str, str], "CacheEntry"] = SingleFlight(
+    "media_cache_fill"
+)
+
+
+@dataclass
+class CacheEntry:
+    path: str
+    etag: str
+    size: int
+    validated_at: float
+
+
+class MediaCache:
+    """
+    Read-through cache of storage objects on local disk.
+
+    Files are named `<sha256 of key>.<etag>` so the index can be rebuilt from
+    the directory after a restart. Entries are trusted for
+    `revalidate_seconds` after they were last checked against the storage
+    ETag. Files are written to a temporary name and renamed into place, so a
+    reader never sees a partial file. When the total size exceeds `max_bytes`
+    the least recently used files are deleted.
+
+    Files handed out by acquire are pinned until released: evicting or
+    invalidating their entry leaves the file in place until then, so a
+    response that is still sending it is not cut off.
+
+    The index is local to the worker process, workers sharing a directory
+    only share the files found at startup. invalidate deletes the files of
+    the object, other workers notice on their next hit and download it
+    again.
+    """
+
+    temp_suffix = ".part"
+
+    def __init__(
+        self,
+        repository: MediaRepository,
+        directory: str,
+        max_bytes: int,
+        revalidate_seconds: float,
+    ) -> None:
+        self.repository = repository
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.size = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        # Paths handed out by acquire and not released yet
+        self._pins: Counter[str] = Counter()
+        # Pinned paths whose entry is gone, deleted when released
+        self._orphans: set[str] = set()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_path(self, object_key: str) -> str:
+        """
+        Returns the path of a local copy of the object, downloading it first
+        if it is not cached or has changed in storage.
+        """
+        name = self._name(object_key)
+        entry = self._entries.get(name)
+        if entry is not None and not os.path.exists(entry.path):
+            # Invalidated by another worker
+            self._remove(name)
+            entry = None
+        if entry is not None:
+            if time.monotonic() - entry.validated_at < self.revalidate_seconds:
+                return self._hit(name, entry)
+            etag = await self.repository.get_object_etag(object_key)
+            if etag == entry.etag and os.path.exists(entry.path):
+                entry.validated_at = time.monotonic()
+                return self._hit(name, entry)
+            media_cache_requests_total.inc(result="stale")
+            self._remove(name)
+        else:
+            media_cache_requests_total.inc(result="miss")
+        entry = await cache_fills.do(
+            (self.directory, object_key), self._fill, object_key, name
+        )
+        return entry.path
+
+    async def acquire(self, object_key: str) -> str:
+        """
+        Like get_path, but the file stays on disk until release is called
+        with the path, even if its entry is evicted or invalidated meanwhile.
+        """
+        name = self._name(object_key)
+        while True:
+            path = await self.get_path(object_key)
+            entry = self._entries.get(name)
+            # A fill completes in another task, the entry may have been
+            # evicted before this one resumed
+            if entry is not None and entry.path == path:
+                self._pins[path] += 1
+                return path
+
+    def release(self, path: str) -> None:
+        self._pins[path] -= 1
+        if self._pins[path] > 0:
+            return
+        del self._pins[path]
+        if path in self._orphans:
+            self._orphans.discard(path)
+            self._unlink(path)
+
+    def invalidate(self, object_key: str) -> None:
+        """
+        Drops the cached copy of a deleted or replaced object, in this worker
+        and, by deleting its files, in the others.
+        """
+        name = self._name(object_key)
+        self._remove(name)
+        for file in os.scandir(self.directory):
+            if file.name.startswith(name + ".") and file.path not in self._pins:
+                self._unlink(file.path)
+
+    def _hit(self, name: str, entry: CacheEntry) -> str:
+        media_cache_requests_total.inc(result="hit")
+        self._entries.move_to_end(name)
+        return entry.path
+
+    async def _fill(self, object_key: str, name: str) -> CacheEntry:
+        temp_path = os.path.join(self.directory, uuid.uuid4().hex + self.temp_suffix)
+        try:
+            etag = await self.repository.download_object(object_key, temp_path)
+            path = os.path.join(self.directory, f"{name}.{etag}")
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        entry = CacheEntry(path, etag, os.path.getsize(path), time.monotonic())
+        self._add(name, entry)
+        return entry
+
+    def _add(self, name: str, entry: CacheEntry) -> None:
+        self._remove(name)
+        # Written again under the same name, no longer to be deleted on release
+        self._orphans.discard(entry.path)
+        self._entries[name] = entry
+        self.size += entry.size
+        # The new entry is never evicted, even if larger than the budget, so
+        # the caller can still serve it
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+            media_cache_evictions_total.inc()
+        media_cache_bytes.set(self.size)
+
+    def _remove(self, name: str) -> None:
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        if entry.path in self._pins:
+            self._orphans.add(entry.path)
+        else:
+            self._unlink(entry.path)
+        media_cache_bytes.set(self.size)
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _load(self) -> None:
+        files = []
+        for file in os.scandir(self.directory):
+            if not file.is_file():
+                continue
+            if file.name.endswith(self.temp_suffix):
+                # Leftovers of interrupted downloads, recent ones may belong
+                # to another worker
+                if file.stat().st_mtime < time.time() - 3600:
+                    os.unlink(file.path)
+                continue
+            name, _, etag = file.name.partition(".")
+            stat = file.stat()
+            files.append((stat.st_atime, name, file.path, etag, stat.st_size))
+        # Least recently read first; entries are revalidated on first use
+        for _, name, path, etag, size in sorted(files):
+            self._add(name, CacheEntry(path, etag, size, validated_at=-math.inf))
+
+    @staticmethod
+    def _name(object_key: str) -> str:
+        return hashlib.sha256(object_key.encode()).hexdigest()
+
+
+class CachedFileResponse(FileResponse):
+    """
+    Sends a file acquired from a MediaCache and releases it once sent, or
+    when sending fails.
+    """
+
+    def __init__(self, cache: MediaCache, path: str, **kwargs) -> None:
+        super().__init__(path, **kwargs)
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.cache.release(str(self.path))
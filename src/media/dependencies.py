@@ -1,5 +1,9 @@
+import functools
+import os
+
 from src.core.config import settings
-from src.media.repositories import S3Repository
+from src.media.cache import MediaCache
+from src.media.repositories import LocalFSRepository, MediaRepository, S3Repository
 
 
 def get_s3_repository(bucket_name: str) -> S3Repository:
@@ -9,3 +13,34 @@ def get_s3_repository(bucket_name: str) -> S3Repository:
         endpoint_url=settings.s3.endpoint_url,
         bucket_name=bucket_name,
     )
+
+
+def get_local_repository(bucket_name: str) -> LocalFSRepository:
+    return LocalFSRepository(
+        root=os.path.join(settings.s3.local_dir, bucket_name), bucket_name=bucket_name
+    )
+
+
+def get_bucket_repository(bucket_name: str) -> MediaRepository:
+    """
+    Returns the repository for the bucket on the configured backend.
+    """
+    if settings.s3.backend == "local":
+        return get_local_repository(bucket_name)
+    return get_s3_repository(bucket_name)
+
+
+@functools.cache
+def get_media_cache(bucket_name: str) -> MediaCache | None:
+    """
+    Returns the disk cache for the bucket, shared by all requests of the
+    worker, or None if the cache is disabled.
+    """
+    if not settings.media_cache.directory or settings.s3.backend == "local":
+        return None
+    return MediaCache(
+        repository=get_s3_repository(bucket_name),
+        directory=os.path.join(settings.media_cache.directory, bucket_name),
+        max_bytes=settings.media_cache.max_bytes,
+        revalidate_seconds=settings.media_cache.revalidate_seconds,
+    )
@@ -0,0 +1,31 @@
+from fastapi import status
+
+from src.core.responses import StaticHTTPException
+
+not_found = StaticHTTPException(
+    status_code=status.HTTP_404_NOT_FOUND, detail="object not found"
+)
+
+forbidden = StaticHTTPException(
+    status_code=status.HTTP_403_FORBIDDEN, detail="object belongs to another user"
+)
+
+not_an_image = StaticHTTPException(
+    status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+    detail="object is not a supported image",
+)
+
+unsupported_variant = StaticHTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST, detail="unsupported width or format"
+)
+
+image_processing_overloaded = StaticHTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="too many concurrent image operations",
+    headers={"Retry-After": "1"},
+)
+
+content_addressed = StaticHTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail="content-addressed objects can not be replaced",
+)
@@ -0,0 +1,83 @@
+"""
+Image variant rendering.
+
+Runs in worker processes of the image executor, so this module only imports
+Pillow and the standard library.
+"""
+
+import io
+import re
+
+from PIL import Image, ImageOps
+
+# Query value -> Pillow format name
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG"}
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+VARIANT_SUFFIX = re.compile(r"@w[0-9]+\.(?:%s)$" % "|".join(FORMATS))
+
+
+def variant_key(object_key: str, width: int, format: str) -> str:
+    """
+    Returns the storage key of a variant, stored next to the original
+    """
+    return f"{object_key}@w{width}.{format}"
+
+
+def variant_original(object_key: str) -> str | None:
+    """
+    Returns the key of the original if the key has the shape of a variant key
+    """
+    match = VARIANT_SUFFIX.search(object_key)
+    return object_key[: match.start()] if match else None
+
+
+def variant_keys(object_key: str, widths: list[int]) -> list[str]:
+    """
+    Returns the keys of every variant the object can have
+    """
+    return [
+        variant_key(object_key, width, format) for width in widths for format in FORMATS
+    ]
+
+
+def render_variant(
+    source: str | bytes, width: int, format: str, quality: int, max_pixels: int
+) -> bytes:
+    """
+    Scales the image down to `width`, never up, and encodes it in `format`.
+
+    EXIF orientation is applied to the pixels and all metadata except the
+    colour profile is dropped.
+
+    :param source: Path of the original or its content.
+    :param max_pixels: Larger images are rejected with DecompressionBombError.
+    """
+    # Pillow itself only refuses images twice that large
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+        if image.width * image.height > max_pixels:
+            raise Image.DecompressionBombError(
+                f"image of {image.width}x{image.height} pixels exceeds "
+                f"{max_pixels} pixels"
+            )
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale directly. A square box
+        # keeps both sides large enough whatever the orientation.
+        image.draft("RGB", (width, width))
+        icc_profile = image.info.get("icc_profile")
+        image = ImageOps.exif_transpose(image)
+    if image.width > width:
+        image.thumbnail(
+            (width, image.height * width // image.width + 1),
+            Image.Resampling.LANCZOS,
+        )
+    if format == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    image.info = {}
+    output = io.BytesIO()
+    params = {"icc_profile": icc_profile} if icc_profile else {}
+    if format != "png":
+        params["quality"] = quality
+    image.save(output, FORMATS[format], **params)
+    return output.getvalue()
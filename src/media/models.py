@@ -0,0 +1,67 @@
+from datetime import datetime
+import uuid
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import UUID
+
+from src.core.database import Base
+from src.core.utils import uuid7
+
+
+class MediaContent(Base):
+    """
+    Content-addressed object in media storage, shared by every upload of
+    the same bytes. A row exists only after the object was written.
+    """
+
+    # sha256 of the content, also the storage key
+    id: Mapped[str] = mapped_column(primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+
+class MediaContentReference(Base):
+    """
+    Upload of content-addressed content by its owner, at most one per owner.
+    The content is deleted with its last reference.
+    """
+
+    __table_args__ = (
+        UniqueConstraint(
+            "content_id", "owner_id", postgresql_nulls_not_distinct=True
+        ),
+    )
+
+    content_id: Mapped[str] = mapped_column(
+        ForeignKey("media_contents.id", ondelete="CASCADE"), nullable=False
+    )
+    # Anonymous uploads share one reference
+    owner_id: Mapped[uuid.UUID | None] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE")
+    )
+
+
+class MediaObject(Base):
+    """
+    Catalog entry of an object in media storage, so listings and metadata
+    lookups do not need storage requests.
+    """
+
+    __table_args__ = (
+        UniqueConstraint("bucket", "key"),
+        Index("ix_media_objects_owner_id_key", "owner_id", "key"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID, primary_key=True, default=uuid7)
+    bucket: Mapped[str] = mapped_column(nullable=False)
+    key: Mapped[str] = mapped_column(nullable=False)
+    # Shared content-addressed objects have no owner
+    owner_id: Mapped[uuid.UUID | None] = mapped_column(
+        ForeignKey("users.id", ondelete="SET NULL")
+    )
+    size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    content_type: Mapped[str] = mapped_column(nullable=False)
+    etag: Mapped[str] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -0,0 +1,109 @@
+"""
+Repairs drift between media storage and the media_objects catalog.
+
+    python -m src.media.reconcile [--bucket sample-bucket] [--batch-size 1000]
+
+Streams the bucket listing page by page. Objects missing from the catalog
+are added without an owner, and rows whose size or ETag differ from storage
+are updated. Each page is committed on its own, so the job can run against
+a live catalog. Rows of objects that are no longer in storage are deleted
+in batches at the end; rows created after the job started are kept, since
+the listing may have missed them.
+"""
+
+import argparse
+import asyncio
+import json
+import mimetypes
+from datetime import datetime, timezone
+
+from src.core.database import engine
+from src.core.utils import uuid7
+from src.media.dependencies import get_bucket_repository
+from src.media.repositories import MediaRepository
+
+UPSERT = """
+INSERT INTO media_objects (id, bucket, key, size, content_type, etag, created_at)
+SELECT * FROM unnest(
+    $1::uuid[], $2::varchar[], $3::varchar[], $4::bigint[], $5::varchar[],
+    $6::varchar[], $7::timestamptz[]
+)
+ON CONFLICT (bucket, key) DO UPDATE
+SET size = EXCLUDED.size, etag = EXCLUDED.etag
+WHERE media_objects.size <> EXCLUDED.size OR media_objects.etag <> EXCLUDED.etag
+RETURNING xmax = 0 AS inserted
+"""
+
+DELETE_MISSING = """
+DELETE FROM media_objects WHERE id IN (
+    SELECT id FROM media_objects AS m
+    WHERE m.bucket = $1 AND m.created_at < $2
+      AND NOT EXISTS (SELECT 1 FROM media_objects_seen AS s WHERE s.key = m.key)
+    LIMIT $3
+)
+"""
+
+
+async def reconcile(
+    storage: MediaRepository, bucket: str, batch_size: int = 1000
+) -> dict[str, int]:
+    """
+    :return: The number of objects seen in storage and of catalog rows
+        inserted, updated and deleted.
+    """
+    started = datetime.now(tz=timezone.utc)
+    stats = {"seen": 0, "inserted": 0, "updated": 0, "deleted": 0}
+    # One connection for the whole run, the temporary table lives in it
+    async with engine.connect() as connection:
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        await driver_connection.execute(
+            "CREATE TEMP TABLE media_objects_seen (key varchar PRIMARY KEY)"
+        )
+        async for page in storage.iter_object_pages(page_size=batch_size):
+            if not page:
+                continue
+            async with driver_connection.transaction():
+                await driver_connection.copy_records_to_table(
+                    "media_objects_seen", records=[(item["Key"],) for item in page]
+                )
+                rows = await driver_connection.fetch(
+                    UPSERT,
+                    [uuid7() for _ in page],
+                    [bucket] * len(page),
+                    [item["Key"] for item in page],
+                    [item["Size"] for item in page],
+                    [
+                        mimetypes.guess_type(item["Key"])[0]
+                        or "application/octet-stream"
+                        for item in page
+                    ],
+                    [item["ETag"] for item in page],
+                    [item["LastModified"] for item in page],
+                )
+            stats["seen"] += len(page)
+            stats["inserted"] += sum(row["inserted"] for row in rows)
+            stats["updated"] += sum(not row["inserted"] for row in rows)
+        while True:
+            status = await driver_connection.execute(
+                DELETE_MISSING, bucket, started, batch_size
+            )
+            deleted = int(status.split()[-1])
+            stats["deleted"] += deleted
+            if deleted < batch_size:
+                break
+        await driver_connection.execute("DROP TABLE media_objects_seen")
+    return stats
+
+
+async def main(args: argparse.Namespace) -> None:
+    storage = get_bucket_repository(args.bucket)
+    stats = await reconcile(storage, args.bucket, args.batch_size)
+    await engine.dispose()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bucket", default="sample-bucket")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -1,9 +1,52 @@
-from typing import BinaryIO
+from datetime import datetime, timezone
+import hashlib
+import itertools
+import math
+import os
+from typing import AsyncIterator, BinaryIO, Iterator, Sequence
 import uuid
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
+import shutil
 
+import anyio
+import anyio.to_thread
+from aiobotocore.config import AioConfig
 from aiobotocore.session import get_session
+from botocore.exceptions import BotoCoreError, ClientError
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from src.core.config import settings
+from src.core.repository import SQLAlchemyRepository
+from src.core.resilience import DependencyGuard
+from src.core.utils import uuid7
+from src.core.singleflight import SingleFlight
+from src.media.models import MediaContent, MediaContentReference, MediaObject
+
+# Concurrent downloads of the same object share one GET
+object_reads: SingleFlight[tuple[str, str, str], bytes] = SingleFlight("s3_get_object")
+
+
+def is_s3_failure(error: BaseException) -> bool:
+    """
+    Server errors, timeouts and connection errors count against the circuit
+    breaker, client errors such as a missing key do not.
+    """
+    if isinstance(error, ClientError):
+        metadata = error.response.get("ResponseMetadata", {})
+        return metadata.get("HTTPStatusCode", 500) >= 500
+    return isinstance(error, (BotoCoreError, OSError))
+
+
+s3_guard = DependencyGuard(
+    name="s3",
+    max_concurrency=settings.resilience.s3_max_concurrency,
+    max_pending=settings.resilience.s3_max_pending,
+    failure_threshold=settings.resilience.circuit_failure_threshold,
+    reset_seconds=settings.resilience.circuit_reset_seconds,
+    is_failure=is_s3_failure,
+)
 
 
 class MediaRepository(ABC):
@@ -17,6 +60,13 @@ class MediaRepository(ABC):
         :param generate_prefix: Generates prefix if set to True.
         """
         raise NotImplementedError
+
+    @abstractmethod
+    async def put_object(self, object_key: str, file: bytes | BinaryIO) -> str:
+        """
+        Writes object under exactly [object_key] and returns its ETag
+        """
+        raise NotImplementedError
     
     async def replace_object(self, object_key: str, file: bytes | BinaryIO) -> str:
         """
@@ -41,6 +91,20 @@ class MediaRepository(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_object_etag(self, object_key: str) -> str:
+        """
+        Returns the current ETag of the object without downloading it
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def download_object(self, object_key: str, path: str) -> str:
+        """
+        Streams the object into a local file and returns its ETag
+        """
+        raise NotImplementedError
+
     @abstractmethod
     async def get_all(self) -> list[bytes]:
         """
@@ -48,6 +112,21 @@ class MediaRepository(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def iter_object_pages(self, page_size: int = 1000) -> AsyncIterator[list[dict]]:
+        """
+        Lists the bucket page by page, each object as a dictionary with Key,
+        Size, ETag and LastModified
+        """
+        raise NotImplementedError
+
+    def get_local_path(self, object_key: str) -> str | None:
+        """
+        Returns the path of the object on local disk if the storage keeps it
+        there, so it can be served as a file
+        """
+        return None
+
 
 class S3Repository(MediaRepository):
     def __init__(
@@ -64,8 +143,35 @@ class S3Repository(MediaRepository):
 
     @asynccontextmanager
     async def get_client(self):
-        async with self.session.create_client("s3", **self.config) as client:
-            yield client
+        """
+        Creates a client for one call, admitted through s3_guard and with
+        timeouts capped by the request deadline.
+        """
+        async with s3_guard.call() as timeout:
+            config = AioConfig(
+                connect_timeout=min(
+                    settings.resilience.s3_connect_timeout_seconds,
+                    timeout or math.inf,
+                ),
+                read_timeout=min(
+                    settings.resilience.s3_read_timeout_seconds, timeout or math.inf
+                ),
+                retries={
+                    "mode": "standard",
+                    "max_attempts": settings.resilience.s3_max_attempts,
+                },
+            )
+            async with self.session.create_client(
+                "s3", config=config, **self.config
+            ) as client:
+                yield client
+
+    async def ping(self) -> None:
+        """
+        Raises if the bucket can not be reached.
+        """
+        async with self.get_client() as client:
+            await client.head_bucket(Bucket=self.bucket_name)
 
     async def upload_object(
         self, object_key: str, file: BinaryIO, generate_prefix: bool = True
@@ -73,14 +179,15 @@ class S3Repository(MediaRepository):
         object_key = object_key.replace(" ", "_")
         if generate_prefix:
             object_key = uuid.uuid4().hex + "_" + object_key
-        try:
-            async with self.get_client() as client:
-                await client.put_object(
-                    Bucket=self.bucket_name, Key=object_key, Body=file
-                )  # type: ignore
-                return object_key
-        except Exception as e:
-            raise e
+        await self.put_object(object_key=object_key, file=file)
+        return object_key
+
+    async def put_object(self, object_key: str, file: bytes | BinaryIO) -> str:
+        async with self.get_client() as client:
+            response = await client.put_object(
+                Bucket=self.bucket_name, Key=object_key, Body=file
+            )  # type: ignore
+            return response["ETag"].strip('"')
         
     async def replace_object(self, object_key: str, file: BinaryIO) -> str:
         return await self.upload_object(object_key=object_key, file=file, generate_prefix=False)
@@ -95,6 +202,13 @@ class S3Repository(MediaRepository):
             raise e
 
     async def get_object(self, object_key: str) -> bytes:
+        return await object_reads.do(
+            (self.config["endpoint_url"], self.bucket_name, object_key),
+            self._get_object,
+            object_key,
+        )
+
+    async def _get_object(self, object_key: str) -> bytes:
         try:
             async with self.get_client() as client:
                 file = await client.get_object(Bucket=self.bucket_name, Key=object_key)  # type: ignore
@@ -103,9 +217,340 @@ class S3Repository(MediaRepository):
         except Exception as e:
             raise e
 
+    async def get_object_etag(self, object_key: str) -> str:
+        async with self.get_client() as client:
+            head = await client.head_object(Bucket=self.bucket_name, Key=object_key)  # type: ignore
+            return head["ETag"].strip('"')
+
+    async def download_object(self, object_key: str, path: str) -> str:
+        async with self.get_client() as client:
+            file = await client.get_object(Bucket=self.bucket_name, Key=object_key)  # type: ignore
+            body = file["Body"]
+            async with body, await anyio.open_file(path, "wb") as out:
+                async for chunk in body.iter_chunks(chunk_size=256 * 1024):
+                    await out.write(chunk)
+            return file["ETag"].strip('"')
+
     async def get_all(self) -> list[bytes]:
         try:
             async with self.get_client() as client:
                 return (await client.list_objects(Bucket=self.bucket_name))["Contents"]  # type: ignore
         except Exception as e:
             raise e
+
+    async def iter_object_pages(self, page_size: int = 1000) -> AsyncIterator[list[dict]]:
+        async with self.get_client() as client:
+            paginator = client.get_paginator("list_objects_v2")
+            async for page in paginator.paginate(
+                Bucket=self.bucket_name, PaginationConfig={"PageSize": page_size}
+            ):
+                yield [
+                    {
+                        "Key": item["Key"],
+                        "Size": item["Size"],
+                        "ETag": item["ETag"].strip('"'),
+                        "LastModified": item["LastModified"],
+                    }
+                    for item in page.get("Contents", [])
+                ]
+
+
+class LocalFSRepository(MediaRepository):
+    """
+    Stores objects as files under `root`.
+
+    Files are named after the sha256 of the key, so any key fits in a file
+    name, and spread over two levels of directories named after its first
+    bytes (`ab/cd/<hash>`), so no directory grows past a few thousand
+    entries. The key itself is kept next to the object in `<hash>.key`.
+    Writes go to a hidden temporary file that is fsynced and renamed into
+    place, a reader sees either the old or the new object. ETags are derived
+    from the file size and modification time.
+    """
+
+    chunk_size = 1024 * 1024
+    key_suffix = ".key"
+    temp_prefix = "."
+
+    def __init__(self, root: str, bucket_name: str = "") -> None:
+        super().__init__()
+        self.root = root
+        self.bucket_name = bucket_name
+        os.makedirs(root, exist_ok=True)
+
+    def get_local_path(self, object_key: str) -> str:
+        digest = hashlib.sha256(object_key.encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    async def upload_object(
+        self, object_key: str, file: bytes | BinaryIO, generate_prefix: bool = True
+    ) -> str:
+        object_key = object_key.replace(" ", "_")
+        if generate_prefix:
+            object_key = uuid.uuid4().hex + "_" + object_key
+        await self.put_object(object_key=object_key, file=file)
+        return object_key
+
+    async def put_object(self, object_key: str, file: bytes | BinaryIO) -> str:
+        await anyio.to_thread.run_sync(self._write, object_key, file)
+        return await self.get_object_etag(object_key)
+
+    async def replace_object(self, object_key: str, file: bytes | BinaryIO) -> str:
+        return await self.upload_object(
+            object_key=object_key, file=file, generate_prefix=False
+        )
+
+    async def delete_objects(self, objects_keys: list[dict[str, str]]) -> None:
+        for object_key in objects_keys:
+            path = self.get_local_path(object_key["Key"])
+            for name in (path, path + self.key_suffix):
+                try:
+                    os.unlink(name)
+                except FileNotFoundError:
+                    pass
+
+    async def get_object(self, object_key: str) -> bytes:
+        async with await anyio.open_file(self.get_local_path(object_key), "rb") as file:
+            return await file.read()
+
+    async def get_object_etag(self, object_key: str) -> str:
+        return self._etag(os.stat(self.get_local_path(object_key)))
+
+    async def download_object(self, object_key: str, path: str) -> str:
+        source = self.get_local_path(object_key)
+        await anyio.to_thread.run_sync(shutil.copyfile, source, path)
+        return self._etag(os.stat(source))
+
+    async def get_all(self) -> list[dict]:
+        return await anyio.to_thread.run_sync(lambda: list(self.iter_objects()))
+
+    async def iter_object_pages(self, page_size: int = 1000) -> AsyncIterator[list[dict]]:
+        objects = self.iter_objects()
+        while page := await anyio.to_thread.run_sync(
+            lambda: list(itertools.islice(objects, page_size))
+        ):
+            yield page
+
+    def iter_objects(self) -> Iterator[dict]:
+        """
+        Walks the shard directories and yields metadata of every object in
+        the same shape as S3 list_objects contents
+        """
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(self.temp_prefix) or name.endswith(
+                    self.key_suffix
+                ):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    with open(path + self.key_suffix, encoding="utf-8") as file:
+                        object_key = file.read()
+                except FileNotFoundError:
+                    continue
+                yield {
+                    "Key": object_key,
+                    "Size": stat.st_size,
+                    "LastModified": datetime.fromtimestamp(
+                        stat.st_mtime, tz=timezone.utc
+                    ),
+                    "ETag": self._etag(stat),
+                }
+
+    def _write(self, object_key: str, file: bytes | BinaryIO) -> None:
+        path = self.get_local_path(object_key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # The key goes first, an object is never listed without it
+        if not os.path.exists(path + self.key_suffix):
+            self._write_file(path + self.key_suffix, object_key.encode())
+        self._write_file(path, file)
+        # Persist the renames themselves
+        directory_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+
+    def _write_file(self, path: str, file: bytes | BinaryIO) -> None:
+        temp_path = os.path.join(
+            os.path.dirname(path), self.temp_prefix + uuid.uuid4().hex
+        )
+        try:
+            with open(temp_path, "wb") as out:
+                if isinstance(file, bytes):
+                    out.write(file)
+                else:
+                    while chunk := file.read(self.chunk_size):
+                        out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    @staticmethod
+    def _etag(stat: os.stat_result) -> str:
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+class MediaContentRepository(SQLAlchemyRepository[MediaContent]):
+    async def lock(self, content_id: str) -> MediaContent | None:
+        """
+        Returns the stored content with its row locked until the session
+        commits, so references are neither added nor dropped concurrently.
+        """
+        return await self._one_or_none(
+            self._query().where(MediaContent.id == content_id).with_for_update()
+        )
+
+    async def acquire(self, content_id: str, owner_id: uuid.UUID | None) -> bool:
+        """
+        Adds a reference of the owner to stored content, if it has none yet.
+
+        :return: False if the content is not stored yet.
+        """
+        acquired = await self.lock(content_id) is not None
+        if acquired:
+            await self._reference(content_id, owner_id)
+        await self.session.commit()
+        return acquired
+
+    async def add(self, content_id: str, size: int, owner_id: uuid.UUID | None) -> None:
+        """
+        Records content that was just stored, or adds a reference if the same
+        content was stored concurrently.
+        """
+        await self.session.execute(
+            insert(MediaContent)
+            .values(id=content_id, size=size)
+            .on_conflict_do_update(
+                index_elements=[MediaContent.id], set_={"size": size}
+            )
+        )
+        await self._reference(content_id, owner_id)
+        await self.session.commit()
+
+    async def release(
+        self, content_id: str, owner_id: uuid.UUID | None, everyone: bool = False
+    ) -> tuple[int, int]:
+        """
+        Drops the reference of the owner, or every reference. Expects the
+        content to be locked, see lock.
+
+        :return: The references dropped and the references left.
+        """
+        query = delete(MediaContentReference).where(
+            MediaContentReference.content_id == content_id
+        )
+        if not everyone:
+            query = query.where(
+                MediaContentReference.owner_id.is_not_distinct_from(owner_id)
+            )
+        result = await self.session.execute(query)
+        left = await self.session.execute(
+            select(func.count())
+            .select_from(MediaContentReference)
+            .where(MediaContentReference.content_id == content_id)
+        )
+        return result.rowcount, left.scalar_one()
+
+    async def remove(self, content_id: str) -> None:
+        await self.session.execute(
+            delete(MediaContent).where(MediaContent.id == content_id)
+        )
+
+    async def _reference(self, content_id: str, owner_id: uuid.UUID | None) -> None:
+        await self.session.execute(
+            insert(MediaContentReference)
+            .values(content_id=content_id, owner_id=owner_id)
+            .on_conflict_do_nothing()
+        )
+
+
+class MediaObjectRepository(SQLAlchemyRepository[MediaObject]):
+    async def get_object(self, bucket: str, key: str) -> MediaObject | None:
+        return await self._one_or_none(
+            self._query().where(MediaObject.bucket == bucket, MediaObject.key == key)
+        )
+
+    async def list_after(
+        self,
+        bucket: str,
+        after: str | None = None,
+        limit: int = 100,
+        owner_id: uuid.UUID | None = None,
+    ) -> Sequence[MediaObject]:
+        """
+        Returns objects ordered by key, starting after the given key. Served
+        by the (bucket, key) or (owner_id, key) index at any depth.
+
+        :param after: The last key of the previous page.
+        :param owner_id: Only return objects of this owner.
+        """
+        query = self._query().where(MediaObject.bucket == bucket)
+        if owner_id is not None:
+            query = query.where(MediaObject.owner_id == owner_id)
+        if after is not None:
+            query = query.where(MediaObject.key > after)
+        return await self._all(query.order_by(MediaObject.key).limit(limit))
+
+    async def save(
+        self,
+        bucket: str,
+        key: str,
+        size: int,
+        content_type: str,
+        etag: str,
+        owner_id: uuid.UUID | None = None,
+        overwrite: bool = True,
+    ) -> None:
+        """
+        Records the object, or updates size, content type and ETag of an
+        existing one if `overwrite` is set. The owner never changes.
+        """
+        stmt = insert(MediaObject).values(
+            id=uuid7(),
+            bucket=bucket,
+            key=key,
+            owner_id=owner_id,
+            size=size,
+            content_type=content_type,
+            etag=etag,
+        )
+        if overwrite:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[MediaObject.bucket, MediaObject.key],
+                set_={
+                    "size": stmt.excluded.size,
+                    "content_type": stmt.excluded.content_type,
+                    "etag": stmt.excluded.etag,
+                },
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing()
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    async def remove(self, bucket: str, key: str) -> None:
+        await self.session.execute(
+            delete(MediaObject).where(
+                MediaObject.bucket == bucket, MediaObject.key == key
+            )
+        )
+        await self.session.commit()
+
+    async def remove_many(self, bucket: str, keys: list[str]) -> list[str]:
+        """
+        :return: The keys that were recorded and are now deleted.
+        """
+        result = await self.session.execute(
+            delete(MediaObject)
+            .where(MediaObject.bucket == bucket, MediaObject.key.in_(keys))
+            .returning(MediaObject.key)
+        )
+        await self.session.commit()
+        return list(result.scalars())
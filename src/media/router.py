@@ -1,15 +1,34 @@
+import mimetypes
+import os
+
 from fastapi import (
     APIRouter,
     Depends,
     File,
     HTTPException,
+    Query,
     Response,
     UploadFile,
     status,
 )
-
-from src.media.dependencies import get_s3_repository
-from src.media.repositories import MediaRepository
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.dependencies import get_optional_active_auth_user
+from src.core.config import settings
+from src.core.dependencies import get_async_session
+from src.core.idempotency import Idempotency, get_idempotency
+from src.core.responses import FastJSONResponse
+from src.media.cache import CachedFileResponse, MediaCache
+from src.media.dependencies import get_bucket_repository, get_media_cache
+from src.media.models import MediaContent, MediaObject
+from src.media.repositories import (
+    MediaContentRepository,
+    MediaObjectRepository,
+    MediaRepository,
+)
+from src.media.schemas import MediaObjectRead
+from src.media.service import MediaService
 
 # This is EXAMPLE delete or change it
 
@@ -17,21 +36,64 @@ router = APIRouter(tags=["Media"])
 
 
 def get_media_repository():
-    yield get_s3_repository(bucket_name="sample-bucket")
+    yield get_bucket_repository(bucket_name="sample-bucket")
+
+
+def get_cache():
+    yield get_media_cache(bucket_name="sample-bucket")
+
+
+def get_media_service(
+    media_repository: MediaRepository = Depends(get_media_repository),
+    media_cache: MediaCache | None = Depends(get_cache),
+    session: AsyncSession = Depends(get_async_session),
+):
+    yield MediaService(
+        storage=media_repository,
+        contents=MediaContentRepository(session=session, model=MediaContent),
+        objects=MediaObjectRepository(session=session, model=MediaObject),
+        cache=media_cache,
+    )
+
+
+def get_content_type(file: UploadFile) -> str:
+    return (
+        file.content_type
+        or mimetypes.guess_type(file.filename or "")[0]
+        or "application/octet-stream"
+    )
 
 
 media_depend: MediaRepository = Depends(get_media_repository)
+cache_depend: MediaCache | None = Depends(get_cache)
+service_depend: MediaService = Depends(get_media_service)
+user_depend = Depends(get_optional_active_auth_user)
 
 
 @router.post(path="/")
-async def upload_object(file: UploadFile = File(), media_repository=media_depend):
+async def upload_object(
+    file: UploadFile = File(),
+    # Before the user lookup, so waiting duplicates hold no connection
+    idempotency: Idempotency = Depends(get_idempotency),
+    media_service=service_depend,
+    user=user_depend,
+):
     try:
-        if not file.filename:
+        if not file.filename and not settings.s3.dedup:
             raise Exception('filename not provided')
-        key = await media_repository.upload_object(
-            object_key=file.filename, file=file.file
+        result = await media_service.upload(
+            file=file.file,
+            filename=file.filename or "",
+            content_type=get_content_type(file),
+            owner=user,
+            deduplicate=settings.s3.dedup,
         )
-        return {"message": "successfully loaded object", "key": key}
+        response = {"message": "successfully loaded object", "key": result.key}
+        if settings.s3.dedup:
+            response.update(size=result.size, deduplicated=result.deduplicated)
+        return idempotency.save(FastJSONResponse(response))
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -40,10 +102,14 @@ async def upload_object(file: UploadFile = File(), media_repository=media_depend
 
 
 @router.delete(path="/{object_key}")
-async def delete_object_by_id(object_key: str, media_repository=media_depend):
+async def delete_object_by_id(
+    object_key: str, media_service=service_depend, user=user_depend
+):
     try:
-        await media_repository.delete_objects(objects_keys=[{"Key": object_key}])
-        return {"message": "successfully deleted object"}
+        await media_service.delete(object_key=object_key, user=user)
+        return FastJSONResponse({"message": "successfully deleted object"})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -51,11 +117,48 @@ async def delete_object_by_id(object_key: str, media_repository=media_depend):
         )
 
 
+@router.get(path="/{object_key}/metadata", response_model=MediaObjectRead)
+async def get_object_metadata(object_key: str, media_service=service_depend):
+    return FastJSONResponse(
+        MediaObjectRead.model_validate(
+            await media_service.get_metadata(object_key=object_key)
+        )
+    )
+
+
 @router.get(path="/{object_key}")
-async def get_object_by_id(object_key: str, media_repository=media_depend):
+async def get_object_by_id(
+    object_key: str,
+    w: int | None = None,
+    format: str = "webp",
+    media_repository=media_depend,
+    media_cache=cache_depend,
+    media_service=service_depend,
+):
+    """
+    Returns the object. With `w` an image is returned scaled down to that
+    width and encoded in `format` (webp, jpeg or png), without metadata.
+    """
     try:
+        if w is not None:
+            object_key = await media_service.get_variant(
+                object_key=object_key, width=w, format=format
+            )
+        media_type = mimetypes.guess_type(object_key)[0] or "application/octet-stream"
+        path = media_repository.get_local_path(object_key)
+        if path is None and media_cache is not None:
+            path = await media_cache.acquire(object_key)
+            return CachedFileResponse(media_cache, path, media_type=media_type)
+        if path is not None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"object '{object_key}' does not exist")
+            # Served by the server with sendfile where it supports it,
+            # otherwise streamed from disk in chunks
+            return FileResponse(path, media_type=media_type)
         file = await media_repository.get_object(object_key=object_key)
         return Response(content=file)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -64,10 +167,24 @@ async def get_object_by_id(object_key: str, media_repository=media_depend):
 
 
 @router.put(path="/{object_key}")
-async def replace_object_by_id(object_key: str, file: UploadFile = File(), media_repository=media_depend):
+async def replace_object_by_id(
+    object_key: str,
+    file: UploadFile = File(),
+    media_service=service_depend,
+    user=user_depend,
+):
     try:
-        key = await media_repository.replace_object(object_key=object_key, file=file.file)
-        return {"message": "successfully replaced object", "key": key}
+        result = await media_service.replace(
+            object_key=object_key,
+            file=file.file,
+            content_type=get_content_type(file),
+            user=user,
+        )
+        return FastJSONResponse(
+            {"message": "successfully replaced object", "key": result.key}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -75,13 +192,25 @@ async def replace_object_by_id(object_key: str, file: UploadFile = File(), media
         )
 
 
-@router.get(path="/")
-async def get_all_objects(media_repository=media_depend):
-    try:
-        objects = await media_repository.get_all()
-        return objects
-    except Exception as e:
+@router.get(path="/", response_model=list[MediaObjectRead])
+async def get_all_objects(
+    after: str | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    mine: bool = False,
+    media_service=service_depend,
+    user=user_depend,
+):
+    """
+    Lists objects from the catalog ordered by key. Pass the last key of a
+    page as `after` to get the next one, `mine` to list only own objects.
+    """
+    if mine and user is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="failed to upload file: " + str(e),
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="not authenticated"
         )
+    objects = await media_service.list_objects(
+        after=after, limit=limit, owner=user if mine else None
+    )
+    return FastJSONResponse(
+        [MediaObjectRead.model_validate(media_object) for media_object in objects]
+    )
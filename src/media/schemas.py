@@ -0,0 +1,13 @@
+from datetime import datetime
+import uuid
+
+from src.core.schemas import BaseModel
+
+
+class MediaObjectRead(BaseModel):
+    key: str
+    owner_id: uuid.UUID | None
+    size: int
+    content_type: str
+    etag: str
+    created_at: datetime
@@ -0,0 +1,390 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import BinaryIO, Sequence
+
+import anyio.to_thread
+from PIL import Image, UnidentifiedImageError
+
+import src.media.exceptions as media_exc
+from src.auth.models import User
+from src.core.config import settings
+from src.core.database import async_session_maker
+from src.core.executor import BoundedExecutor, ExecutorOverloaded
+from src.core.metrics import registry
+from src.core.singleflight import SingleFlight
+from src.media.cache import MediaCache
+from src.media.images import (
+    CONTENT_TYPES,
+    render_variant,
+    variant_key,
+    variant_keys,
+    variant_original,
+)
+from src.media.models import MediaObject
+from src.media.repositories import (
+    MediaContentRepository,
+    MediaObjectRepository,
+    MediaRepository,
+)
+
+logger = logging.getLogger(__name__)
+
+media_dedup_uploads_total = registry.counter(
+    "media_dedup_uploads_total",
+    "Content-addressed uploads by result: stored or deduplicated",
+)
+media_dedup_bytes_saved_total = registry.counter(
+    "media_dedup_bytes_saved_total", "Bytes not written to storage thanks to dedup"
+)
+media_dedup_seconds_saved_total = registry.counter(
+    "media_dedup_seconds_saved_total",
+    "Storage write time avoided by dedup, estimated from the average write rate",
+)
+media_upload_bytes_total = registry.counter(
+    "media_upload_bytes_total", "Bytes written to storage by content-addressed uploads"
+)
+media_upload_seconds_total = registry.counter(
+    "media_upload_seconds_total", "Time spent writing content-addressed uploads"
+)
+media_variant_requests_total = registry.counter(
+    "media_variant_requests_total",
+    "Image variant requests by result: hit (already stored) or built",
+)
+media_variant_build_seconds = registry.histogram(
+    "media_variant_build_seconds",
+    "Time to read the original, render a variant and store it",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+# Worker processes are spawned rather than forked from the multi-threaded
+# server, and only import src.media.images
+image_executor = BoundedExecutor(
+    name="images",
+    max_workers=settings.media_images.workers,
+    max_pending=settings.media_images.max_pending,
+    executor_factory=partial(
+        ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")
+    ),
+)
+variant_builds: SingleFlight[tuple[str, str], None] = SingleFlight(
+    "media_variant_build"
+)
+
+# Keys of content-addressed objects, see MediaService.upload_deduplicated
+CONTENT_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+@dataclass
+class UploadResult:
+    key: str
+    size: int
+    etag: str
+    deduplicated: bool = False
+
+
+def hash_file(file: BinaryIO) -> tuple[str, int]:
+    """
+    Hashes the file in chunks and rewinds it.
+
+    :return: Hex sha256 of the content and its size.
+    """
+    file.seek(0)
+    digest = hashlib.file_digest(file, "sha256")  # type: ignore
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    return digest.hexdigest(), size
+
+
+def file_size(file: BinaryIO) -> int:
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    return size
+
+
+class MediaService:
+    def __init__(
+        self,
+        storage: MediaRepository,
+        contents: MediaContentRepository,
+        objects: MediaObjectRepository,
+        cache: MediaCache | None = None,
+    ) -> None:
+        self.storage = storage
+        self.contents = contents
+        self.objects = objects
+        self.cache = cache
+
+    @property
+    def bucket(self) -> str:
+        return self.storage.bucket_name  # type: ignore
+
+    async def upload(
+        self,
+        file: BinaryIO,
+        filename: str,
+        content_type: str,
+        owner: User | None = None,
+        deduplicate: bool = False,
+    ) -> UploadResult:
+        """
+        Stores the file and records it in the catalog.
+
+        :param deduplicate: Store under the content hash, see
+            upload_deduplicated. Such objects are shared and have no owner,
+            every uploader holds a reference instead.
+        """
+        if deduplicate:
+            result = await self.upload_deduplicated(file, owner)
+            if result.deduplicated:
+                if await self.objects.get_object(self.bucket, result.key):
+                    self.log_upload(result, owner=None)
+                    return result
+                result.etag = await self.storage.get_object_etag(result.key)
+            owner = None
+        else:
+            key = uuid.uuid4().hex + "_" + filename.replace(" ", "_")
+            etag = await self.storage.put_object(object_key=key, file=file)
+            result = UploadResult(key, file_size(file), etag)
+        await self.objects.save(
+            bucket=self.bucket,
+            key=result.key,
+            size=result.size,
+            content_type=content_type,
+            etag=result.etag,
+            owner_id=owner.id if owner else None,
+            overwrite=False,
+        )
+        self.log_upload(result, owner)
+        return result
+
+    @staticmethod
+    def log_upload(result: UploadResult, owner: User | None) -> None:
+        logger.info(
+            "media object uploaded",
+            extra={
+                "key": result.key,
+                "size": result.size,
+                "deduplicated": result.deduplicated,
+                "owner_id": owner.id.hex if owner else None,
+            },
+        )
+
+    async def upload_deduplicated(
+        self, file: BinaryIO, owner: User | None = None
+    ) -> UploadResult:
+        """
+        Stores the file under the sha256 of its content. If the same content
+        is already stored, only a reference of the owner is added and nothing
+        is written.
+        """
+        key, size = await anyio.to_thread.run_sync(hash_file, file)
+        owner_id = owner.id if owner else None
+        if await self.contents.acquire(key, owner_id):
+            media_dedup_uploads_total.inc(result="deduplicated")
+            media_dedup_bytes_saved_total.inc(size)
+            written = media_upload_bytes_total.value()
+            if written:
+                media_dedup_seconds_saved_total.inc(
+                    size * media_upload_seconds_total.value() / written
+                )
+            return UploadResult(key, size, etag="", deduplicated=True)
+
+        started = time.perf_counter()
+        etag = await self.storage.put_object(object_key=key, file=file)
+        media_upload_seconds_total.inc(time.perf_counter() - started)
+        media_upload_bytes_total.inc(size)
+        await self.contents.add(key, size, owner_id)
+        media_dedup_uploads_total.inc(result="stored")
+        return UploadResult(key, size, etag)
+
+    async def replace(
+        self, object_key: str, file: BinaryIO, content_type: str, user: User | None
+    ) -> UploadResult:
+        """
+        Replaces the object, or stores a new one under the key. Content-
+        addressed objects can not be replaced, their key is their hash.
+        """
+        if CONTENT_KEY.fullmatch(object_key):
+            raise media_exc.content_addressed
+        media_object = await self.objects.get_object(self.bucket, object_key)
+        self.check_owner(media_object, user)
+        etag = await self.storage.put_object(object_key=object_key, file=file)
+        self.invalidate_cached(object_key)
+        result = UploadResult(object_key, file_size(file), etag)
+        await self.objects.save(
+            bucket=self.bucket,
+            key=object_key,
+            size=result.size,
+            content_type=content_type,
+            etag=etag,
+            owner_id=user.id if user and media_object is None else None,
+        )
+        await self.delete_variants(object_key)
+        logger.info(
+            "media object replaced", extra={"key": object_key, "size": result.size}
+        )
+        return result
+
+    async def delete(self, object_key: str, user: User | None = None) -> None:
+        """
+        Deletes the object. Content-addressed objects only lose the reference
+        of the user and are deleted with the last one, superusers delete
+        them with every reference.
+        """
+        media_object = await self.objects.get_object(self.bucket, object_key)
+        content = await self.contents.lock(object_key)
+        if content is not None:
+            await self.delete_content(object_key, user)
+            return
+        if media_object is None and not (user and user.superuser):
+            # Objects missing from the catalog have no known owner
+            raise media_exc.not_found
+        self.check_owner(media_object, user)
+        await self.storage.delete_objects(objects_keys=[{"Key": object_key}])
+        self.invalidate_cached(object_key)
+        await self.objects.remove(self.bucket, object_key)
+        await self.delete_variants(object_key)
+        logger.info("media object deleted", extra={"key": object_key})
+
+    async def delete_content(self, object_key: str, user: User | None) -> None:
+        if user is None:
+            raise media_exc.forbidden
+        dropped, left = await self.contents.release(
+            object_key, owner_id=user.id, everyone=user.superuser
+        )
+        if not dropped:
+            # Nothing of this user to delete, a repeated DELETE changes nothing
+            await self.contents.session.rollback()
+            raise media_exc.forbidden
+        if left == 0:
+            await self.storage.delete_objects(objects_keys=[{"Key": object_key}])
+            self.invalidate_cached(object_key)
+            await self.contents.remove(object_key)
+        await self.contents.session.commit()
+        if left == 0:
+            await self.objects.remove(self.bucket, object_key)
+            await self.delete_variants(object_key)
+        logger.info(
+            "media object deleted", extra={"key": object_key, "references_left": left}
+        )
+
+    async def get_metadata(self, object_key: str) -> MediaObject:
+        media_object = await self.objects.get_object(self.bucket, object_key)
+        if media_object is None:
+            raise media_exc.not_found
+        return media_object
+
+    async def list_objects(
+        self, after: str | None, limit: int, owner: User | None = None
+    ) -> Sequence[MediaObject]:
+        return await self.objects.list_after(
+            self.bucket, after=after, limit=limit, owner_id=owner.id if owner else None
+        )
+
+    async def get_variant(self, object_key: str, width: int, format: str) -> str:
+        """
+        Returns the key of the image scaled to `width` and encoded in
+        `format`. The variant is rendered and stored on first request,
+        concurrent first requests wait for the same render. Variants have
+        no variants of their own, they would outlive the original.
+        """
+        if width not in settings.media_images.widths or format not in CONTENT_TYPES:
+            raise media_exc.unsupported_variant
+        original_key = variant_original(object_key)
+        if original_key and await self.objects.get_object(self.bucket, original_key):
+            raise media_exc.unsupported_variant
+        original = await self.get_metadata(object_key)
+        if not original.content_type.startswith("image/"):
+            raise media_exc.not_an_image
+        key = variant_key(object_key, width, format)
+        if await self.objects.get_object(self.bucket, key) is not None:
+            media_variant_requests_total.inc(result="hit")
+            return key
+        media_variant_requests_total.inc(result="built")
+        # Give the connection back to the pool while the render runs, the
+        # build and every request waiting for it would hold one otherwise
+        await self.objects.session.commit()
+        await variant_builds.do(
+            (self.bucket, key), self._build_variant, original, key, width, format
+        )
+        return key
+
+    async def _build_variant(
+        self, original: MediaObject, key: str, width: int, format: str
+    ) -> None:
+        started = time.perf_counter()
+        source: str | bytes | None = self.storage.get_local_path(original.key)
+        cached = None
+        if source is None and self.cache is not None:
+            source = cached = await self.cache.acquire(original.key)
+        if source is None:
+            source = await self.storage.get_object(original.key)
+        try:
+            content = await image_executor.run(
+                render_variant,
+                source,
+                width,
+                format,
+                settings.media_images.quality,
+                settings.media_images.max_pixels,
+            )
+        except ExecutorOverloaded:
+            raise media_exc.image_processing_overloaded
+        except (UnidentifiedImageError, Image.DecompressionBombError):
+            raise media_exc.not_an_image
+        finally:
+            if cached is not None:
+                self.cache.release(cached)  # type: ignore
+        etag = await self.storage.put_object(object_key=key, file=content)
+        # Runs in its own task, possibly after the request that started it
+        # has closed its session
+        async with async_session_maker() as session:
+            await MediaObjectRepository(session=session, model=MediaObject).save(
+                bucket=self.bucket,
+                key=key,
+                size=len(content),
+                content_type=CONTENT_TYPES[format],
+                etag=etag,
+                owner_id=original.owner_id,
+            )
+        media_variant_build_seconds.observe(time.perf_counter() - started)
+
+    async def delete_variants(self, object_key: str) -> None:
+        """
+        Deletes the stored variants of the object, they are rendered again
+        from the current original on next request.
+        """
+        keys = await self.objects.remove_many(
+            self.bucket, variant_keys(object_key, settings.media_images.widths)
+        )
+        if keys:
+            await self.storage.delete_objects(
+                objects_keys=[{"Key": key} for key in keys]
+            )
+            for key in keys:
+                self.invalidate_cached(key)
+
+    def invalidate_cached(self, object_key: str) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(object_key)
+
+    @staticmethod
+    def check_owner(media_object: MediaObject | None, user: User | None) -> None:
+        """
+        Only the owner and superusers may change an object, objects without
+        an owner only superusers.
+        """
+        if media_object is None:
+            return
+        if user is None:
+            raise media_exc.forbidden
+        if user.id != media_object.owner_id and not user.superuser:
+            raise media_exc.forbidden
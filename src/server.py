@@ -0,0 +1,71 @@
+import importlib.util
+import logging
+import os
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from src.core.config import settings
+from src.core.log import logging_config
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def get_workers_count() -> int:
+    if settings.server.workers > 0:
+        return settings.server.workers
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def get_config() -> uvicorn.Config:
+    max_requests = settings.server.max_requests
+    return uvicorn.Config(
+        "src.main:app",
+        host=settings.server.bind_host,
+        port=settings.server.port,
+        workers=get_workers_count(),
+        # "auto" picks uvloop and httptools when they are installed
+        loop="auto",
+        http="auto",
+        backlog=settings.server.backlog,
+        timeout_keep_alive=settings.server.keep_alive_seconds,
+        limit_max_requests=max_requests if max_requests > 0 else None,
+        timeout_graceful_shutdown=settings.server.graceful_shutdown_seconds,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        log_config=logging_config(
+            level=settings.logging.level,
+            json=settings.logging.json_format,
+            capacity=settings.logging.queue_capacity,
+            sample_every=settings.logging.sample_every,
+        ),
+        access_log=settings.logging.access_log,
+    )
+
+
+def run() -> None:
+    """
+    Runs the production server.
+
+    Workers are supervised by uvicorn, which drains in-flight requests on
+    SIGTERM and restarts workers that exit after serving `max_requests`.
+    """
+    config = get_config()
+    logger.info(
+        "Starting %d worker(s), loop=%s, http=%s",
+        config.workers,
+        "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "httptools" if importlib.util.find_spec("httptools") else "h11",
+    )
+    server = uvicorn.Server(config)
+    if config.workers > 1 or config.limit_max_requests is not None:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    run()